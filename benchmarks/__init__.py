@@ -0,0 +1 @@
+﻿# Benchmarks for git1file; run modules with `python -m benchmarks.<name>`
\ No newline at end of file
@@ -0,0 +1,59 @@
+﻿# benchmarks/bench_processes.py
+"""
+Scaling of analyze_repository with --processes on a synthetic tree.
+
+    python -m benchmarks.bench_processes --files 100000 --processes 1 2 4 8 16 --minify strip
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from git1file.analyzer import analyze_repository
+from git1file.config import load_config
+from git1file.minifier import clear_cache
+from git1file.models.schemas import MinifyMode
+
+from .synthetic import generate_repository
+
+
+def run(repo_path: Path, processes: int, minify: MinifyMode) -> float:
+    config = load_config(repo_path / ".git1file.yaml")
+    config.output.minify = minify
+    # Кэш по хэшу контента наследуется воркерами при fork — сбрасываем между прогонами
+    clear_cache()
+    start = time.perf_counter()
+    analyze_repository(repo_path, config, processes=processes)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark process-pool scaling")
+    parser.add_argument("--files", type=int, default=10000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--minify", choices=[m.value for m in MinifyMode], default="strip")
+    parser.add_argument("--repo", help="Existing tree to reuse instead of generating one")
+    args = parser.parse_args()
+
+    minify = MinifyMode(args.minify)
+    with tempfile.TemporaryDirectory(prefix="git1file_bench_") as tmp:
+        repo_path = Path(args.repo) if args.repo else generate_repository(Path(tmp) / "repo", args.files)
+
+        results = []
+        baseline = None
+        for processes in args.processes:
+            elapsed = run(repo_path, processes, minify)
+            baseline = baseline or elapsed
+            results.append({
+                "processes": processes,
+                "seconds": round(elapsed, 3),
+                "speedup": round(baseline / elapsed, 2),
+            })
+            print(json.dumps(results[-1]))
+
+    print(json.dumps({"files": args.files, "minify": minify.value, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+﻿# benchmarks/bench_startup.py
+"""
+Startup regression check for the CLI.
+
+    python -m benchmarks.bench_startup --budget-ms 80
+
+1. `python -X importtime -c "import cli"`: total import time of the CLI and
+   the self time of the project's own modules (cli, git1file.*). The budget
+   applies to the latter; pydantic and the stdlib are reported but not
+   budgeted, since the models need them on every run.
+2. A real run on a tiny local git repository must not import heavy modules
+   that only some paths need (GitPython, yaml, FastAPI, multiprocessing...).
+
+Exits with status 1 when the budget is exceeded or a forbidden module loads.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+FORBIDDEN_MODULES = [
+    "git", "yaml", "fastapi", "starlette", "jinja2", "uvicorn",
+    "multiprocessing", "concurrent.futures.process", "sqlite3",
+    "xml.etree.ElementTree", "git1file.minifier", "git1file.parallel", "git1file.search",
+    "git1file.formatters.xml_formatter", "git1file.formatters.json_formatter",
+]
+
+RUN_SNIPPET = (
+    "import json, os, sys, cli; "
+    "sys.argv = ['cli.py', sys.argv[1], '-o', os.devnull]; "
+    "cli.main(); "
+    "print(json.dumps(sorted(sys.modules)))"
+)
+
+
+def is_project_module(name: str) -> bool:
+    return name == "cli" or name == "git1file" or name.startswith("git1file.")
+
+
+def measure_imports() -> Dict[str, float]:
+    """Import times (ms) of `import cli`: total and project self time."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import cli"],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+    )
+    total = project = 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # строка заголовка
+        name = name.strip()
+        if name == "cli":
+            total = int(cumulative_us)
+        if is_project_module(name):
+            project += int(self_us)
+    return {"total_ms": total / 1000, "project_ms": project / 1000}
+
+
+def loaded_modules(repo: Path) -> list:
+    completed = subprocess.run(
+        [sys.executable, "-c", RUN_SNIPPET, str(repo)],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def make_tiny_repo(root: Path) -> Path:
+    (root / "pkg").mkdir(parents=True)
+    (root / "pkg" / "__init__.py").write_text("", encoding="utf-8")
+    (root / "pkg" / "main.py").write_text("print('hello')\n", encoding="utf-8")
+    subprocess.run(["git", "init", "-q"], cwd=root, check=False)
+    subprocess.run(["git", "-c", "user.email=b@b", "-c", "user.name=b", "add", "."], cwd=root, check=False)
+    subprocess.run(["git", "-c", "user.email=b@b", "-c", "user.name=b", "commit", "-qm", "init"],
+                   cwd=root, check=False)
+    return root
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI startup regression benchmark")
+    parser.add_argument("--budget-ms", type=float, default=80.0,
+                        help="Budget for the self import time of cli and git1file.* (default: 80)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs; the fastest is reported")
+    args = parser.parse_args()
+
+    runs = [measure_imports() for _ in range(args.repeat)]
+    best = min(runs, key=lambda r: r["total_ms"])
+
+    with tempfile.TemporaryDirectory(prefix="git1file_startup_") as tmp:
+        modules = set(loaded_modules(make_tiny_repo(Path(tmp) / "repo")))
+    forbidden = [name for name in FORBIDDEN_MODULES if name in modules]
+
+    report = {
+        "import_cli_ms": round(best["total_ms"], 1),
+        "project_ms": round(best["project_ms"], 1),
+        "budget_ms": args.budget_ms,
+        "forbidden_imported": forbidden,
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+    }
+    print(json.dumps(report, indent=2))
+
+    if best["project_ms"] > args.budget_ms or forbidden:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+﻿# benchmarks/compare.py
+"""
+Compare two benchmarks.run result files.
+
+    python -m benchmarks.compare base.json new.json --threshold 0.10
+
+Exits with status 1 if any case got slower (or bigger in peak RSS) than
+the threshold allows.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+METRICS = ["seconds", "peak_rss_kb"]
+
+
+def load_results(path: str) -> tuple:
+    report = json.loads(Path(path).read_text(encoding="utf-8"))
+    return {(r["size"], r["case"]): r for r in report["results"]}, report.get("commit")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    base, base_commit = load_results(args.base)
+    new, new_commit = load_results(args.new)
+    print(f"base: {base_commit or args.base}\nnew:  {new_commit or args.new}\n")
+    print(f"{'size':<6} {'case':<14} {'metric':<12} {'base':>12} {'new':>12} {'change':>8}")
+
+    regressions = 0
+    for key in sorted(set(base) & set(new)):
+        for metric in METRICS:
+            old_value = base[key].get(metric)
+            new_value = new[key].get(metric)
+            if not old_value or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value
+            flag = ""
+            if change > args.threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{key[0]:<6} {key[1]:<14} {metric:<12} {old_value:>12} {new_value:>12} "
+                  f"{change:>+7.1%}{flag}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
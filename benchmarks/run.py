@@ -0,0 +1,192 @@
+﻿# benchmarks/run.py
+"""
+Reproducible benchmark suite.
+
+    python -m benchmarks.run --sizes 1k 50k 500k --output results.json
+
+Every (size, case) pair runs in a fresh interpreter so peak RSS and syscall
+counts belong to that case alone. Generated trees are cached in --workdir
+and reused across runs. Compare two result files with benchmarks.compare.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+from .synthetic import generate_repository
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CASES = ["scan", "analyze", "format_plain", "format_xml", "format_json", "cli", "api"]
+SIZES = {"1k": 1_000, "50k": 50_000, "500k": 500_000}
+# Лимиты по умолчанию (50 000 файлов) меньше самых больших деревьев — бенчмарк их снимает
+BENCH_LIMITS = {"max_total_files": 10 ** 9, "max_total_chars": 10 ** 15}
+
+
+def parse_size(label: str) -> int:
+    if label in SIZES:
+        return SIZES[label]
+    if label.lower().endswith("k"):
+        return int(label[:-1]) * 1000
+    return int(label)
+
+
+def read_proc_io() -> Dict[str, int]:
+    """syscr/syscw из /proc/self/io (только Linux)."""
+    try:
+        with open("/proc/self/io", "r", encoding="ascii") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return {"syscr": int(fields["syscr"]), "syscw": int(fields["syscw"])}
+    except (OSError, KeyError, ValueError):
+        return {}
+
+
+def _load(repo: Path):
+    from git1file.config import load_config
+    config = load_config(repo / ".git1file.yaml")
+    config.include.max_total_files = BENCH_LIMITS["max_total_files"]
+    config.include.max_total_chars = BENCH_LIMITS["max_total_chars"]
+    return config
+
+
+def run_case(case: str, repo: Path) -> Dict[str, Optional[float]]:
+    """Runs one case in this process and returns its measurements."""
+    from git1file.analyzer import analyze_repository
+    from git1file.config import CompiledConfig
+    from git1file.file_processor import scan_repository
+
+    config = _load(repo)
+    analysis = None
+    if case.startswith("format_"):
+        analysis = analyze_repository(repo, config)  # подготовка, не входит в замер
+
+    io_before = read_proc_io()
+    start = time.perf_counter()
+
+    if case == "scan":
+        scan_repository(repo, CompiledConfig(config))
+    elif case == "analyze":
+        analyze_repository(repo, config)
+    elif case == "format_plain":
+        from git1file.formatters.plain_formatter import format_plain
+        format_plain(analysis)
+    elif case == "format_xml":
+        from git1file.formatters.xml_formatter import format_xml
+        format_xml(analysis)
+    elif case == "format_json":
+        from git1file.formatters.json_formatter import format_json
+        format_json(analysis)
+    elif case == "cli":
+        subprocess.run(
+            [sys.executable, str(PROJECT_ROOT / "cli.py"), str(repo), "-o", os.devnull],
+            check=True, cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+    elif case == "api":
+        try:
+            from fastapi.testclient import TestClient
+            from git1file import main as api
+        except ImportError as e:
+            return {"skipped": f"API client unavailable: {e}"}
+        # Потолок сервера тоже ниже 500k; воркер — отдельный процесс, меняем его на месте
+        api.MAX_TOTAL_FILES = BENCH_LIMITS["max_total_files"]
+        api.MAX_TOTAL_CHARS = BENCH_LIMITS["max_total_chars"]
+        app = api.app
+        response = TestClient(app).post("/api/v1/ingest", json={"source": str(repo)})
+        response.raise_for_status()
+    else:
+        raise ValueError(f"Unknown case: {case}")
+
+    seconds = time.perf_counter() - start
+    io_after = read_proc_io()
+
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if case == "cli" else resource.RUSAGE_SELF)
+    result = {"seconds": round(seconds, 4), "peak_rss_kb": usage.ru_maxrss}
+    if case != "cli" and io_before and io_after:
+        result["syscalls_read"] = io_after["syscr"] - io_before["syscr"]
+        result["syscalls_write"] = io_after["syscw"] - io_before["syscw"]
+    return result
+
+
+def ensure_repository(workdir: Path, files: int, seed: int) -> Path:
+    repo = workdir / f"repo-{files}-{seed}"
+    marker = workdir / f"repo-{files}-{seed}.done"  # вне дерева, чтобы не попасть в скан
+    if not marker.exists():
+        print(f"Generating {files} files in {repo}...", file=sys.stderr)
+        generate_repository(repo, files, node_modules_files=files // 10, seed=seed)
+        marker.write_text("ok", encoding="utf-8")
+    # Те же лимиты для CLI; пишется и в деревья, сгенерированные раньше
+    config_path = repo / ".git1file.yaml"
+    config_text = "include:\n" + "".join(f"  {key}: {value}\n" for key, value in BENCH_LIMITS.items())
+    if not config_path.exists() or config_path.read_text(encoding="utf-8") != config_text:
+        config_path.write_text(config_text, encoding="utf-8")
+    return repo
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="git1file benchmark suite")
+    parser.add_argument("--sizes", nargs="+", default=["1k"], help="File counts: 1k, 50k, 500k or a number")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=CASES)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=str(Path.home() / ".cache" / "git1file-bench"))
+    parser.add_argument("--output", "-o", help="Write JSON results to this file")
+    parser.add_argument("--worker", nargs=2, metavar=("CASE", "REPO"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        case, repo = args.worker
+        print(json.dumps(run_case(case, Path(repo))))
+        return
+
+    workdir = Path(args.workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    results = []
+    for label in args.sizes:
+        files = parse_size(label)
+        repo = ensure_repository(workdir, files, args.seed)
+        for case in args.cases:
+            runs = []
+            for _ in range(args.repeat):
+                completed = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.run", "--worker", case, str(repo)],
+                    cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+                )
+                runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+            best = min(runs, key=lambda r: r.get("seconds", float("inf")))
+            entry = {"size": label, "files": files, "case": case, **best}
+            results.append(entry)
+            print(json.dumps(entry), file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+﻿# benchmarks/synthetic.py
+"""
+Deterministic synthetic repository generator for benchmarks.
+
+Knobs: file count, directory depth, file size distribution (log-normal),
+binary ratio, node_modules bloat, nested .gitignore files and duplicates.
+The same arguments and seed always produce the same tree.
+"""
+import json
+import math
+import random
+from pathlib import Path
+
+PY_TEMPLATE = '''"""Module {name}: generated for benchmarks."""
+import os
+from pkg{dep_a}.mod{dep_b} import helper_{dep_b}
+
+
+# Constants
+LIMIT_{idx} = {idx}
+
+
+class Worker{idx}:
+    """Does synthetic work."""
+
+    def __init__(self, value):
+        # store value
+        self.value = value
+
+    def run(self, items):
+        total = 0
+        for item in items:
+            if item % 3 == 0:
+                total += item * self.value
+            else:
+                total -= item
+        return total
+
+
+def helper_{idx}(x):
+    """Helper {idx}."""
+    return [i * x for i in range(LIMIT_{idx})]
+'''
+
+JS_TEMPLATE = '''// Component {idx}
+import {{ helper{dep_b} }} from '../mod{dep_b}';
+
+/* Renders synthetic rows */
+export function render{idx}(rows) {{
+  const out = [];
+  for (const row of rows) {{
+    if (row.id % 2 === 0) {{
+      out.push(`<li>${{row.name}}</li>`);
+    }}
+  }}
+  return out.join('\\n');
+}}
+'''
+
+GO_TEMPLATE = '''package pkg{dep_a}
+
+import "fmt"
+
+// Handler{idx} handles synthetic requests.
+type Handler{idx} struct {{
+	Count int
+}}
+
+func (h *Handler{idx}) Serve(items []int) int {{
+	total := 0
+	for _, item := range items {{
+		total += item * h.Count
+	}}
+	fmt.Println(total)
+	return total
+}}
+'''
+
+MD_TEMPLATE = '''# Document {idx}
+
+Synthetic documentation section {idx} referencing module {dep_b}.
+
+- item one
+- item two
+'''
+
+# Доли языков среди текстовых файлов
+LANGUAGE_MIX = [(".py", PY_TEMPLATE, 0.5), (".js", JS_TEMPLATE, 0.25), (".go", GO_TEMPLATE, 0.15),
+                (".md", MD_TEMPLATE, 0.10)]
+
+GITIGNORE_BODY = "*.log\nbuild/\ntmp_*\n"
+
+
+def _pick_language(rng: random.Random):
+    roll = rng.random()
+    for suffix, template, share in LANGUAGE_MIX:
+        if roll < share:
+            return suffix, template
+        roll -= share
+    return LANGUAGE_MIX[0][0], LANGUAGE_MIX[0][1]
+
+
+def _render(template: str, target_size: int, idx: int, dep_a: int, dep_b: int) -> str:
+    chunk = template.format(name=idx, idx=idx, dep_a=dep_a, dep_b=dep_b)
+    repeat = max(1, math.ceil(target_size / len(chunk)))
+    return chunk * repeat
+
+
+def generate_repository(
+        root: Path,
+        files: int,
+        depth: int = 3,
+        mean_size: int = 2048,
+        size_sigma: float = 1.0,
+        binary_ratio: float = 0.05,
+        node_modules_files: int = 0,
+        nested_gitignores: bool = True,
+        duplicate_ratio: float = 0.05,
+        seed: int = 0,
+) -> Path:
+    """
+    Creates a synthetic repository under `root` with `files` tracked files
+    (plus `node_modules_files` files of dependency bloat) and returns `root`.
+    """
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    packages = max(1, files // 200)
+    # Логнормальное распределение с заданным средним
+    mu = math.log(max(mean_size, 1)) - size_sigma ** 2 / 2
+    written = []
+
+    (root / ".gitignore").write_text("*.log\n.cache/\n", encoding="utf-8")
+
+    for idx in range(files):
+        package = idx % packages
+        subdirs = [f"pkg{package}"] + [f"sub{(idx >> (2 * level)) % 4}" for level in range(depth - 1)]
+        directory = root.joinpath(*subdirs)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        if nested_gitignores and idx % 500 == 0:
+            (directory / ".gitignore").write_text(GITIGNORE_BODY, encoding="utf-8")
+
+        size = int(rng.lognormvariate(mu, size_sigma))
+        if rng.random() < binary_ratio:
+            (directory / f"blob{idx}.dat").write_bytes(rng.randbytes(max(size, 16)))
+            continue
+
+        if written and rng.random() < duplicate_ratio:
+            source = written[rng.randrange(len(written))]
+            target = directory / f"copy{idx}{source.suffix}"
+            target.write_bytes(source.read_bytes())
+            continue
+
+        suffix, template = _pick_language(rng)
+        target = directory / f"mod{idx}{suffix}"
+        target.write_text(
+            _render(template, size, idx, rng.randrange(packages), rng.randrange(files)),
+            encoding="utf-8"
+        )
+        # Для дубликатов хватает первых файлов, не держим в памяти весь список
+        if len(written) < 1000:
+            written.append(target)
+
+    if node_modules_files:
+        for idx in range(node_modules_files):
+            directory = root / "node_modules" / f"dep{idx % 100}" / "lib"
+            directory.mkdir(parents=True, exist_ok=True)
+            (directory / f"index{idx}.js").write_text(
+                _render(JS_TEMPLATE, 1024, idx, 0, idx), encoding="utf-8"
+            )
+        (root / "node_modules" / "package.json").write_text(json.dumps({"name": "bloat"}), encoding="utf-8")
+
+    return root
@@ -1,90 +1,363 @@
 ﻿import sys
 import argparse
+import time
 from pathlib import Path
+from typing import Optional
 from git1file.analyzer import analyze_repository
 from git1file.config import load_config
 from git1file.git_service import process_source, cleanup_temp_repo
-from git1file.formatters.plain_formatter import format_plain, format_plain_markdown
-from git1file.formatters.xml_formatter import format_xml, format_xml_markdown
-from git1file.formatters.json_formatter import format_json, format_json_markdown
-from git1file.models.schemas import OutputFormat, ScanMode
+from git1file.archive import is_archive_url
+from git1file.models.schemas import ConfigSchema, OutputFormat, ScanMode, FileOrder, MinifyMode
+from git1file.metrics import PipelineStats, collect_stats, span
+from git1file.formatters import load_formatters, temp_output_path, write_output_atomic
+
+
+def add_scan_arguments(parser: argparse.ArgumentParser) -> None:
+    """Опции, общие для разового запуска и watch."""
+    parser.add_argument("--format", choices=["xml", "plain", "json"], default="plain",
+                        help="Output format (default: plain)")
+    parser.add_argument("--mode", choices=["full", "smart"], default="smart",
+                        help="Scan mode: 'full' includes all files, 'smart' excludes service files")
+    parser.add_argument("--order", choices=["rank", "path", "churn", "recent"], default="rank",
+                        help="File order: 'rank' puts entry points and core modules first, tests last; "
+                             "'churn' / 'recent' put the most often / most recently changed files first")
+    parser.add_argument("--minify", choices=["none", "whitespace", "strip", "skeleton"], default="none",
+                        help="Content minification: collapse whitespace, strip comments, or keep only signatures")
+    parser.add_argument("--truncate", action="store_true",
+                        help="Stop at max_total_files / max_total_chars and report omitted files instead of failing")
+    parser.add_argument("--include-markdown", action="store_true",
+                        help="Include .md files in the main output (excluded by default)")
+    parser.add_argument("--excerpt", action="store_true",
+                        help="Emit head/tail excerpts of files over max_file_size instead of skipping them")
+    parser.add_argument("--history", type=int, default=0, metavar="N",
+                        help="Add per-file churn and last-change time from the last N commits "
+                             "(default with --order churn/recent: 1000)")
+
+
+def load_cli_config(repo_path: Optional[Path], args):
+    """repo_path=None — источник без рабочего дерева (архив): настройки по умолчанию, как в API."""
+    if repo_path is None:
+        config = ConfigSchema()
+    else:
+        with span("config"):
+            config = load_config(repo_path / ".git1file.yaml")
+    config.output.format = OutputFormat(args.format)
+    config.output.mode = ScanMode(args.mode)
+    config.output.order = FileOrder(args.order)
+    config.output.minify = MinifyMode(args.minify)
+    config.include.include_markdown = args.include_markdown
+    config.include.truncate_on_limit = args.truncate
+    if args.excerpt:
+        config.include.excerpt_large_files = True
+    if args.history:
+        config.output.history_commits = args.history
+    return config
+
+
+def output_tree(repo_path: Path, config, args) -> None:
+    """Карта репозитория: только метаданные файлов, содержимое не читается."""
+    from git1file.config import CompiledConfig
+    from git1file.tree import build_tree, format_tree
+
+    root = build_tree(repo_path, CompiledConfig(config), use_index=not args.no_index)
+    result = format_tree(root, args.tree_depth)
+    if args.output:
+        Path(args.output).write_text(result, encoding="utf-8")
+        print(f"✅ Written to {args.output}")
+    else:
+        sys.stdout.write(result)
+
+
+def output_archive_stream(url: str, config, args) -> None:
+    """Plain-вывод по мере скачивания архива: файлы в порядке архива, итоги в конце."""
+    from git1file.archive import ArchiveStream
+    from git1file.formatters.plain_formatter import iter_plain_stream
+    from git1file.passthrough import write_pieces
+
+    files = ArchiveStream(url, config, args.strip_components)
+    pieces = iter_plain_stream(files.name, url, files, files.summary)
+    if args.output:
+        with open(args.output, "wb") as out:
+            write_pieces(pieces, out)
+        print(f"✅ Written to {args.output}")
+    else:
+        sys.stdout.flush()
+        write_pieces(pieces, sys.stdout.buffer)
+        sys.stdout.buffer.write(b"\n")
+        sys.stdout.flush()
+
+
+def watch_main(argv):
+    from git1file.watcher import DEFAULT_DEBOUNCE, DEFAULT_POLL_INTERVAL, watch_repository
+
+    parser = argparse.ArgumentParser(
+        prog="git1file watch",
+        description="Keep the output file up to date while the repository changes"
+    )
+    parser.add_argument("path", help="Local repository path")
+    parser.add_argument("--output", "-o", required=True, help="Output file, rewritten after every change")
+    add_scan_arguments(parser)
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE, metavar="SECONDS",
+                        help=f"Wait this long after the last change before rebuilding (default: {DEFAULT_DEBOUNCE})")
+    parser.add_argument("--poll", action="store_true", help="Poll for changes instead of using inotify")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, metavar="SECONDS",
+                        help=f"Polling interval (default: {DEFAULT_POLL_INTERVAL})")
+    args = parser.parse_args(argv)
+
+    repo_path = Path(args.path)
+    if not repo_path.is_dir():
+        print(f"Error: {args.path} is not a local directory", file=sys.stderr)
+        sys.exit(1)
+    output = Path(args.output).resolve()
+
+    def on_update(analysis, changed, started):
+        write_output_atomic(analysis, output, args.format)
+        elapsed = (time.perf_counter() - started) * 1000
+        if changed is None:
+            what = f"{analysis.metadata.total_files} files"
+        else:
+            what = f"{len(changed)} changed"
+        print(f"🔄 {output.name}: {what}, {elapsed:.1f} ms", file=sys.stderr)
+
+    print(f"👀 Watching {repo_path} → {output} (Ctrl+C to stop)", file=sys.stderr)
+    try:
+        watch_repository(
+            repo_path,
+            lambda: load_cli_config(repo_path, args),
+            on_update,
+            exclude=[output, temp_output_path(output)],
+            debounce=args.debounce,
+            use_inotify=not args.poll,
+            poll_interval=args.poll_interval
+        )
+    except KeyboardInterrupt:
+        print("\nStopped", file=sys.stderr)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def batch_main(argv):
+    from git1file.batch import DEFAULT_CLONE_JOBS, read_sources, run_batch
+
+    parser = argparse.ArgumentParser(
+        prog="git1file batch",
+        description="Convert many repositories concurrently, with a resumable JSON manifest"
+    )
+    parser.add_argument("sources", help="Text file with one local path or remote URL per line")
+    parser.add_argument("--out-dir", required=True, help="Directory for output files and manifest.json")
+    add_scan_arguments(parser)
+    parser.add_argument("--workers", type=int, default=0, metavar="N",
+                        help="Processes for scanning and formatting (default: CPU count)")
+    parser.add_argument("--clone-jobs", type=int, default=DEFAULT_CLONE_JOBS, metavar="N",
+                        help=f"Concurrent clones (default: {DEFAULT_CLONE_JOBS})")
+    parser.add_argument("--jobs", type=int, default=0, metavar="N",
+                        help="Repositories in flight at once (default: workers + clone jobs)")
+    parser.add_argument("--full-clone", action="store_true",
+                        help="Clone full history instead of a shallow clone of the default branch "
+                             "(implied by --history and --order churn|recent)")
+    parser.add_argument("--no-retry-failed", action="store_true",
+                        help="On resume, skip sources that failed in a previous run")
+    args = parser.parse_args(argv)
+
+    sources = read_sources(Path(args.sources))
+    options = {
+        "format": args.format,
+        "mode": args.mode,
+        "order": args.order,
+        "minify": args.minify,
+        "include_markdown": args.include_markdown,
+        "truncate": args.truncate,
+        "excerpt": args.excerpt,
+        "history": args.history,
+    }
+    done = {"ok": 0, "failed": 0}
+
+    def on_result(source, entry):
+        done[entry["status"]] += 1
+        progress = f"[{done['ok'] + done['failed']}]"
+        if entry["status"] == "ok":
+            print(f"✅ {progress} {source} → {entry['output']} "
+                  f"({entry['bytes'] / 1024:.1f} KB, {entry['seconds']:.1f}s)", file=sys.stderr)
+        else:
+            print(f"❌ {progress} {source}: {entry['error']}", file=sys.stderr)
+
+    started = time.perf_counter()
+    try:
+        manifest = run_batch(
+            sources, Path(args.out_dir), options,
+            jobs=args.jobs or None,
+            clone_jobs=args.clone_jobs,
+            workers=args.workers or None,
+            shallow=not args.full_clone,
+            retry_failed=not args.no_retry_failed,
+            on_result=on_result
+        )
+    except KeyboardInterrupt:
+        print("\nInterrupted — rerun the same command to resume", file=sys.stderr)
+        sys.exit(130)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    failed = sum(1 for source in sources if not manifest.is_done(source))
+    print(f"\n📦 {len(sources) - failed}/{len(sources)} converted in {time.perf_counter() - started:.1f}s, "
+          f"manifest: {manifest.path}", file=sys.stderr)
+    if failed:
+        sys.exit(1)
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "watch":
+        return watch_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        return batch_main(sys.argv[2:])
+
     parser = argparse.ArgumentParser(
         description="Convert Git repos to single file",
-        epilog="Default format is 'plain'. Markdown files are excluded by default to save tokens."
+        epilog="Default format is 'plain'. Markdown files are excluded by default to save tokens. "
+               "Use 'watch <path> -o FILE' to keep an output file up to date, "
+               "'batch SOURCES.txt --out-dir DIR' to convert many repositories."
     )
     parser.add_argument("source", help="Local path or remote URL")
-    parser.add_argument("--format", choices=["xml", "plain", "json"], default="plain",
-                        help="Output format (default: plain)")
-    parser.add_argument("--mode", choices=["full", "smart"], default="smart",
-                        help="Scan mode: 'full' includes all files, 'smart' excludes service files")
     parser.add_argument("--output", "-o", help="Output file (stdout if not specified)")
+    add_scan_arguments(parser)
+    parser.add_argument("--profile", action="store_true",
+                        help="Print per-phase timings and counters to stderr")
+    parser.add_argument("--processes", type=int, default=0, metavar="N",
+                        help="Process files in N worker processes (CPU-heavy modes such as --minify)")
+
+    parser.add_argument("--query", "-q", metavar="TEXT",
+                        help="Keep only the files most relevant to TEXT (BM25 over identifiers and paths, "
+                             "index cached between runs)")
+    parser.add_argument("--top-k", type=int, default=None, metavar="N",
+                        help="With --query: at most N files (default: 20)")
+    parser.add_argument("--max-chars", type=int, default=None, metavar="N",
+                        help="With --query: at most N characters of selected files (default: 400000)")
+
+    parser.add_argument("--tree", action="store_true",
+                        help="Output only the directory tree with per-directory sizes and languages "
+                             "(no file contents are read)")
+    parser.add_argument("--tree-depth", type=int, default=0, metavar="N",
+                        help="With --tree: expand only N levels, deeper directories are summarised")
+    parser.add_argument("--no-index", action="store_true",
+                        help="With --tree: walk the file system instead of reading the git index")
+
+    parser.add_argument("--stream", action="store_true",
+                        help="Archive URLs (.tar.gz etc.): write plain output while the archive downloads, "
+                             "files in archive order and totals at the end")
+    parser.add_argument("--strip-components", type=int, default=None, metavar="N",
+                        help="Archive URLs: drop N leading path components (default: 1 for GitHub/GitLab "
+                             "archive links, 0 otherwise)")
 
     # NEW: Markdown options
-    parser.add_argument("--include-markdown", action="store_true",
-                        help="Include .md files in the main output (excluded by default)")
     parser.add_argument("--markdown-only", action="store_true",
                         help="Output only markdown files")
     parser.add_argument("--markdown-output", help="Separate output file for markdown files")
 
     args = parser.parse_args()
 
+    stats = PipelineStats()
     try:
-        repo_path, is_temp, _ = process_source(args.source)
-        config = load_config(repo_path / ".git1file.yaml")
-        config.output.format = OutputFormat(args.format)
-        config.output.mode = ScanMode(args.mode)
-        config.include.include_markdown = args.include_markdown
-
-        analysis = analyze_repository(repo_path, config)
-
-        # Handle markdown-only mode
-        if args.markdown_only:
-            if args.format == "xml":
-                result = format_xml_markdown(analysis)
-            elif args.format == "json":
-                result = format_json_markdown(analysis)
+        with collect_stats(stats):
+            # Лимиты считают то, что будет выведено: только markdown, код и markdown или по include_markdown
+            charge = None
+            if args.markdown_only:
+                charge = "markdown"
+            elif args.markdown_output:
+                charge = "all"
+            if is_archive_url(args.source):
+                # Архив читается потоком из сети: без клона и без записи на диск.
+                # Его .git1file.yaml ещё не прочитан — настройки по умолчанию и опции командной строки
+                if args.tree or args.query:
+                    raise ValueError("--tree and --query need a cloned repository, not an archive")
+                config = load_cli_config(None, args)
+                if args.stream:
+                    if args.format != "plain":
+                        raise ValueError("--stream writes plain output only")
+                    output_archive_stream(args.source, config, args)
+                    if args.profile:
+                        print("\n" + stats.summary(), file=sys.stderr)
+                    return
+                from git1file.archive import analyze_archive
+                repo_path, is_temp = None, False
+                analysis = analyze_archive(args.source, config, args.strip_components, charge=charge)
             else:
-                result = format_plain_markdown(analysis)
-        else:
-            # Normal output
-            if args.format == "xml":
-                result = format_xml(analysis)
-            elif args.format == "json":
-                result = format_json(analysis)
+                # Для дерева история не нужна — достаточно shallow clone
+                repo_path, is_temp, remote_url = process_source(args.source, 1 if args.tree else None)
+                config = load_cli_config(repo_path, args)
+
+                if args.tree:
+                    output_tree(repo_path, config, args)
+                    if is_temp:
+                        cleanup_temp_repo(repo_path, is_temp)
+                    if args.profile:
+                        print("\n" + stats.summary(), file=sys.stderr)
+                    return
+
+                query = None
+                if args.query:
+                    from git1file.search import DEFAULT_MAX_CHARS, DEFAULT_TOP_K, SearchQuery
+                    query = SearchQuery(
+                        args.query,
+                        top_k=args.top_k or DEFAULT_TOP_K,
+                        max_chars=args.max_chars or DEFAULT_MAX_CHARS,
+                        source=remote_url
+                    )
+
+                analysis = analyze_repository(repo_path, config, processes=args.processes, query=query,
+                                              charge=charge)
+
+            format_full, format_markdown, stream_writer = load_formatters(args.format)
+
+            # Handle markdown-only mode
+            writer = None
+            if args.markdown_only:
+                result = format_markdown(analysis)
+            elif stream_writer:
+                # plain and XML stream large files straight from disk
+                writer = stream_writer
             else:
-                result = format_plain(analysis)
+                result = format_full(analysis)
 
-        # Output main result
-        if args.output:
-            Path(args.output).write_text(result, encoding="utf-8")
-            print(f"✅ Written to {args.output}")
-        else:
-            print(result)
-
-        # Output markdown separately if requested
-        if args.markdown_output and not args.markdown_only:
-            if args.format == "xml":
-                md_result = format_xml_markdown(analysis)
-            elif args.format == "json":
-                md_result = format_json_markdown(analysis)
+            # Output main result
+            if args.output:
+                if writer:
+                    with open(args.output, "wb") as out:
+                        writer(analysis, out)
+                else:
+                    Path(args.output).write_text(result, encoding="utf-8")
+                print(f"✅ Written to {args.output}")
+            elif writer:
+                sys.stdout.flush()
+                writer(analysis, sys.stdout.buffer)
+                sys.stdout.buffer.write(b"\n")
+                sys.stdout.flush()
             else:
-                md_result = format_plain_markdown(analysis)
+                print(result)
+
+            # Output markdown separately if requested
+            if args.markdown_output and not args.markdown_only:
+                md_result = format_markdown(analysis)
+                Path(args.markdown_output).write_text(md_result, encoding="utf-8")
+                print(f"📚 Markdown written to {args.markdown_output}")
+
+            # Show stats
+            if analysis.metadata.truncated:
+                print(f"\n✂️  Truncated by size limits: {analysis.metadata.omitted_files} files "
+                      f"({analysis.metadata.omitted_characters / 1024:.1f} KB) omitted", file=sys.stderr)
 
-            Path(args.markdown_output).write_text(md_result, encoding="utf-8")
-            print(f"📚 Markdown written to {args.markdown_output}")
+            if analysis.metadata.markdown_files > 0 and not args.include_markdown and not args.markdown_only:
+                print(f"\n💡 {analysis.metadata.markdown_files} markdown files excluded "
+                      f"({analysis.metadata.markdown_characters / 1024:.1f} KB)", file=sys.stderr)
+                print(f"   Use --include-markdown to include them or --markdown-output to save separately",
+                      file=sys.stderr)
 
-        # Show stats
-        if analysis.metadata.markdown_files > 0 and not args.include_markdown and not args.markdown_only:
-            print(f"\n💡 {analysis.metadata.markdown_files} markdown files excluded "
-                  f"({analysis.metadata.markdown_characters / 1024:.1f} KB)", file=sys.stderr)
-            print(f"   Use --include-markdown to include them or --markdown-output to save separately",
-                  file=sys.stderr)
+            if is_temp:
+                cleanup_temp_repo(repo_path, is_temp)
 
-        if is_temp:
-            cleanup_temp_repo(repo_path, is_temp)
+        if args.profile:
+            print("\n" + stats.summary(), file=sys.stderr)
 
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
@@ -1,26 +1,112 @@
 ﻿from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
 import logging
 from .models.schemas import (
     RepositoryAnalysis,
     RepositoryMetadata,
     LanguageStats,
     FileInfo,
-    ConfigSchema
+    ConfigSchema,
+    FileOrder,
+    MinifyMode
 )
-from .file_processor import scan_repository
+from .config import CompiledConfig
+from .file_processor import scan_repository, Charge, ScanBudget
+from .classifier import LanguageTally
+from .ranker import rank_files, sort_by_churn, sort_by_path, sort_by_recency
+from .metrics import span
 from .git_service import get_repo_info
 
+if TYPE_CHECKING:
+    from .search import SearchQuery
+
 logger = logging.getLogger(__name__)
 
+ORDERINGS = {
+    FileOrder.RANK: rank_files,
+    FileOrder.PATH: sort_by_path,
+    FileOrder.CHURN: sort_by_churn,
+    FileOrder.RECENT: sort_by_recency,
+}
+
+
+def history_commits(config: ConfigSchema) -> int:
+    """Сколько коммитов читать; порядок churn/recent без явного значения берёт значение по умолчанию."""
+    if config.output.history_commits > 0:
+        return config.output.history_commits
+    if config.output.order in (FileOrder.CHURN, FileOrder.RECENT):
+        from .history import DEFAULT_HISTORY_COMMITS
+        return DEFAULT_HISTORY_COMMITS
+    return 0
+
 
-def analyze_repository(repo_path: Path, config: ConfigSchema) -> RepositoryAnalysis:
+def analyze_repository(
+        repo_path: Path,
+        config: ConfigSchema,
+        processes: int = 0,
+        query: Optional["SearchQuery"] = None,
+        charge: Optional[Charge] = None
+) -> RepositoryAnalysis:
+    """
+    processes > 1 распределяет чтение и минификацию файлов по пулу процессов.
+    query оставляет в выводе только самые релевантные файлы (индекс обновляется по результатам скана).
+    charge — какие файлы считаются в лимитах (см. ScanBudget); markdown-выводу нужен "markdown".
+    """
     logger.info(f"Starting analysis of {repo_path}")
 
-    file_infos, markdown_files = scan_repository(
-        repo_path, config.ignore, config.include, config.output.mode
+    compiled = CompiledConfig(config)
+    budget = ScanBudget(compiled, charge=charge)
+    with span("scan"):
+        if processes > 1:
+            from .parallel import scan_repository_parallel
+            file_infos, markdown_files = scan_repository_parallel(
+                repo_path, compiled, processes, config.output.minify, budget
+            )
+        else:
+            file_infos, markdown_files = scan_repository(repo_path, compiled, budget)
+
+    order_files = None
+    git_info = None
+    if query is not None:
+        from .search import relevance_order
+        # Коммит нужен ключу индекса — тот же результат идёт в метаданные
+        with span("git_info"):
+            git_info = get_repo_info(repo_path)
+        order_files = relevance_order(repo_path, file_infos + markdown_files, query, commit=git_info[1])
+
+    return build_analysis(
+        repo_path, config, file_infos, markdown_files, budget,
+        minified=processes > 1,
+        order_files=order_files,
+        git_info=git_info
     )
 
+
+def build_analysis(
+        repo_path: Path,
+        config: ConfigSchema,
+        file_infos: List[FileInfo],
+        markdown_files: List[FileInfo],
+        budget: ScanBudget,
+        minified: bool = False,
+        order_files: Optional[Callable[[List[FileInfo]], List[FileInfo]]] = None,
+        git_info: Optional[Tuple[Optional[str], Optional[str]]] = None,
+        history: bool = True
+) -> RepositoryAnalysis:
+    """
+    Everything after the scan: markdown split, ordering, minification, stats.
+    Watch mode calls it with per-file results kept in memory between rebuilds;
+    `minified` says content is already minified, `order_files` overrides ranking.
+    `git_info` (branch, commit) is passed when the caller already has it, or
+    for sources with no work tree on disk, such as streamed archives, which
+    also pass history=False.
+    """
+    if budget.truncated:
+        logger.warning(
+            f"Output truncated by limits: {budget.omitted_files} files "
+            f"({budget.omitted_characters} chars) omitted"
+        )
+
     # Если include_markdown=True, добавляем markdown к основным файлам
     if config.include.include_markdown:
         all_files = file_infos + markdown_files
@@ -29,6 +115,31 @@ def analyze_repository(repo_path: Path, config: ConfigSchema) -> RepositoryAnaly
         all_files = file_infos
         markdown_in_analysis = markdown_files
 
+    # История git: churn и время последнего изменения, до сортировки
+    walked_commits = 0
+    max_commits = history_commits(config) if history else 0
+    if max_commits > 0:
+        from .history import attach_history, load_history
+        repo_history = load_history(repo_path, max_commits)
+        if repo_history is not None:
+            walked_commits = repo_history.commits
+            attach_history(all_files, repo_history)
+            attach_history(markdown_in_analysis, repo_history)
+
+    # Порядок вывода: точки входа и часто импортируемые модули первыми, тесты в конце
+    if order_files is None:
+        order_files = ORDERINGS[config.output.order]
+    with span("rank"):
+        all_files = order_files(all_files)
+        markdown_in_analysis = order_files(markdown_in_analysis)
+
+    # Минификация меняет только content: size остаётся размером файла на диске.
+    # В режиме пула процессов и в watch она уже выполнена при чтении файлов
+    if not minified and config.output.minify != MinifyMode.NONE:
+        from .minifier import minify_files
+        with span("minify"):
+            all_files = minify_files(all_files, config.output.minify)
+
     total_files = len(all_files)
     total_chars = sum(f.size for f in all_files)
 
@@ -39,24 +150,19 @@ def analyze_repository(repo_path: Path, config: ConfigSchema) -> RepositoryAnaly
     if total_files > 50000:
         logger.warning(f"Large repository: {total_files} files")
 
-    lang_stats = {}
+    tally = LanguageTally()
     for file_info in all_files:
-        if file_info.language:
-            lang = file_info.language
-            lang_stats.setdefault(lang, {"files": 0, "chars": 0})
-            lang_stats[lang]["files"] += 1
-            lang_stats[lang]["chars"] += file_info.size
-
-    languages = sorted(
-        [
-            LanguageStats(name=lang, files=stats["files"], characters=stats["chars"])
-            for lang, stats in lang_stats.items()
-        ],
-        key=lambda x: x.files,
-        reverse=True
-    )
+        tally.add(file_info.language, file_info.size)
+
+    languages = [
+        LanguageStats(name=lang, files=files, characters=chars)
+        for lang, files, chars in tally.most_common()
+    ]
 
-    branch, commit = get_repo_info(repo_path)
+    if git_info is None:
+        with span("git_info"):
+            git_info = get_repo_info(repo_path)
+    branch, commit = git_info
 
     metadata = RepositoryMetadata(
         name=repo_path.name,
@@ -68,7 +174,11 @@ def analyze_repository(repo_path: Path, config: ConfigSchema) -> RepositoryAnaly
         git_commit=commit,
         is_git_repo=branch is not None,
         markdown_files=markdown_count,
-        markdown_characters=markdown_chars
+        markdown_characters=markdown_chars,
+        truncated=budget.truncated,
+        omitted_files=budget.omitted_files,
+        omitted_characters=budget.omitted_characters,
+        history_commits=walked_commits
     )
 
     logger.info(f"Analysis complete: {total_files} files, {markdown_count} markdown files")
@@ -88,5 +198,9 @@ def get_quick_stats(analysis: RepositoryAnalysis) -> dict:
         "git_branch": analysis.metadata.git_branch,
         "git_commit": analysis.metadata.git_commit,
         "markdown_files": analysis.metadata.markdown_files,
-        "markdown_characters": analysis.metadata.markdown_characters
+        "markdown_characters": analysis.metadata.markdown_characters,
+        "truncated": analysis.metadata.truncated,
+        "omitted_files": analysis.metadata.omitted_files,
+        "omitted_characters": analysis.metadata.omitted_characters,
+        "history_commits": analysis.metadata.history_commits
     }
\ No newline at end of file
@@ -0,0 +1,287 @@
+﻿# git1file/archive.py
+"""
+Remote sources served as tarballs: GitHub/GitLab archive URLs, or `git
+archive` output behind any HTTP server.
+
+The archive is never written to disk. A download thread fills a bounded
+buffer while tarfile decompresses members in stream mode, so the network,
+decompression and the formatter all make progress at the same time, and a
+file is processed as soon as its member has arrived.
+"""
+import contextvars
+import io
+import logging
+import queue
+import re
+import threading
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Iterator, Optional
+
+from .models.schemas import (
+    ConfigSchema,
+    FileInfo,
+    LanguageStats,
+    MinifyMode,
+    RepositoryAnalysis,
+    RepositoryMetadata
+)
+from .config import CompiledConfig
+from .file_processor import Charge, ScanBudget, process_blob, split_markdown
+from .classifier import LanguageTally
+from .metrics import incr, span
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# Ссылки хостингов без суффикса: codeload.github.com/o/r/tar.gz/<ref>, api.github.com/.../tarball/<ref>
+_ARCHIVE_PATH_RE = re.compile(r'/(?:tar\.gz|tarball)/')
+# Архивы хостингов (github .../archive/<ref>, gitlab .../-/archive/<ref>/) лежат под каталогом <repo>-<ref>/
+_HOST_ARCHIVE_PATH_RE = re.compile(r'/(?:archive|tar\.gz|tarball)/')
+
+DOWNLOAD_CHUNK = 256 * 1024
+READ_AHEAD_CHUNKS = 16  # не больше 4 МБ скачано впрок
+DEFAULT_TIMEOUT = 30.0
+
+
+def is_archive_url(source: str) -> bool:
+    if not re.match(r'^https?://', source):
+        return False
+    path = source.split('?', 1)[0].split('#', 1)[0]
+    return path.endswith(ARCHIVE_SUFFIXES) or _ARCHIVE_PATH_RE.search(path) is not None
+
+
+def default_strip_components(url: str) -> int:
+    """
+    1 for host archive links, whose members are all under one top-level
+    directory; 0 otherwise, as for plain `git archive` output.
+    """
+    path = url.split('?', 1)[0].split('#', 1)[0]
+    return 1 if _HOST_ARCHIVE_PATH_RE.search(path) else 0
+
+
+def archive_name(url: str) -> str:
+    """Имя репозитория из ссылки: компонент перед /archive/, /tar.gz/ или имя файла без суффикса."""
+    parts = [part for part in url.split('?', 1)[0].split('/') if part]
+    for index, part in enumerate(parts):
+        if part in ("archive", "tar.gz", "tarball") and index > 0:
+            return parts[index - 1]
+    name = parts[-1] if parts else "archive"
+    for suffix in ARCHIVE_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)] or "archive"
+    return name
+
+
+class PrefetchReader(io.RawIOBase):
+    """
+    Read-only stream over a response that a background thread keeps
+    downloading into a bounded queue of chunks.
+    """
+
+    def __init__(self, response: BinaryIO, chunk_size: int = DOWNLOAD_CHUNK, depth: int = READ_AHEAD_CHUNKS):
+        super().__init__()
+        self._response = response
+        self._chunk_size = chunk_size
+        self._chunks: "queue.Queue" = queue.Queue(maxsize=depth)
+        self._pending = memoryview(b"")
+        self._closing = threading.Event()
+        self._eof = False
+        # Копия контекста: счётчики загрузки попадают в статистику текущего запроса
+        self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self._download,),
+                                        name="git1file-download", daemon=True)
+        self._thread.start()
+
+    def _download(self) -> None:
+        try:
+            while not self._closing.is_set():
+                chunk = self._response.read(self._chunk_size)
+                incr("bytes_downloaded", len(chunk))
+                self._put(chunk)
+                if not chunk:
+                    return
+        except BaseException as e:
+            self._put(e)
+
+    def _put(self, item) -> None:
+        while not self._closing.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if not self._pending:
+            if self._eof:
+                return 0
+            item = self._chunks.get()
+            if isinstance(item, BaseException):
+                self._eof = True
+                raise item
+            if not item:
+                self._eof = True
+                return 0
+            self._pending = memoryview(item)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            # Поток загрузки может ждать места в очереди — будим его и закрываем соединение
+            self._closing.set()
+            self._response.close()
+        super().close()
+
+
+def open_archive(url: str, timeout: float = DEFAULT_TIMEOUT) -> BinaryIO:
+    """Starts the download and returns a buffered stream of the archive bytes."""
+    import urllib.request
+
+    request = urllib.request.Request(url, headers={"User-Agent": "git1file"})
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except Exception as e:
+        raise RuntimeError(f"Failed to download archive {url}: {e}")
+    return io.BufferedReader(PrefetchReader(response), DOWNLOAD_CHUNK)
+
+
+class ArchiveReader:
+    """
+    FileInfo objects of a tar stream (any compression tarfile detects), in
+    member order. The first `strip_components` path components are removed,
+    as with `tar --strip-components`: host tarballs and `git archive --prefix`
+    put everything under one top-level directory, plain `git archive` does not.
+    """
+
+    def __init__(self, stream: BinaryIO, compiled: CompiledConfig, budget: ScanBudget, strip_components: int = 0):
+        self.stream = stream
+        self.compiled = compiled
+        self.budget = budget
+        self.strip_components = strip_components
+        self.commit: Optional[str] = None  # из pax-заголовка `git archive`
+
+    def __iter__(self) -> Iterator[FileInfo]:
+        import tarfile
+
+        # .gitignore не применяется: в архиве только файлы, которые git и так хранит
+        matcher = self.compiled.ignore
+        with tarfile.open(fileobj=self.stream, mode="r|*") as tar:
+            for member in tar:
+                if self.commit is None:
+                    self.commit = tar.pax_headers.get("comment")
+                if not member.isfile():
+                    continue
+                parts = member.name.split("/")[self.strip_components:]
+                if not parts or not parts[-1]:
+                    continue
+                relative_path = PurePosixPath(*parts)
+                incr("files_visited")
+                with span("ignore"):
+                    ignored = matcher.matches(relative_path)
+                if ignored:
+                    incr("files_ignored")
+                    continue
+                if not self.budget.admit(relative_path, member.size):
+                    continue
+                member_file = tar.extractfile(member)
+                yield process_blob(relative_path, member.size, member_file.read, self.compiled)
+
+
+def _short_commit(commit: Optional[str]) -> Optional[str]:
+    return commit[:8] if commit else None
+
+
+def analyze_archive(url: str, config: ConfigSchema, strip_components: Optional[int] = None,
+                    charge: Optional[Charge] = None) -> RepositoryAnalysis:
+    """
+    analyze_repository for an archive URL: the whole archive is read, then
+    ranked and formatted as usual. strip_components=None picks
+    default_strip_components(url).
+    """
+    from .analyzer import build_analysis
+
+    if strip_components is None:
+        strip_components = default_strip_components(url)
+    logger.info(f"Streaming archive {url}")
+    compiled = CompiledConfig(config)
+    budget = ScanBudget(compiled, charge=charge)
+    with span("scan"):
+        with open_archive(url) as stream:
+            reader = ArchiveReader(stream, compiled, budget, strip_components)
+            file_infos, markdown_files = split_markdown(reader)
+
+    analysis = build_analysis(
+        Path(archive_name(url)), config, file_infos, markdown_files, budget,
+        git_info=(None, _short_commit(reader.commit)),
+        history=False
+    )
+    analysis.metadata.path = url
+    # Ветки у архива нет, но коммит из pax-заголовка — признак git-источника
+    analysis.metadata.is_git_repo = reader.commit is not None
+    return analysis
+
+
+class ArchiveStream:
+    """
+    Files of an archive in arrival order for iter_plain_stream, with the
+    bookkeeping of build_analysis done on the fly: markdown split,
+    per-file minification and the totals for summary().
+    """
+
+    def __init__(self, url: str, config: ConfigSchema, strip_components: Optional[int] = None):
+        self.url = url
+        self.name = archive_name(url)
+        self.config = config
+        self.compiled = CompiledConfig(config)
+        self.budget = ScanBudget(self.compiled)
+        # Начало вывода уже отдано: по лимитам можно только обрезать, не отказать
+        self.budget.truncate = True
+        self.strip_components = default_strip_components(url) if strip_components is None else strip_components
+        self._reader: Optional[ArchiveReader] = None
+        self._tally = LanguageTally()
+        self._files = self._characters = 0
+        self._markdown_files = self._markdown_characters = 0
+
+    def __iter__(self) -> Iterator[FileInfo]:
+        include_markdown = self.config.include.include_markdown
+        minify = self.config.output.minify
+        with open_archive(self.url) as stream:
+            self._reader = ArchiveReader(stream, self.compiled, self.budget, self.strip_components)
+            for file_info in self._reader:
+                if file_info.language == 'markdown' and not include_markdown:
+                    self._markdown_files += 1
+                    self._markdown_characters += file_info.size
+                    continue
+                if minify != MinifyMode.NONE:
+                    from .minifier import minify_files
+                    with span("minify"):
+                        file_info = minify_files([file_info], minify)[0]
+                self._files += 1
+                self._characters += file_info.size
+                self._tally.add(file_info.language, file_info.size)
+                yield file_info
+
+    def summary(self) -> RepositoryMetadata:
+        commit = _short_commit(self._reader.commit if self._reader else None)
+        return RepositoryMetadata(
+            name=self.name,
+            path=self.url,
+            total_files=self._files,
+            total_characters=self._characters,
+            languages=[
+                LanguageStats(name=lang, files=files, characters=chars)
+                for lang, files, chars in self._tally.most_common()
+            ],
+            git_commit=commit,
+            is_git_repo=commit is not None,
+            markdown_files=self._markdown_files,
+            markdown_characters=self._markdown_characters,
+            truncated=self.budget.truncated,
+            omitted_files=self.budget.omitted_files,
+            omitted_characters=self.budget.omitted_characters
+        )
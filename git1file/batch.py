@@ -0,0 +1,226 @@
+﻿# git1file/batch.py
+"""
+Batch conversion of many repositories in one process tree.
+
+Every source gets a coordinator thread: clone (network I/O, limited by its
+own semaphore) → analyse and format in a shared process pool (CPU) → write.
+The number of coordinator threads is the global limit on repositories in
+flight, which also bounds temporary disk use. manifest.json in the output
+directory is rewritten after every repository, so an interrupted run resumes
+by skipping the sources already converted.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .models.schemas import FileOrder, MinifyMode, OutputFormat, ScanMode
+from .git_service import cleanup_temp_repo, is_local_path, process_source
+from .formatters import EXTENSIONS, write_output_atomic
+from .metrics import PipelineStats, collect_stats
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+DEFAULT_CLONE_JOBS = 8
+
+
+def read_sources(path: Path) -> List[str]:
+    """One source per line; blank lines and # comments are skipped, duplicates dropped."""
+    sources = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            sources.append(line)
+    return list(dict.fromkeys(sources))
+
+
+def output_name(source: str, output_format: str) -> str:
+    """Stable file name: readable repo name plus a hash of the full source."""
+    name = re.split(r'[:/\\]', source.rstrip('/\\'))[-1]
+    if name.endswith(".git"):
+        name = name[:-len(".git")]
+    name = re.sub(r'[^\w.-]+', '_', name) or "repo"
+    digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:8]
+    return f"{name}-{digest}.{EXTENSIONS[output_format]}"
+
+
+def convert_repository(repo_path: str, output: str, options: Dict) -> Dict:
+    """Runs in a worker process: analyse one repository and write its output file."""
+    from .analyzer import analyze_repository
+    from .config import load_config
+
+    started = time.perf_counter()
+    stats = PipelineStats()
+    with collect_stats(stats):
+        config = load_config(Path(repo_path) / ".git1file.yaml")
+        config.output.format = OutputFormat(options["format"])
+        config.output.mode = ScanMode(options["mode"])
+        config.output.order = FileOrder(options["order"])
+        config.output.minify = MinifyMode(options["minify"])
+        config.include.include_markdown = options["include_markdown"]
+        config.include.truncate_on_limit = options["truncate"]
+        if options.get("excerpt"):
+            config.include.excerpt_large_files = True
+        if options.get("history"):
+            config.output.history_commits = options["history"]
+
+        analysis = analyze_repository(Path(repo_path), config)
+        size = write_output_atomic(analysis, Path(output), options["format"])
+
+    metadata = analysis.metadata
+    return {
+        "files": metadata.total_files,
+        "characters": metadata.total_characters,
+        "bytes": size,
+        "truncated": metadata.truncated,
+        "git_commit": metadata.git_commit,
+        "scan_seconds": round(time.perf_counter() - started, 3),
+        "timings_ms": {name: round(seconds * 1000, 1) for name, seconds in stats.timings.items()},
+    }
+
+
+class Manifest:
+    """Per-source results, rewritten atomically after every repository."""
+
+    def __init__(self, path: Path, options: Dict):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {
+            "version": MANIFEST_VERSION,
+            "options": options,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "repos": {},
+        }
+        if path.exists():
+            previous = json.loads(path.read_text(encoding="utf-8"))
+            if previous.get("version") == MANIFEST_VERSION and previous.get("options") == options:
+                self.data["repos"] = previous.get("repos", {})
+            else:
+                # Другие опции — прежние выходные файлы не соответствуют запросу
+                logger.warning("Manifest options changed, converting every source again")
+
+    def entry(self, source: str) -> Optional[Dict]:
+        return self.data["repos"].get(source)
+
+    def is_done(self, source: str) -> bool:
+        entry = self.entry(source)
+        return bool(entry and entry.get("status") == "ok"
+                    and (self.path.parent / entry["output"]).exists())
+
+    def record(self, source: str, entry: Dict) -> None:
+        with self._lock:
+            self.data["repos"][source] = entry
+            self.data["updated_at"] = datetime.now(timezone.utc).isoformat()
+            temp_path = self.path.with_name(f".{self.path.name}.tmp")
+            temp_path.write_text(json.dumps(self.data, indent=2, ensure_ascii=False), encoding="utf-8")
+            os.replace(temp_path, self.path)
+
+
+def _pool_context():
+    # fork из процесса с потоками может унаследовать захваченные блокировки
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _convert_one(
+        source: str,
+        out_dir: Path,
+        options: Dict,
+        pool: Executor,
+        clone_slots: threading.Semaphore,
+        depth: Optional[int]
+) -> Dict:
+    output = out_dir / output_name(source, options["format"])
+    entry: Dict = {"status": "failed", "output": output.name}
+    started = time.perf_counter()
+    repo_path, is_temp = None, False
+    try:
+        if is_local_path(source):
+            repo_path, is_temp, _ = process_source(source)
+        else:
+            with clone_slots:
+                clone_started = time.perf_counter()
+                repo_path, is_temp, _ = process_source(source, depth)
+                entry["clone_seconds"] = round(time.perf_counter() - clone_started, 3)
+        entry.update(pool.submit(convert_repository, str(repo_path), str(output), options).result())
+        entry["status"] = "ok"
+    except Exception as e:
+        entry["error"] = str(e) or type(e).__name__
+    finally:
+        if repo_path is not None:
+            cleanup_temp_repo(repo_path, is_temp)
+    entry["seconds"] = round(time.perf_counter() - started, 3)
+    entry["finished_at"] = datetime.now(timezone.utc).isoformat()
+    return entry
+
+
+def run_batch(
+        sources: Iterable[str],
+        out_dir: Path,
+        options: Dict,
+        jobs: Optional[int] = None,
+        clone_jobs: int = DEFAULT_CLONE_JOBS,
+        workers: Optional[int] = None,
+        shallow: bool = True,
+        retry_failed: bool = True,
+        on_result: Optional[Callable[[str, Dict], None]] = None
+) -> Manifest:
+    """
+    Converts every source into out_dir and returns the manifest.
+
+    options: format, mode, order, minify, include_markdown, truncate, excerpt, history.
+    With history or a churn/recent order, clones are full even when shallow
+    is set: a shallow clone has only the last commit.
+    workers — CPU processes for analysis; clone_jobs — concurrent clones;
+    jobs — repositories in flight (default workers + clone_jobs, so clones
+    of the next repositories overlap with scanning the current ones).
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Manifest(out_dir / MANIFEST_NAME, options)
+    workers = workers or os.cpu_count() or 1
+    jobs = jobs or workers + clone_jobs
+
+    pending = []
+    for source in sources:
+        if manifest.is_done(source):
+            continue
+        entry = manifest.entry(source)
+        if entry and entry.get("status") == "failed" and not retry_failed:
+            continue
+        pending.append(source)
+    logger.info(f"Batch: {len(pending)} sources to convert")
+
+    clone_slots = threading.Semaphore(clone_jobs)
+    # В shallow clone один коммит: churn у всех файлов был бы 1, время изменения — одно
+    needs_history = bool(options.get("history")) or options.get("order") in ("churn", "recent")
+    if shallow and needs_history:
+        logger.info("Batch: history requested, cloning full history")
+    depth = 1 if shallow and not needs_history else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool, \
+            ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="git1file-batch") as coordinators:
+        futures = {
+            coordinators.submit(_convert_one, source, out_dir, options, pool, clone_slots, depth): source
+            for source in pending
+        }
+        try:
+            for future in as_completed(futures):
+                source = futures[future]
+                entry = future.result()
+                manifest.record(source, entry)
+                if on_result:
+                    on_result(source, entry)
+        except BaseException:
+            # Прерывание: не начинаем новые репозитории, manifest уже содержит завершённые
+            coordinators.shutdown(wait=False, cancel_futures=True)
+            raise
+    return manifest
@@ -0,0 +1,239 @@
+﻿# git1file/classifier.py
+"""
+Language and binary classification from lookup tables built once at import.
+
+Lookup order: exact filename (Dockerfile, Makefile...), filename prefix
+(Dockerfile.dev), lower-cased extension, then a shebang sniffed from the first
+bytes the scanner has already read. Extensions known to be binary are
+classified without opening the file; the rest are checked by decoding the head.
+"""
+import codecs
+import re
+from pathlib import PurePath
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+HEAD_SIZE = 8192
+
+
+class FileClass(NamedTuple):
+    language: Optional[str]
+    is_known_binary: bool
+    is_markdown: bool
+
+
+UNKNOWN = FileClass(None, False, False)
+
+LANGUAGE_EXTENSIONS: Dict[str, Tuple[str, ...]] = {
+    'python': ('.py', '.pyw', '.pyi'),
+    'javascript': ('.js', '.mjs', '.cjs'),
+    'typescript': ('.ts', '.mts', '.cts'),
+    'jsx': ('.jsx',),
+    'tsx': ('.tsx',),
+    'java': ('.java',),
+    'c': ('.c', '.h'),
+    'cpp': ('.cpp', '.cc', '.cxx', '.c++', '.hpp', '.hh', '.hxx', '.ipp', '.inl'),
+    'objective-c': ('.m', '.mm'),
+    'csharp': ('.cs', '.csx'),
+    'fsharp': ('.fs', '.fsi', '.fsx'),
+    'vb': ('.vb',),
+    'go': ('.go',),
+    'rust': ('.rs',),
+    'ruby': ('.rb', '.rake', '.gemspec'),
+    'php': ('.php', '.phtml'),
+    'swift': ('.swift',),
+    'kotlin': ('.kt', '.kts'),
+    'scala': ('.scala', '.sc'),
+    'groovy': ('.groovy', '.gradle'),
+    'clojure': ('.clj', '.cljs', '.cljc', '.edn'),
+    'dart': ('.dart',),
+    'elixir': ('.ex', '.exs'),
+    'erlang': ('.erl', '.hrl'),
+    'haskell': ('.hs', '.lhs'),
+    'ocaml': ('.ml', '.mli'),
+    'lua': ('.lua',),
+    'perl': ('.pl', '.pm'),
+    'r': ('.r',),
+    'julia': ('.jl',),
+    'nim': ('.nim',),
+    'zig': ('.zig',),
+    'solidity': ('.sol',),
+    'vue': ('.vue',),
+    'svelte': ('.svelte',),
+    'html': ('.html', '.htm', '.xhtml'),
+    'css': ('.css',),
+    'scss': ('.scss',),
+    'sass': ('.sass',),
+    'less': ('.less',),
+    'json': ('.json', '.jsonc', '.json5'),
+    'yaml': ('.yaml', '.yml'),
+    'xml': ('.xml', '.xsd', '.xsl', '.xslt'),
+    'svg': ('.svg',),
+    'markdown': ('.md', '.markdown'),
+    'restructuredtext': ('.rst',),
+    'tex': ('.tex',),
+    'sql': ('.sql',),
+    'bash': ('.sh', '.bash'),
+    'zsh': ('.zsh',),
+    'fish': ('.fish',),
+    'powershell': ('.ps1', '.psm1', '.psd1'),
+    'batch': ('.bat', '.cmd'),
+    'dockerfile': ('.dockerfile',),
+    'makefile': ('.mk', '.mak'),
+    'cmake': ('.cmake',),
+    'protobuf': ('.proto',),
+    'graphql': ('.graphql', '.gql'),
+    'terraform': ('.tf', '.tfvars'),
+    'hcl': ('.hcl',),
+    'nix': ('.nix',),
+    'toml': ('.toml',),
+    'ini': ('.ini',),
+    'config': ('.cfg', '.conf'),
+    'properties': ('.properties',),
+    'csv': ('.csv', '.tsv'),
+    'log': ('.log',),
+    'text': ('.txt',),
+}
+
+BINARY_EXTENSIONS = frozenset((
+    # изображения
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.icns', '.webp', '.tif', '.tiff', '.psd', '.heic',
+    # аудио и видео
+    '.mp3', '.wav', '.ogg', '.flac', '.aac', '.m4a', '.mp4', '.m4v', '.avi', '.mov', '.mkv', '.webm',
+    # архивы и пакеты
+    '.zip', '.tar', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.7z', '.rar', '.jar', '.war', '.whl',
+    '.egg', '.deb', '.rpm', '.dmg', '.iso', '.apk',
+    # скомпилированное
+    '.exe', '.dll', '.so', '.dylib', '.a', '.o', '.obj', '.lib', '.class', '.pyc', '.pyo', '.pyd',
+    '.wasm', '.beam',
+    # шрифты
+    '.ttf', '.otf', '.woff', '.woff2', '.eot',
+    # документы
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.odt', '.ods', '.odp',
+    # данные и модели
+    '.sqlite', '.sqlite3', '.db', '.npy', '.npz', '.pkl', '.pickle', '.parquet', '.h5', '.hdf5',
+    '.onnx', '.pt', '.pth', '.ckpt', '.safetensors',
+))
+
+FILENAME_LANGUAGES: Dict[str, str] = {
+    'Dockerfile': 'dockerfile', 'Containerfile': 'dockerfile',
+    'Makefile': 'makefile', 'makefile': 'makefile', 'GNUmakefile': 'makefile',
+    'CMakeLists.txt': 'cmake',
+    'Rakefile': 'ruby', 'Gemfile': 'ruby', 'Guardfile': 'ruby', 'Podfile': 'ruby',
+    'Vagrantfile': 'ruby', 'Brewfile': 'ruby',
+    'Jenkinsfile': 'groovy',
+    '.bashrc': 'bash', '.bash_profile': 'bash', '.profile': 'bash',
+    '.zshrc': 'zsh', '.zprofile': 'zsh',
+    '.editorconfig': 'ini', '.gitconfig': 'ini',
+}
+
+FILENAME_PREFIXES: Tuple[Tuple[str, str], ...] = (
+    ('Dockerfile.', 'dockerfile'),
+    ('Containerfile.', 'dockerfile'),
+    ('Makefile.', 'makefile'),
+)
+
+SHEBANG_INTERPRETERS: Dict[str, str] = {
+    'python': 'python', 'pypy': 'python',
+    'node': 'javascript', 'nodejs': 'javascript', 'deno': 'typescript', 'bun': 'javascript',
+    'ts-node': 'typescript', 'tsx': 'typescript',
+    'sh': 'bash', 'bash': 'bash', 'dash': 'bash', 'ksh': 'bash', 'ash': 'bash',
+    'zsh': 'zsh', 'fish': 'fish',
+    'ruby': 'ruby', 'perl': 'perl', 'php': 'php', 'lua': 'lua', 'luajit': 'lua',
+    'rscript': 'r', 'julia': 'julia', 'elixir': 'elixir', 'escript': 'erlang',
+    'pwsh': 'powershell', 'make': 'makefile', 'groovy': 'groovy', 'scala': 'scala',
+}
+
+
+def _build_extension_table() -> Dict[str, FileClass]:
+    table = {ext: FileClass(None, True, False) for ext in BINARY_EXTENSIONS}
+    for language, extensions in LANGUAGE_EXTENSIONS.items():
+        for ext in extensions:
+            table[ext] = FileClass(language, False, language == 'markdown')
+    return table
+
+
+EXTENSION_TABLE: Dict[str, FileClass] = _build_extension_table()
+FILENAME_TABLE: Dict[str, FileClass] = {
+    name: FileClass(language, False, False) for name, language in FILENAME_LANGUAGES.items()
+}
+_PREFIX_TABLE = tuple((prefix, FileClass(language, False, False)) for prefix, language in FILENAME_PREFIXES)
+
+_VERSION_SUFFIX_RE = re.compile(r'[\d.]+$')
+
+
+def classify_name(name: str) -> FileClass:
+    """Classifies a file by its base name alone."""
+    file_class = FILENAME_TABLE.get(name)
+    if file_class is not None:
+        return file_class
+    for prefix, prefixed_class in _PREFIX_TABLE:
+        if name.startswith(prefix):
+            return prefixed_class
+    dot = name.rfind('.')
+    if dot <= 0:  # нет расширения или это dot-файл вроде .env
+        return UNKNOWN
+    return EXTENSION_TABLE.get(name[dot:].lower(), UNKNOWN)
+
+
+def classify_path(path: PurePath) -> FileClass:
+    return classify_name(path.name)
+
+
+def classify_batch(paths: Iterable[PurePath]) -> List[FileClass]:
+    """Classifies a batch of paths with one table lookup per path."""
+    classify = classify_name
+    return [classify(path.name) for path in paths]
+
+
+def sniff_shebang(head: bytes) -> Optional[str]:
+    """Language from a `#!` line in the first bytes of a file, if any."""
+    if not head.startswith(b'#!'):
+        return None
+    first_line = head[2:].split(b'\n', 1)[0].decode('utf-8', 'replace').split()
+    if not first_line:
+        return None
+    interpreter = first_line[0].rsplit('/', 1)[-1]
+    if interpreter == 'env':
+        # #!/usr/bin/env -S python3 -u → первый аргумент, не являющийся опцией
+        args = [arg for arg in first_line[1:] if not arg.startswith('-')]
+        if not args:
+            return None
+        interpreter = args[0]
+    interpreter = _VERSION_SUFFIX_RE.sub('', interpreter.lower())
+    return SHEBANG_INTERPRETERS.get(interpreter)
+
+
+def is_binary_head(head: bytes, complete: bool) -> bool:
+    """
+    True if the first bytes of a file are not UTF-8 text. `complete` says the
+    head is the whole file; otherwise a multibyte sequence cut at the end is fine.
+    """
+    if b'\x00' in head:
+        return True
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=complete)
+        return False
+    except UnicodeDecodeError:
+        return True
+
+
+class LanguageTally:
+    """Per-language file and character counts, accumulated while files stream by."""
+
+    def __init__(self):
+        self.files: Dict[str, int] = {}
+        self.characters: Dict[str, int] = {}
+
+    def add(self, language: Optional[str], size: int) -> None:
+        if not language:
+            return
+        self.files[language] = self.files.get(language, 0) + 1
+        self.characters[language] = self.characters.get(language, 0) + size
+
+    def most_common(self) -> List[Tuple[str, int, int]]:
+        """(language, files, characters), most files first."""
+        return sorted(
+            ((language, files, self.characters[language]) for language, files in self.files.items()),
+            key=lambda item: item[1],
+            reverse=True
+        )
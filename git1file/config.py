@@ -1,8 +1,14 @@
 ﻿# git1file/config.py
-import yaml
+import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional, Tuple
 from .models.schemas import ConfigSchema, ScanMode
+from .ignore import IgnoreMatcher, compile_ignore_patterns
+from .metrics import incr
+
+CACHE_SIZE = 256
 
 SMART_IGNORE_PATTERNS = [
     "*.exe", "*.dll", "*.so", "*.dylib", "*.bin", "*.dmg", "*.iso", "*.img",
@@ -25,11 +31,52 @@ FULL_IGNORE_PATTERNS = [
 ]
 
 
+# (абсолютный путь, mtime_ns, размер) -> провалидированный конфиг; None — конфиг по умолчанию
+_cache: "OrderedDict[Optional[Tuple[str, int, int]], ConfigSchema]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def clear_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+
+
+def _cache_key(config_path: Path) -> Optional[Tuple[str, int, int]]:
+    try:
+        stat = config_path.stat()
+    except OSError:
+        return None
+    return os.path.abspath(config_path), stat.st_mtime_ns, stat.st_size
+
+
 def load_config(config_path: Optional[Path] = None) -> ConfigSchema:
-    """Load configuration with plain format as default."""
+    """
+    Load configuration with plain format as default.
+
+    Parsed configs are cached by file path, mtime and size; callers get a
+    deep copy they are free to modify.
+    """
     if config_path is None:
         config_path = Path(".git1file.yaml")
 
+    key = _cache_key(config_path)
+    with _cache_lock:
+        config = _cache.get(key)
+        if config is not None:
+            _cache.move_to_end(key)
+    if config is None:
+        incr("config_cache_misses")
+        config = _build_config(config_path if key is not None else None)
+        with _cache_lock:
+            _cache[key] = config
+            if len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    else:
+        incr("config_cache_hits")
+    return config.model_copy(deep=True)
+
+
+def _build_config(config_path: Optional[Path]) -> ConfigSchema:
     config_dict = {
         "output": {"format": "plain", "compress": True, "mode": "smart"},
         "ignore": {
@@ -45,7 +92,8 @@ def load_config(config_path: Optional[Path] = None) -> ConfigSchema:
         }
     }
 
-    if config_path.exists():
+    if config_path is not None:
+        import yaml  # ленивый импорт: без конфиг-файла yaml не нужен
         with open(config_path, "r", encoding="utf-8") as f:
             loaded_config = yaml.safe_load(f) or {}
 
@@ -63,9 +111,69 @@ def load_config(config_path: Optional[Path] = None) -> ConfigSchema:
 
 def get_config_for_repo(repo_path: Path) -> ConfigSchema:
     """Get config for repository, searching parent directories."""
+    # Обход — только stat по родителям; разбор и валидация берутся из кэша load_config
     current = repo_path.resolve()
     for parent in [current] + list(current.parents):
         config_path = parent / ".git1file.yaml"
         if config_path.exists():
             return load_config(config_path)
-    return load_config()
\ No newline at end of file
+    return load_config()
+
+
+def cache_dir() -> Path:
+    """Каталог для индексов и кэшей между запусками: $GIT1FILE_CACHE_DIR или ~/.cache/git1file."""
+    configured = os.environ.get("GIT1FILE_CACHE_DIR")
+    if configured:
+        return Path(configured)
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "git1file"
+
+
+def parse_size_string(size_str: str) -> int:
+    multipliers = {
+        'GB': 1024 ** 3, 'MB': 1024 ** 2, 'KB': 1024, 'B': 1
+    }
+    size_str = size_str.upper().strip()
+    for suffix in ['GB', 'MB', 'KB', 'B']:
+        if size_str.endswith(suffix):
+            try:
+                number = int(size_str[:-len(suffix)])
+                return number * multipliers[suffix]
+            except ValueError:
+                continue
+    return 1024 * 1024
+
+
+class CompiledConfig:
+    """
+    Scanner view of a ConfigSchema: sizes parsed to bytes, limits resolved and
+    ignore patterns compiled. Build it after CLI/API overrides are applied.
+    """
+
+    def __init__(self, config: ConfigSchema):
+        include = config.include
+        self.config = config
+        self.scan_mode = config.output.mode
+        self.max_file_size = parse_size_string(include.max_file_size)
+        self.stream_threshold = parse_size_string(include.stream_threshold) if include.stream_large_files else None
+        self.max_total_files = include.max_total_files
+        self.max_total_chars = include.max_total_chars
+        self.truncate_on_limit = include.truncate_on_limit
+        self.binary_detection = include.binary_detection
+        self.excerpt_large_files = include.excerpt_large_files
+        self.excerpt_head = parse_size_string(include.excerpt_head)
+        self.excerpt_tail = parse_size_string(include.excerpt_tail)
+        self.excerpt_lines = include.excerpt_lines
+        self.use_gitignore = config.ignore.use_gitignore
+
+        patterns = []
+        if config.ignore.use_default_patterns:
+            patterns.extend(SMART_IGNORE_PATTERNS if self.scan_mode == ScanMode.SMART else FULL_IGNORE_PATTERNS)
+        patterns.extend(config.ignore.patterns)
+        self.ignore_patterns = tuple(patterns)
+        self.ignore = compile_ignore_patterns(self.ignore_patterns)
+
+    def ignore_matcher(self, gitignore_patterns: Optional[Iterable[str]] = None) -> IgnoreMatcher:
+        """Matcher for one scan: config patterns plus the repository's .gitignore."""
+        if not gitignore_patterns or not self.use_gitignore:
+            return self.ignore
+        return compile_ignore_patterns(self.ignore_patterns + tuple(sorted(gitignore_patterns)))
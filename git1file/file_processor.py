@@ -1,68 +1,17 @@
-﻿import mimetypes
-from pathlib import Path
-from typing import List, Optional, Set, Tuple
-import fnmatch
+﻿import codecs
+from pathlib import Path, PurePath
+from typing import Callable, Dict, Iterable, Iterator, List, Literal, Optional, Set, Tuple
 
-from .models.schemas import FileInfo, IncludeConfig, IgnoreConfig, ScanMode
-from .config import SMART_IGNORE_PATTERNS, FULL_IGNORE_PATTERNS
+from .models.schemas import FileInfo
+from .config import CompiledConfig
+from .passthrough import is_passthrough_safe
+from .classifier import HEAD_SIZE, FileClass, classify_path, is_binary_head, sniff_shebang
+from .metrics import incr, span
 
 
-def is_binary_file(file_path: Path) -> bool:
-    mime_type, _ = mimetypes.guess_type(str(file_path))
-    if mime_type and not mime_type.startswith('text/'):
-        return True
-    try:
-        with open(file_path, 'rb') as f:
-            chunk = f.read(8192)
-            chunk.decode('utf-8')
-            return False
-    except UnicodeDecodeError:
-        return True
-
-
-def should_ignore_path(
-        path: Path,
-        ignore_config: IgnoreConfig,
-        scan_mode: ScanMode,
-        gitignore_patterns: Optional[Set[str]] = None
-) -> bool:
-    path_name = path.name
-    relative_path_str = path.as_posix()
-    path_parts = set(path.parts[:-1])
-
-    def check_pattern(pattern: str) -> bool:
-        if pattern.endswith('/'):
-            dir_name = pattern.rstrip('/')
-            if dir_name in path_parts:
-                return True
-            if '*' in dir_name or '?' in dir_name:
-                for part in path_parts:
-                    if fnmatch.fnmatch(part, dir_name):
-                        return True
-            return False
-
-        if fnmatch.fnmatch(path_name, pattern):
-            return True
-        if fnmatch.fnmatch(relative_path_str, pattern):
-            return True
-        return False
-
-    if ignore_config.use_default_patterns:
-        patterns = SMART_IGNORE_PATTERNS if scan_mode == ScanMode.SMART else FULL_IGNORE_PATTERNS
-        for pattern in patterns:
-            if check_pattern(pattern):
-                return True
-
-    for pattern in ignore_config.patterns:
-        if check_pattern(pattern):
-            return True
-
-    if gitignore_patterns and ignore_config.use_gitignore:
-        for pattern in gitignore_patterns:
-            if check_pattern(pattern):
-                return True
-
-    return False
+def read_head(file_path: Path) -> bytes:
+    with open(file_path, 'rb') as f:
+        return f.read(HEAD_SIZE)
 
 
 def load_gitignore_patterns(repo_path: Path) -> Set[str]:
@@ -78,20 +27,12 @@ def load_gitignore_patterns(repo_path: Path) -> Set[str]:
 
 
 def get_file_language(file_path: Path) -> Optional[str]:
-    ext_to_lang = {
-        '.py': 'python', '.js': 'javascript', '.ts': 'typescript',
-        '.jsx': 'jsx', '.tsx': 'tsx', '.java': 'java', '.cpp': 'cpp',
-        '.c': 'c', '.h': 'c', '.hpp': 'cpp', '.cs': 'csharp',
-        '.go': 'go', '.rs': 'rust', '.rb': 'ruby', '.php': 'php',
-        '.swift': 'swift', '.kt': 'kotlin', '.scala': 'scala',
-        '.html': 'html', '.css': 'css', '.scss': 'scss', '.sass': 'sass',
-        '.json': 'json', '.yaml': 'yaml', '.yml': 'yaml', '.xml': 'xml',
-        '.md': 'markdown', '.sql': 'sql', '.sh': 'bash', '.bash': 'bash',
-        '.zsh': 'zsh', '.fish': 'fish', '.ps1': 'powershell',
-        '.dockerfile': 'dockerfile', '.toml': 'toml', '.ini': 'ini',
-        '.cfg': 'config', '.conf': 'config', '.log': 'log', '.txt': 'text'
-    }
-    return ext_to_lang.get(file_path.suffix.lower())
+    return classify_path(file_path).language
+
+
+def decode_head(head: bytes) -> str:
+    """Текст целиком прочитанного файла — так же, как его вернул бы open(..., 'r')."""
+    return head.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
 
 
 def read_file_content(file_path: Path, max_size_bytes: int) -> Optional[str]:
@@ -104,64 +45,350 @@ def read_file_content(file_path: Path, max_size_bytes: int) -> Optional[str]:
         return None
 
 
-def parse_size_string(size_str: str) -> int:
-    multipliers = {
-        'GB': 1024 ** 3, 'MB': 1024 ** 2, 'KB': 1024, 'B': 1
-    }
-    size_str = size_str.upper().strip()
-    for suffix in ['GB', 'MB', 'KB', 'B']:
-        if size_str.endswith(suffix):
-            try:
-                number = int(size_str[:-len(suffix)])
-                return number * multipliers[suffix]
-            except ValueError:
-                continue
-    return 1024 * 1024
+_UTF8_CONTINUATION = bytes(range(0x80, 0xC0))
 
 
-def scan_repository(
-        repo_path: Path,
-        ignore_config: IgnoreConfig,
-        include_config: IncludeConfig,
-        scan_mode: ScanMode
-) -> Tuple[List[FileInfo], List[FileInfo]]:
+def _trim_partial_utf8(data: bytes) -> bytes:
+    """Отрезает неполную многобайтовую последовательность в конце куска."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        decoder.decode(data)
+    except UnicodeDecodeError:
+        return data
+    pending = decoder.getstate()[0]
+    return data[:len(data) - len(pending)]
+
+
+def excerpt_marker(omitted_bytes: int) -> str:
+    return f"... [{omitted_bytes} bytes omitted] ..."
+
+
+def read_excerpt(
+        file_path: Path,
+        size: int,
+        head_bytes: int,
+        tail_bytes: int,
+        max_lines: int = 0
+) -> Optional[Tuple[str, int]]:
     """
-    Сканирует репозиторий и возвращает два списка:
-    - Обычные файлы
-    - Markdown файлы (отдельно)
+    Bounded read of a file too large to include: the first head_bytes (or the
+    first max_lines lines) and the last tail_bytes, cut at line boundaries,
+    with a marker line in between. Returns (content, omitted bytes).
     """
-    max_size = parse_size_string(include_config.max_file_size)
-    gitignore_patterns = load_gitignore_patterns(repo_path) if ignore_config.use_gitignore else None
-    file_infos = []
-    markdown_files = []
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(head_bytes)
+            if max_lines > 0:
+                end = -1
+                for _ in range(max_lines):
+                    end = head.find(b'\n', end + 1)
+                    if end == -1:
+                        break
+                if end != -1:
+                    head = head[:end + 1]
+            if len(head) < size:
+                if b'\n' in head:
+                    head = head[:head.rfind(b'\n') + 1]  # без оборванной последней строки
+                else:
+                    head = _trim_partial_utf8(head)  # одна длинная строка, например минифицированный JS
+
+            tail = b''
+            tail_start = max(size - tail_bytes, len(head))
+            if tail_bytes > 0 and tail_start < size:
+                at_line_start = True
+                if tail_start > len(head):
+                    f.seek(tail_start - 1)
+                    at_line_start = f.read(1) == b'\n'  # хвост начинается ровно с начала строки
+                f.seek(tail_start)
+                tail = f.read(size - tail_start)
+                if not at_line_start:
+                    if b'\n' in tail:
+                        tail = tail[tail.find(b'\n') + 1:]  # без оборванной первой строки
+                    else:
+                        tail = tail.lstrip(_UTF8_CONTINUATION)
+    except OSError:
+        return None
+
+    try:
+        head_text = decode_head(head)
+        tail_text = decode_head(tail)
+    except UnicodeDecodeError:
+        return None
+    omitted = size - len(head) - len(tail)
+    if omitted <= 0:
+        return head_text + tail_text, 0
+    if head_text and not head_text.endswith('\n'):
+        head_text += '\n'
+    return f"{head_text}{excerpt_marker(omitted)}\n{tail_text}", omitted
+
+
+class ScanLimitExceeded(Exception):
+    """Бюджет max_total_files / max_total_chars превышен во время сканирования."""
+
+    def __init__(self, message: str, files: int, characters: int):
+        super().__init__(message)
+        self.files = files
+        self.characters = characters
+
+
+# Какие файлы расходуют лимиты ScanBudget
+Charge = Literal["code", "markdown", "all"]
+
+
+class ScanBudget:
+    """
+    Running counters checked before each file is read, so an oversized
+    repository is rejected (or truncated) without reading the rest of it.
+    """
+
+    def __init__(self, compiled: CompiledConfig, track_omitted: bool = False, charge: Optional[Charge] = None):
+        self.max_files = compiled.max_total_files
+        self.max_chars = compiled.max_total_chars
+        self.truncate = compiled.truncate_on_limit
+        # Лимиты считают только то, что попадёт в вывод. Вызывающий знает, что он выводит:
+        # "code", "markdown" или "all"; по умолчанию markdown считается только с include_markdown
+        if charge is None:
+            charge = "all" if compiled.config.include.include_markdown else "code"
+        self.charge = charge
+        self.files = 0
+        self.characters = 0
+        self.omitted_files = 0
+        self.omitted_characters = 0
+        # watch: пропущенные файлы по пути, чтобы повторное сохранение не считалось дважды
+        self.omitted_paths: Optional[Dict[str, int]] = {} if track_omitted else None
+
+    @property
+    def truncated(self) -> bool:
+        return self.omitted_files > 0
+
+    def charges(self, relative_path: PurePath) -> bool:
+        if self.charge == "all":
+            return True
+        return classify_path(relative_path).is_markdown == (self.charge == "markdown")
+
+    def admit(self, relative_path: Path, size: int) -> bool:
+        if not self.charges(relative_path):
+            return True
+        if self.files + 1 > self.max_files:
+            reason = f"Too many files: more than {self.max_files}"
+        elif self.characters + size > self.max_chars:
+            reason = f"Repository too large: more than {self.max_chars} characters"
+        else:
+            self.files += 1
+            self.characters += size
+            return True
+
+        if not self.truncate:
+            incr("files_omitted")
+            raise ScanLimitExceeded(f"{reason} (stopped at {relative_path.as_posix()})",
+                                    self.files, self.characters)
+        self.omitted_files += 1
+        self.omitted_characters += size
+        if self.omitted_paths is not None:
+            self.omitted_paths[relative_path.as_posix()] = size
+        incr("files_omitted")
+        return False
+
+    def release(self, relative_path: PurePath, size: int) -> None:
+        """Возвращает в бюджет ранее принятый файл (удалён или будет перечитан)."""
+        if not self.charges(relative_path):
+            return
+        self.files -= 1
+        self.characters -= size
+
+    def release_omitted(self, key: str) -> None:
+        """Снимает с учёта пропущенный файл (удалён или будет проверен заново); нужен track_omitted."""
+        size = self.omitted_paths.pop(key, None)
+        if size is not None:
+            self.omitted_files -= 1
+            self.omitted_characters -= size
+
+
+def iter_repository_paths(repo_path: Path, compiled: CompiledConfig) -> Iterator[Tuple[Path, Path]]:
+    """Обходит репозиторий и отдаёт пары (абсолютный путь, относительный путь) неигнорируемых файлов."""
+    gitignore_patterns = load_gitignore_patterns(repo_path) if compiled.use_gitignore else None
+    matcher = compiled.ignore_matcher(gitignore_patterns)
 
     for path in repo_path.rglob('*'):
         if path.is_file():
+            incr("files_visited")
             try:
                 relative_path = path.relative_to(repo_path)
             except ValueError:
                 continue
 
-            if should_ignore_path(relative_path, ignore_config, scan_mode, gitignore_patterns):
+            with span("ignore"):
+                ignored = matcher.matches(relative_path)
+            if ignored:
+                incr("files_ignored")
                 continue
 
-            is_binary = is_binary_file(path) if include_config.binary_detection else False
-            content = None if is_binary else read_file_content(path, max_size)
-            language = get_file_language(path)
-
-            file_info = FileInfo(
-                path=relative_path.as_posix(),
-                content=content,
-                size=path.stat().st_size,
-                language=language,
-                is_binary=is_binary,
-                is_ignored=False
-            )
-
-            # Разделяем markdown и остальные файлы
-            if language == 'markdown':
-                markdown_files.append(file_info)
-            else:
-                file_infos.append(file_info)
-
-    return file_infos, markdown_files
\ No newline at end of file
+            yield path, relative_path
+
+
+def process_file(
+        path: Path,
+        relative_path: Path,
+        compiled: CompiledConfig,
+        size: Optional[int] = None,
+        file_class: Optional[FileClass] = None
+) -> FileInfo:
+    max_size = compiled.max_file_size
+    stream_threshold = compiled.stream_threshold
+    if file_class is None:
+        file_class = classify_path(path)
+    language = file_class.language
+    is_binary = False
+    head = None
+    with span("binary_detection"):
+        if file_class.is_known_binary:
+            is_binary = compiled.binary_detection
+        elif compiled.binary_detection or language is None:
+            head = read_head(path)
+            complete = len(head) < HEAD_SIZE
+            is_binary = compiled.binary_detection and is_binary_head(head, complete)
+            if language is None and not is_binary:
+                language = sniff_shebang(head)
+    if size is None:
+        size = path.stat().st_size
+    content = None
+    source_path = None
+    omitted_bytes = 0
+    if is_binary:
+        incr("files_binary")
+    elif head is not None and len(head) < HEAD_SIZE and len(head) <= max_size:
+        # Файл целиком уже прочитан при проверке — второй раз не открываем
+        try:
+            content = decode_head(head)
+            incr("bytes_read", size)
+        except UnicodeDecodeError:
+            content = None
+    else:
+        # Большие текстовые файлы не декодируем — форматтер скопирует их с диска
+        passthrough = False
+        if stream_threshold is not None and stream_threshold < size <= max_size:
+            with span("validate"):
+                passthrough = is_passthrough_safe(path)
+        if passthrough:
+            source_path = str(path)
+            incr("files_streamed")
+        elif size > max_size and compiled.excerpt_large_files:
+            # Начало и конец файла — два чтения фиксированного размера вместо всего файла
+            with span("read"):
+                excerpt = read_excerpt(path, size, compiled.excerpt_head, compiled.excerpt_tail,
+                                       compiled.excerpt_lines)
+            if excerpt is not None:
+                content, omitted_bytes = excerpt
+                incr("files_excerpted")
+                incr("bytes_read", size - omitted_bytes)
+        else:
+            with span("read"):
+                content = read_file_content(path, max_size)
+            if content is not None:
+                incr("bytes_read", size)
+
+    return FileInfo(
+        path=relative_path.as_posix(),
+        content=content,
+        size=size,
+        language=language,
+        is_binary=is_binary,
+        is_ignored=False,
+        source_path=source_path,
+        omitted_bytes=omitted_bytes
+    )
+
+
+def process_blob(
+        relative_path: PurePath,
+        size: int,
+        read: Callable[[int], bytes],
+        compiled: CompiledConfig,
+        file_class: Optional[FileClass] = None
+) -> FileInfo:
+    """
+    process_file for content that is not on disk, such as an archive member
+    read as a stream: read(n) returns the next n bytes, read(-1) the rest.
+    Files over max_file_size are not read past the binary check (no excerpts).
+    """
+    if file_class is None:
+        file_class = classify_path(relative_path)
+    language = file_class.language
+    is_binary = False
+    head = b''
+    with span("binary_detection"):
+        if file_class.is_known_binary:
+            is_binary = compiled.binary_detection
+        elif compiled.binary_detection or language is None:
+            head = read(HEAD_SIZE)
+            is_binary = compiled.binary_detection and is_binary_head(head, size <= HEAD_SIZE)
+            if language is None and not is_binary:
+                language = sniff_shebang(head)
+    content = None
+    if is_binary:
+        incr("files_binary")
+    elif size <= compiled.max_file_size:
+        with span("read"):
+            data = head + read(-1)
+        try:
+            content = decode_head(data)
+            incr("bytes_read", size)
+        except UnicodeDecodeError:
+            content = None
+
+    return FileInfo(
+        path=relative_path.as_posix(),
+        content=content,
+        size=size,
+        language=language,
+        is_binary=is_binary,
+        is_ignored=False
+    )
+
+
+def split_markdown(file_infos: Iterable[FileInfo]) -> Tuple[List[FileInfo], List[FileInfo]]:
+    """Разделяем markdown и остальные файлы."""
+    regular = []
+    markdown_files = []
+    for file_info in file_infos:
+        if file_info.language == 'markdown':
+            markdown_files.append(file_info)
+        else:
+            regular.append(file_info)
+    return regular, markdown_files
+
+
+def iter_admitted_paths(
+        repo_path: Path,
+        compiled: CompiledConfig,
+        budget: ScanBudget
+) -> Iterator[Tuple[Path, Path, int]]:
+    """Как iter_repository_paths, но с проверкой бюджета до чтения файла."""
+    for path, relative_path in iter_repository_paths(repo_path, compiled):
+        try:
+            size = path.stat().st_size
+        except OSError:
+            continue
+        if budget.admit(relative_path, size):
+            yield path, relative_path, size
+
+
+def scan_repository(
+        repo_path: Path,
+        compiled: CompiledConfig,
+        budget: Optional[ScanBudget] = None
+) -> Tuple[List[FileInfo], List[FileInfo]]:
+    """
+    Сканирует репозиторий и возвращает два списка:
+    - Обычные файлы
+    - Markdown файлы (отдельно)
+
+    Лимиты проверяются по ходу обхода: при превышении бросается ScanLimitExceeded,
+    либо (truncate_on_limit) остальные файлы только считаются в budget.
+    """
+    budget = budget or ScanBudget(compiled)
+
+    return split_markdown(
+        process_file(path, relative_path, compiled, size)
+        for path, relative_path, size in iter_admitted_paths(repo_path, compiled, budget)
+    )
@@ -0,0 +1,50 @@
+﻿# git1file/formatters/__init__.py
+"""
+Formatter registry. Modules are imported on demand so a run only pays for
+the format it writes.
+"""
+import importlib
+import os
+from pathlib import Path
+
+# (модуль, полный вывод, markdown, потоковая запись)
+FORMATTERS = {
+    "plain": ("git1file.formatters.plain_formatter", "format_plain", "format_plain_markdown", "write_plain"),
+    "xml": ("git1file.formatters.xml_formatter", "format_xml", "format_xml_markdown", "write_xml"),
+    "json": ("git1file.formatters.json_formatter", "format_json", "format_json_markdown", None),
+}
+
+EXTENSIONS = {"plain": "txt", "xml": "xml", "json": "json"}
+
+
+def load_formatters(output_format: str):
+    """Импортирует только выбранный форматтер: (format_full, format_markdown, writer или None)."""
+    module_name, full_name, markdown_name, writer_name = FORMATTERS[output_format]
+    module = importlib.import_module(module_name)
+    writer = getattr(module, writer_name) if writer_name else None
+    return getattr(module, full_name), getattr(module, markdown_name), writer
+
+
+def temp_output_path(output: Path) -> Path:
+    return output.with_name(f".{output.name}.tmp")
+
+
+def write_output_atomic(analysis, output: Path, output_format: str) -> int:
+    """
+    Пишет во временный файл рядом и подменяет вывод: читатель не увидит
+    половину файла. Возвращает размер в байтах.
+    """
+    format_full, _, stream_writer = load_formatters(output_format)
+    temp_path = temp_output_path(output)
+    try:
+        if stream_writer:
+            with open(temp_path, "wb") as out:
+                stream_writer(analysis, out)
+        else:
+            temp_path.write_text(format_full(analysis), encoding="utf-8")
+        size = temp_path.stat().st_size
+        os.replace(temp_path, output)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return size
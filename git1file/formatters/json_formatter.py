@@ -1,8 +1,12 @@
 ﻿import json
 from typing import Any, Dict
 from ..models.schemas import RepositoryAnalysis
+from ..passthrough import get_content, has_content
+from ..metrics import timed
+from ..history import format_timestamp
 
 
+@timed("format")
 def format_json(analysis: RepositoryAnalysis) -> str:
     """
     Форматируем репо под JSON.
@@ -26,9 +30,16 @@ def format_json(analysis: RepositoryAnalysis) -> str:
         "files": []
     }
 
+    if analysis.metadata.truncated:
+        output["metadata"]["truncated"] = True
+        output["metadata"]["omitted_files"] = analysis.metadata.omitted_files
+        output["metadata"]["omitted_chars"] = analysis.metadata.omitted_characters
+
     if analysis.metadata.is_git_repo:
         output["metadata"]["git_branch"] = analysis.metadata.git_branch
         output["metadata"]["git_commit"] = analysis.metadata.git_commit
+        if analysis.metadata.history_commits:
+            output["metadata"]["history_commits"] = analysis.metadata.history_commits
 
     for file_info in analysis.files:
         file_data = {
@@ -37,13 +48,19 @@ def format_json(analysis: RepositoryAnalysis) -> str:
             "is_binary": file_info.is_binary,
             "language": file_info.language
         }
-        if file_info.content and not file_info.is_binary:
-            file_data["content"] = file_info.content
+        if file_info.churn is not None:
+            file_data["churn"] = file_info.churn
+            file_data["last_changed"] = format_timestamp(file_info.last_changed)
+        if has_content(file_info) and not file_info.is_binary:
+            file_data["content"] = get_content(file_info)
+            if file_info.omitted_bytes:
+                file_data["omitted_bytes"] = file_info.omitted_bytes
         output["files"].append(file_data)
 
     return json.dumps(output, indent=2, ensure_ascii=False)
 
 
+@timed("format")
 def format_json_markdown(analysis: RepositoryAnalysis) -> str:
     """JSON формат для markdown файлов"""
     output = {
@@ -53,16 +70,17 @@ def format_json_markdown(analysis: RepositoryAnalysis) -> str:
             {
                 "path": f.path,
                 "size": f.size,
-                "content": f.content
+                "content": get_content(f)
             }
             for f in analysis.markdown_files
-            if f.content
+            if has_content(f)
         ]
     }
 
     return json.dumps(output, indent=2, ensure_ascii=False)
 
 
+@timed("format")
 def format_json_compact(analysis: RepositoryAnalysis) -> str:
     """
     Компактный JSON: только файлы и контент.
@@ -71,15 +89,16 @@ def format_json_compact(analysis: RepositoryAnalysis) -> str:
         "files": [
             {
                 "path": file_info.path,
-                "content": file_info.content
+                "content": get_content(file_info)
             }
             for file_info in analysis.files
-            if file_info.content and not file_info.is_binary
+            if has_content(file_info) and not file_info.is_binary
         ]
     }
     return json.dumps(output, separators=(',', ':'), ensure_ascii=False)
 
 
+@timed("format")
 def format_json_lines(analysis: RepositoryAnalysis) -> str:
     """
     JSON-Lines: одна строка на объект.
@@ -94,11 +113,11 @@ def format_json_lines(analysis: RepositoryAnalysis) -> str:
     lines.append(json.dumps(meta_line, ensure_ascii=False))
 
     for file_info in analysis.files:
-        if file_info.content and not file_info.is_binary:
+        if has_content(file_info) and not file_info.is_binary:
             file_line = {
                 "type": "file",
                 "path": file_info.path,
-                "content": file_info.content
+                "content": get_content(file_info)
             }
             lines.append(json.dumps(file_line, ensure_ascii=False))
 
@@ -1,9 +1,29 @@
 ﻿# plain_formatter.py
-from ..models.schemas import RepositoryAnalysis
+from typing import BinaryIO, Callable, Iterable, Iterator
 
+from ..models.schemas import FileInfo, RepositoryAnalysis, RepositoryMetadata
+from ..passthrough import Piece, get_content, has_content, join_lines, join_pieces, write_pieces
+from ..metrics import timed
+from ..history import format_timestamp
 
+
+@timed("format")
 def format_plain(analysis: RepositoryAnalysis) -> str:
     """Формат текста без markdown файлов"""
+    return join_pieces(iter_plain(analysis))
+
+
+@timed("write")
+def write_plain(analysis: RepositoryAnalysis, out: BinaryIO) -> None:
+    """Пишет plain-формат в бинарный поток, большие файлы копируются с диска."""
+    write_pieces(iter_plain(analysis), out)
+
+
+def iter_plain(analysis: RepositoryAnalysis) -> Iterator[Piece]:
+    return join_lines(_plain_lines(analysis))
+
+
+def _plain_lines(analysis: RepositoryAnalysis) -> list:
     lines = []
 
     lines.append("=" * 80)
@@ -16,9 +36,17 @@ def format_plain(analysis: RepositoryAnalysis) -> str:
         lines.append(
             f"MARKDOWN FILES (EXCLUDED): {analysis.metadata.markdown_files} files, {analysis.metadata.markdown_characters} chars")
 
+    if analysis.metadata.truncated:
+        lines.append(
+            f"TRUNCATED: {analysis.metadata.omitted_files} files, "
+            f"{analysis.metadata.omitted_characters} chars omitted (size limits)")
+
     if analysis.metadata.is_git_repo:
-        lines.append(f"GIT BRANCH: {analysis.metadata.git_branch}")
+        if analysis.metadata.git_branch:  # у архива только коммит
+            lines.append(f"GIT BRANCH: {analysis.metadata.git_branch}")
         lines.append(f"GIT COMMIT: {analysis.metadata.git_commit}")
+        if analysis.metadata.history_commits:
+            lines.append(f"GIT HISTORY: last {analysis.metadata.history_commits} commits")
 
     if analysis.metadata.languages:
         lines.append("\nLANGUAGE STATISTICS:")
@@ -31,22 +59,75 @@ def format_plain(analysis: RepositoryAnalysis) -> str:
     lines.append("=" * 80 + "\n")
 
     for file_info in analysis.files:
-        if file_info.is_binary or file_info.content is None:
-            lines.append(f"# BINARY/LARGE FILE: {file_info.path}")
-            continue
-
-        lines.append("-" * 80)
-        lines.append(f"FILE: {file_info.path}")
-        if file_info.language:
-            lines.append(f"LANGUAGE: {file_info.language}")
-        lines.append(f"SIZE: {file_info.size} bytes")
-        lines.append("-" * 40)
-        lines.append(file_info.content)
-        lines.append("\n")
-
-    return "\n".join(lines)
-
-
+        lines.extend(_file_lines(file_info))
+
+    return lines
+
+
+def _file_lines(file_info: FileInfo) -> list:
+    if file_info.is_binary or (file_info.content is None and not file_info.source_path):
+        return [f"# BINARY/LARGE FILE: {file_info.path}"]
+
+    lines = ["-" * 80, f"FILE: {file_info.path}"]
+    if file_info.language:
+        lines.append(f"LANGUAGE: {file_info.language}")
+    lines.append(f"SIZE: {file_info.size} bytes")
+    if file_info.omitted_bytes:
+        lines.append(f"EXCERPT: head and tail only, {file_info.omitted_bytes} bytes omitted")
+    if file_info.churn is not None:
+        lines.append(f"HISTORY: {file_info.churn} commits, last changed "
+                     f"{format_timestamp(file_info.last_changed)}")
+    lines.append("-" * 40)
+    lines.append(file_info.content if file_info.content is not None else file_info)
+    lines.append("\n")
+    return lines
+
+
+def iter_plain_stream(
+        name: str,
+        path: str,
+        files: Iterable[FileInfo],
+        summary: Callable[[], RepositoryMetadata]
+) -> Iterator[Piece]:
+    """
+    Plain output written while files are still arriving: files in the order
+    they come, totals and language statistics at the end (summary() is
+    called once `files` is exhausted).
+    """
+    return join_lines(_plain_stream_lines(name, path, files, summary))
+
+
+def _plain_stream_lines(name, path, files, summary):
+    yield "=" * 80
+    yield f"REPOSITORY: {name}"
+    yield f"PATH: {path}"
+    yield "ORDER: as streamed, totals at the end"
+    yield "\n" + "=" * 80
+    yield "FILE CONTENTS"
+    yield "=" * 80 + "\n"
+
+    for file_info in files:
+        yield from _file_lines(file_info)
+
+    metadata = summary()
+    yield "=" * 80
+    yield f"TOTAL FILES: {metadata.total_files}"
+    yield f"TOTAL CHARACTERS: {metadata.total_characters}"
+    if metadata.markdown_files > 0:
+        yield f"MARKDOWN FILES (EXCLUDED): {metadata.markdown_files} files, {metadata.markdown_characters} chars"
+    if metadata.truncated:
+        yield (f"TRUNCATED: {metadata.omitted_files} files, "
+               f"{metadata.omitted_characters} chars omitted (size limits)")
+    if metadata.git_commit:
+        yield f"GIT COMMIT: {metadata.git_commit}"
+    if metadata.languages:
+        yield "\nLANGUAGE STATISTICS:"
+        yield "-" * 80
+        for lang in metadata.languages:
+            yield f"  {lang.name}: {lang.files} files, {lang.characters} chars"
+
+
+@timed("format")
 def format_plain_markdown(analysis: RepositoryAnalysis) -> str:
     """Формат только для markdown файлов"""
     lines = []
@@ -57,12 +138,12 @@ def format_plain_markdown(analysis: RepositoryAnalysis) -> str:
     lines.append("=" * 80 + "\n")
 
     for file_info in analysis.markdown_files:
-        if file_info.content:
+        if has_content(file_info):
             lines.append("-" * 80)
             lines.append(f"FILE: {file_info.path}")
             lines.append(f"SIZE: {file_info.size} bytes")
             lines.append("-" * 40)
-            lines.append(file_info.content)
+            lines.append(get_content(file_info))
             lines.append("\n")
 
     return "\n".join(lines)
@@ -82,8 +163,8 @@ def format_xml_markdown(analysis: RepositoryAnalysis) -> str:
     ]
 
     for file_info in analysis.markdown_files:
-        if file_info.content:
-            safe_content = file_info.content.replace(']]>', ']]]]><![CDATA[>')
+        if has_content(file_info):
+            safe_content = get_content(file_info).replace(']]>', ']]]]><![CDATA[>')
             lines.append(f'    <file path="{escape(file_info.path)}" size="{file_info.size}">')
             lines.append(f'      <content><![CDATA[{safe_content}]]></content>')
             lines.append('    </file>')
@@ -106,10 +187,10 @@ def format_json_markdown(analysis: RepositoryAnalysis) -> str:
             {
                 "path": f.path,
                 "size": f.size,
-                "content": f.content
+                "content": get_content(f)
             }
             for f in analysis.markdown_files
-            if f.content
+            if has_content(f)
         ]
     }
 
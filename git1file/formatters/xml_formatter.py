@@ -1,12 +1,30 @@
-﻿import xml.etree.ElementTree as ET
-from xml.sax.saxutils import escape
-from typing import Dict, Any
+﻿from xml.sax.saxutils import escape
+from typing import BinaryIO, Dict, Any, Iterator
 from ..models.schemas import RepositoryAnalysis, LanguageStats, FileInfo
+from ..passthrough import Piece, get_content, has_content, join_lines, join_pieces, write_pieces
+from ..metrics import timed
+from ..history import format_timestamp
 
 
+@timed("format")
 def format_xml(analysis: RepositoryAnalysis) -> str:
     """Safe XML format with proper CDATA handling.
     """
+    return join_pieces(iter_xml(analysis))
+
+
+@timed("write")
+def write_xml(analysis: RepositoryAnalysis, out: BinaryIO) -> None:
+    """Stream XML to a binary file; passthrough files are copied from disk as-is.
+    """
+    write_pieces(iter_xml(analysis), out)
+
+
+def iter_xml(analysis: RepositoryAnalysis) -> Iterator[Piece]:
+    return join_lines(_xml_lines(analysis))
+
+
+def _xml_lines(analysis: RepositoryAnalysis) -> list:
     lines = [
         '<?xml version="1.0" encoding="UTF-8"?>',
         f'<repository name="{escape(analysis.metadata.name)}" path="{escape(str(analysis.metadata.path))}">',
@@ -15,12 +33,20 @@ def format_xml(analysis: RepositoryAnalysis) -> str:
         f'    <total_characters>{analysis.metadata.total_characters}</total_characters>',
     ]
 
+    if analysis.metadata.truncated:
+        lines.append(
+            f'    <truncated omitted_files="{analysis.metadata.omitted_files}" '
+            f'omitted_chars="{analysis.metadata.omitted_characters}"/>'
+        )
+
     if analysis.metadata.is_git_repo:
         lines.extend([
             f'    <git_branch>{escape(analysis.metadata.git_branch or "")}</git_branch>',
             f'    <git_commit>{escape(analysis.metadata.git_commit or "")}</git_commit>',
             '    <is_git_repo>true</is_git_repo>'
         ])
+        if analysis.metadata.history_commits:
+            lines.append(f'    <history commits="{analysis.metadata.history_commits}"/>')
     else:
         lines.append('    <is_git_repo>false</is_git_repo>')
 
@@ -41,21 +67,29 @@ def format_xml(analysis: RepositoryAnalysis) -> str:
         if file_info.language:
             attrs += f' language="{escape(file_info.language)}"'
         attrs += f' is_binary="{str(file_info.is_binary).lower()}"'
+        if file_info.omitted_bytes:
+            attrs += f' omitted_bytes="{file_info.omitted_bytes}"'
+        if file_info.churn is not None:
+            attrs += f' churn="{file_info.churn}" last_changed="{format_timestamp(file_info.last_changed)}"'
 
         lines.append(f'    <file {attrs}>')
 
         if file_info.content and not file_info.is_binary:
             safe_content = file_info.content.replace(']]>', ']]]]><![CDATA[>')
             lines.append(f'      <content><![CDATA[{safe_content}]]></content>')
+        elif file_info.source_path and not file_info.is_binary:
+            # Passthrough-файлы проверены при сканировании: в них нет ']]>'
+            lines.append(['      <content><![CDATA[', file_info, ']]></content>'])
 
         lines.append('    </file>')
 
     lines.append('  </files>')
     lines.append('</repository>')
 
-    return '\n'.join(lines)
+    return lines
 
 
+@timed("format")
 def format_xml_markdown(analysis: RepositoryAnalysis) -> str:
     """XML формат для markdown файлов"""
     lines = [
@@ -66,8 +100,8 @@ def format_xml_markdown(analysis: RepositoryAnalysis) -> str:
     ]
 
     for file_info in analysis.markdown_files:
-        if file_info.content:
-            safe_content = file_info.content.replace(']]>', ']]]]><![CDATA[>')
+        if has_content(file_info):
+            safe_content = get_content(file_info).replace(']]>', ']]]]><![CDATA[>')
             lines.append(f'    <file path="{escape(file_info.path)}" size="{file_info.size}">')
             lines.append(f'      <content><![CDATA[{safe_content}]]></content>')
             lines.append('    </file>')
@@ -84,6 +118,8 @@ def validate_xml_output(xml_string: str) -> bool:
     Returns True if valid, False otherwise.
     Use this in tests to ensure CDATA escaping works correctly.
     """
+    import xml.etree.ElementTree as ET
+
     try:
         ET.fromstring(xml_string)
         return True
@@ -3,7 +3,10 @@ import shutil
 from pathlib import Path
 from typing import Union, Optional, Tuple
 import re
-from git import Repo, InvalidGitRepositoryError
+from .metrics import span
+
+# GitPython импортируется лениво: для локальных путей он обычно не нужен,
+# а его импорт стоит дороже самого сканирования небольшого репозитория
 
 
 def is_local_path(source: str) -> bool:
@@ -14,16 +17,78 @@ def is_local_path(source: str) -> bool:
     return True
 
 
+def find_git_dir(path: Path) -> Optional[Path]:
+    """Ищет .git вверх по дереву; поддерживает .git-файл worktree/submodule."""
+    current = path.resolve()
+    for parent in [current] + list(current.parents):
+        dot_git = parent / ".git"
+        if dot_git.is_dir():
+            return dot_git
+        if dot_git.is_file():
+            content = dot_git.read_text(encoding="utf-8").strip()
+            if content.startswith("gitdir:"):
+                git_dir = Path(content[len("gitdir:"):].strip())
+                return git_dir if git_dir.is_absolute() else (parent / git_dir).resolve()
+    return None
+
+
 def is_git_repo_path(path: Path) -> bool:
-    try:
-        Repo(path, search_parent_directories=True)
-        return True
-    except InvalidGitRepositoryError:
-        return False
+    return find_git_dir(path) is not None
+
+
+def _resolve_ref(git_dir: Path, ref: str) -> Optional[str]:
+    common_dir = git_dir
+    commondir_file = git_dir / "commondir"
+    if commondir_file.exists():
+        common_dir = (git_dir / commondir_file.read_text(encoding="utf-8").strip()).resolve()
+
+    for base in (git_dir, common_dir):
+        ref_file = base / ref
+        if ref_file.is_file():
+            return ref_file.read_text(encoding="utf-8").strip()
+
+    packed_refs = common_dir / "packed-refs"
+    if packed_refs.exists():
+        for line in packed_refs.read_text(encoding="utf-8").splitlines():
+            if line.endswith(" " + ref):
+                return line.split(" ", 1)[0]
+    return None
+
+
+def read_head(git_dir: Path) -> Tuple[Optional[str], Optional[str]]:
+    """Ветка и коммит прямо из .git/HEAD, без GitPython."""
+    head = (git_dir / "HEAD").read_text(encoding="utf-8").strip()
+    if head.startswith("ref:"):
+        ref = head[len("ref:"):].strip()
+        branch = ref[len("refs/heads/"):] if ref.startswith("refs/heads/") else ref
+        sha = _resolve_ref(git_dir, ref)
+        return branch, sha[:8] if sha else None
+    return None, head[:8] or None
+
+
+def read_head_sha(git_dir: Path) -> Optional[str]:
+    """Полный sha HEAD; None для репозитория без коммитов."""
+    head = (git_dir / "HEAD").read_text(encoding="utf-8").strip()
+    if head.startswith("ref:"):
+        return _resolve_ref(git_dir, head[len("ref:"):].strip())
+    return head or None
 
 
 def get_repo_info(repo_path: Path) -> Tuple[Optional[str], Optional[str]]:
     try:
+        # Битый или нечитаемый .git-файл worktree — не ошибка анализа
+        git_dir = find_git_dir(repo_path)
+        if git_dir is None:
+            return None, None
+        branch, commit = read_head(git_dir)
+        if commit:  # detached HEAD: ветки нет, коммит есть
+            return branch, commit
+    except (OSError, ValueError):  # ValueError — .git-файл не в UTF-8
+        pass
+
+    # Нестандартная раскладка .git — отдаём разбор GitPython
+    try:
+        from git import Repo
         repo = Repo(repo_path, search_parent_directories=True)
         branch = repo.active_branch.name if repo.active_branch else None
         commit = repo.head.commit.hexsha[:8] if repo.head else None
@@ -32,17 +97,22 @@ def get_repo_info(repo_path: Path) -> Tuple[Optional[str], Optional[str]]:
         return None, None
 
 
-def clone_remote_repo(repo_url: str, temp_dir: Path) -> Path:
+def clone_remote_repo(repo_url: str, temp_dir: Path, depth: Optional[int] = None) -> Path:
+    """depth=1 — shallow clone: только последний коммит, без истории."""
     try:
         repo_name = re.split(r'[:/]', repo_url.rstrip('/').replace('.git', ''))[-1]
         clone_path = temp_dir / repo_name
-        Repo.clone_from(repo_url, clone_path)
+        from git import Repo
+        if depth:
+            Repo.clone_from(repo_url, clone_path, depth=depth, single_branch=True)
+        else:
+            Repo.clone_from(repo_url, clone_path)
         return clone_path
     except Exception as e:
         raise RuntimeError(f"Failed to clone repository {repo_url}: {str(e)}")
 
 
-def process_source(source: str) -> Tuple[Path, bool, Optional[str]]:
+def process_source(source: str, depth: Optional[int] = None) -> Tuple[Path, bool, Optional[str]]:
     if is_local_path(source):
         repo_path = Path(source).resolve()
         if not repo_path.exists():
@@ -51,7 +121,8 @@ def process_source(source: str) -> Tuple[Path, bool, Optional[str]]:
     else:
         temp_dir = Path(tempfile.mkdtemp(prefix="git1file_"))
         try:
-            repo_path = clone_remote_repo(source, temp_dir)
+            with span("clone"):
+                repo_path = clone_remote_repo(source, temp_dir, depth)
             return repo_path, True, source
         except Exception:
             shutil.rmtree(temp_dir, ignore_errors=True)
@@ -0,0 +1,172 @@
+﻿# git1file/history.py
+"""
+Per-file churn and recency from git history.
+
+One `git log --name-only` stream over the last N commits replaces per-file
+blame: every path line adds one to that file's churn, and the first commit
+seen for a path (log order is newest first) is its last change. The result
+depends only on HEAD, so it is cached per HEAD sha in memory and on disk.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from .models.schemas import FileInfo
+from .config import cache_dir
+from .git_service import find_git_dir, read_head_sha
+from .metrics import incr, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_COMMITS = 1000
+CACHE_SIZE = 16
+CACHE_VERSION = 1
+
+
+class FileHistory(NamedTuple):
+    churn: int  # коммитов из последних N, менявших файл
+    last_changed: int  # unix time последнего такого коммита
+
+
+class RepositoryHistory(NamedTuple):
+    commits: int  # сколько коммитов реально пройдено (меньше N в короткой истории)
+    files: Dict[str, FileHistory]
+
+
+_cache: "OrderedDict[tuple, RepositoryHistory]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def parse_log(lines: Iterable[str]) -> RepositoryHistory:
+    """Разбирает вывод `git log --format=%x00%ct --name-only`: строка с \\0 — новый коммит."""
+    churn: Dict[str, int] = {}
+    last_changed: Dict[str, int] = {}
+    commits = 0
+    timestamp = 0
+    for line in lines:
+        line = line.rstrip('\n')
+        if not line:
+            continue
+        if line[0] == '\0':
+            commits += 1
+            timestamp = int(line[1:])
+            continue
+        count = churn.get(line)
+        if count is None:
+            churn[line] = 1
+            last_changed[line] = timestamp
+        else:
+            churn[line] = count + 1
+    return RepositoryHistory(commits, {
+        path: FileHistory(count, last_changed[path]) for path, count in churn.items()
+    })
+
+
+def read_log(repo_path: Path, max_commits: int) -> RepositoryHistory:
+    """Один проход git log; пути относительно repo_path, изменения вне него отбрасываются."""
+    import subprocess
+
+    command = [
+        "git", "-c", "core.quotePath=false", "-C", str(repo_path),
+        "log", f"-n{max_commits}", "--relative", "--name-only", "--no-renames",
+        "--format=%x00%ct",
+    ]
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                          encoding="utf-8", errors="surrogateescape") as process:
+        history = parse_log(process.stdout)
+    if process.returncode != 0:
+        raise RuntimeError(f"git log exited with status {process.returncode}")
+    return history
+
+
+def _cache_file(key: tuple) -> Path:
+    digest = hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+    return cache_dir() / "history" / f"{digest}.json"
+
+
+def _read_cache_file(path: Path) -> Optional[RepositoryHistory]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != CACHE_VERSION:
+        return None
+    return RepositoryHistory(data["commits"], {
+        file_path: FileHistory(*entry) for file_path, entry in data["files"].items()
+    })
+
+
+def _write_cache_file(path: Path, history: RepositoryHistory) -> None:
+    data = {"version": CACHE_VERSION, "commits": history.commits, "files": history.files}
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        temp_path.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.warning(f"Cannot write history cache {path}: {e}")
+
+
+def load_history(repo_path: Path, max_commits: int = DEFAULT_HISTORY_COMMITS) -> Optional[RepositoryHistory]:
+    """
+    Churn and last-change time of every file touched by the last max_commits
+    commits. None outside a git repository, for an empty one, or without git.
+    """
+    repo_path = repo_path.resolve()
+    git_dir = find_git_dir(repo_path)
+    if git_dir is None:
+        return None
+    try:
+        head = read_head_sha(git_dir)
+    except OSError:
+        head = None
+    if not head:
+        return None
+
+    key = (str(git_dir), head, str(repo_path), max_commits)
+    with _cache_lock:
+        history = _cache.get(key)
+        if history is not None:
+            _cache.move_to_end(key)
+            incr("history_cache_hits")
+            return history
+    incr("history_cache_misses")
+
+    path = _cache_file(key)
+    history = _read_cache_file(path)
+    if history is None:
+        try:
+            with span("history"):
+                history = read_log(repo_path, max_commits)
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"Git history unavailable for {repo_path}: {e}")
+            return None
+        _write_cache_file(path, history)
+
+    with _cache_lock:
+        _cache[key] = history
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return history
+
+
+def attach_history(file_infos: List[FileInfo], history: RepositoryHistory) -> None:
+    """Заполняет churn/last_changed на месте; файлы вне истории получают None."""
+    files = history.files
+    for file_info in file_infos:
+        entry = files.get(file_info.path)
+        if entry is None:
+            file_info.churn = None
+            file_info.last_changed = None
+        else:
+            file_info.churn, file_info.last_changed = entry
+
+
+def format_timestamp(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -0,0 +1,93 @@
+﻿# git1file/ignore.py
+"""
+Ignore patterns compiled once per pattern set.
+
+Same semantics as matching every pattern with fnmatch against every file,
+but literal names and directory names become set lookups, '*.ext' patterns
+one endswith() call, and the remaining wildcard patterns are merged into one
+regex each for names/paths and directory parts.
+"""
+import fnmatch
+import os
+import re
+from functools import lru_cache
+from pathlib import PurePath
+from typing import Iterable, List, Optional, Tuple
+
+
+def _union(patterns: List[str]) -> Optional["re.Pattern[str]"]:
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
+
+
+class IgnoreMatcher:
+    """
+    Patterns ending with '/' match a directory name anywhere in the path
+    (wildcards allowed); other patterns match the file name or the whole
+    relative path, as fnmatch does.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        normcase = os.path.normcase
+        dir_names = set()
+        dir_globs = []
+        literals = set()
+        suffixes = set()
+        globs = []
+        for pattern in patterns:
+            if pattern.endswith('/'):
+                dir_name = pattern.rstrip('/')
+                dir_names.add(dir_name)
+                if '*' in dir_name or '?' in dir_name:
+                    dir_globs.append(normcase(dir_name))
+            elif pattern.startswith('*') and not any(char in pattern[1:] for char in "*?[/"):
+                # '*.exe': имя и путь заканчиваются одинаково — endswith вместо regex
+                suffixes.add(normcase(pattern[1:]))
+            elif any(char in pattern for char in "*?["):
+                globs.append(normcase(pattern))
+            else:
+                literals.add(normcase(pattern))
+
+        self._dir_names = frozenset(dir_names)
+        self._dir_regex = _union(dir_globs)
+        self._literals = frozenset(literals)
+        self._suffixes = tuple(sorted(suffixes))
+        self._regex = _union(globs)
+
+    def matches(self, relative_path: PurePath) -> bool:
+        parts = relative_path.parts
+        return (self._matches_directories(parts[:-1])
+                or self.matches_name(relative_path.name, relative_path.as_posix()))
+
+    def matches_dir(self, relative_dir: str) -> bool:
+        """True if every file under the directory is ignored by a directory pattern."""
+        return self._matches_directories(relative_dir.split('/'))
+
+    def _matches_directories(self, directories) -> bool:
+        if not directories:
+            return False
+        if not self._dir_names.isdisjoint(directories):
+            return True
+        if self._dir_regex is not None:
+            normcase = os.path.normcase
+            for part in directories:
+                if self._dir_regex.match(normcase(part)):
+                    return True
+        return False
+
+    def matches_name(self, name: str, path_str: str) -> bool:
+        """Patterns without a trailing '/': file name or the whole relative path."""
+        normcase = os.path.normcase
+        name = normcase(name)
+        path_str = normcase(path_str)
+        if name in self._literals or path_str in self._literals or name.endswith(self._suffixes):
+            return True
+        regex = self._regex
+        return regex is not None and (regex.match(name) is not None or regex.match(path_str) is not None)
+
+
+@lru_cache(maxsize=64)
+def compile_ignore_patterns(patterns: Tuple[str, ...]) -> IgnoreMatcher:
+    """Cached per pattern tuple: repeated scans with the same config compile once."""
+    return IgnoreMatcher(patterns)
@@ -1,19 +1,26 @@
 ﻿from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import Response, HTMLResponse
+from fastapi.responses import Response, HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 from pathlib import Path
+from typing import Literal, Optional
+import json
 import yaml
 import logging
+import time
 
-from .models.schemas import OutputFormat, ConfigSchema, ScanMode
+from .models.schemas import OutputFormat, ConfigSchema, ScanMode, FileOrder, MinifyMode
 from .analyzer import analyze_repository, get_quick_stats
 from .git_service import process_source, cleanup_temp_repo
-from .config import load_config
-from .formatters.plain_formatter import format_plain, format_plain_markdown
-from .formatters.xml_formatter import format_xml, format_xml_markdown
+from .archive import is_archive_url
+from .config import CompiledConfig, load_config
+from .file_processor import ScanLimitExceeded
+from .formatters.plain_formatter import format_plain_markdown, iter_plain
+from .formatters.xml_formatter import format_xml_markdown, iter_xml
+from .passthrough import iter_piece_bytes
 from .formatters.json_formatter import format_json, format_json_markdown
+from .metrics import REGISTRY, PipelineStats, collect_stats, observe_stream, span
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,6 +36,13 @@ templates = Jinja2Templates(directory="git1file/ui/templates")
 
 MAX_TOTAL_FILES = 50_000
 MAX_TOTAL_CHARS = 500_000_000
+TIMINGS_HEADER = "X-Git1file-Timings"
+
+
+def apply_server_limits(config: ConfigSchema) -> None:
+    """Лимиты сервера — потолок для .git1file.yaml; проверяются во время сканирования."""
+    config.include.max_total_files = min(config.include.max_total_files, MAX_TOTAL_FILES)
+    config.include.max_total_chars = min(config.include.max_total_chars, MAX_TOTAL_CHARS)
 
 
 @app.get("/health")
@@ -42,56 +56,130 @@ class IngestRequest(BaseModel):
     compress: bool = True
     mode: ScanMode = ScanMode.SMART
     include_markdown: bool = False  # NEW
+    truncate: bool = False  # обрезать вывод по лимитам вместо 413
+    excerpt: bool = False  # начало и конец файлов больше max_file_size вместо пропуска
+    history_commits: int = 0  # churn и время изменения файлов по последним N коммитам
+    stream: bool = False  # архив по ссылке: plain-вывод по мере скачивания, итоги в конце
+    strip_components: Optional[int] = None  # архив: сколько верхних каталогов отрезать; None — по ссылке
+    order: FileOrder = FileOrder.RANK
+    minify: MinifyMode = MinifyMode.NONE
+
+
+def make_response(content, media_type: str, stats: PipelineStats, started: float, labels: tuple) -> Response:
+    """
+    Ответ с заголовком X-Git1file-Timings; латентность пишется в /metrics,
+    для потоковых ответов — после отправки всего тела.
+
+    Заголовок уходит до тела: у потоковых ответов (plain, XML) в нём только
+    фазы до начала отправки, без форматирования и записи. Полные тайминги
+    таких ответов — в /metrics и в строке лога после отправки.
+    """
+    headers = {TIMINGS_HEADER: stats.header_value()}
+
+    def record():
+        REGISTRY.record(*labels, time.perf_counter() - started, stats)
+
+    def record_stream():
+        record()
+        logger.info(f"Streamed {' '.join(labels)} in {(time.perf_counter() - started) * 1000:.1f}ms: "
+                    f"{stats.header_value()}")
+
+    if isinstance(content, str):
+        record()
+        return Response(content=content, media_type=media_type, headers=headers)
+    return StreamingResponse(observe_stream(content, stats, record_stream), media_type=media_type, headers=headers)
 
 
 @app.post("/api/v1/ingest")
 async def ingest_repository(
     background_tasks: BackgroundTasks,
     body: IngestRequest,
+    query: Optional[str] = Query(None, description="Return only the files most relevant to this text"),
+    top_k: int = Query(20, ge=1, description="With query: maximum number of files"),
+    max_chars: int = Query(400_000, ge=1, description="With query: maximum characters of selected files"),
 ):
+    stats = PipelineStats()
+    started = time.perf_counter()
     try:
-        source = body.source
-        format = body.format
-        compress = body.compress
-        mode = body.mode
-        include_markdown = body.include_markdown
-
-        logger.info(f"Processing source: {source}, mode: {mode}, format: {format}, markdown: {include_markdown}")
-        repo_path, is_temp, remote_url = process_source(source)
-
-        if is_temp:
-            background_tasks.add_task(cleanup_temp_repo, repo_path, is_temp)
-
-        config = load_config(repo_path / ".git1file.yaml")
-        config.output.format = format
-        config.output.compress = compress
-        config.output.mode = mode
-        config.include.include_markdown = include_markdown
-
-        analysis = analyze_repository(repo_path, config)
-
-        if analysis.metadata.total_files > MAX_TOTAL_FILES:
-            raise HTTPException(
-                status_code=413,
-                detail=f"Too many files: {analysis.metadata.total_files} > {MAX_TOTAL_FILES}"
-            )
-        if analysis.metadata.total_characters > MAX_TOTAL_CHARS:
-            raise HTTPException(status_code=413, detail="Repository too large")
-
-        if format == OutputFormat.XML:
-            content = format_xml(analysis)
-            media_type = "application/xml"
-        elif format == OutputFormat.JSON:
-            content = format_json(analysis)
-            media_type = "application/json"
-        else:
-            content = format_plain(analysis)
-            media_type = "text/plain"
-
-        return Response(content=content, media_type=media_type)
+        with collect_stats(stats):
+            source = body.source
+            format = body.format
+            compress = body.compress
+            mode = body.mode
+            include_markdown = body.include_markdown
+
+            logger.info(f"Processing source: {source}, mode: {mode}, format: {format}, markdown: {include_markdown}")
+            archive = is_archive_url(source)
+            if archive:
+                # Архив читается потоком, его .git1file.yaml ещё не известен — конфиг по умолчанию
+                repo_path, is_temp, remote_url = None, False, source
+                config = ConfigSchema()
+            else:
+                # Для дерева история не нужна — достаточно shallow clone, как в CLI и /api/v1/tree
+                repo_path, is_temp, remote_url = process_source(source, 1 if format == OutputFormat.TREE else None)
+
+                if is_temp:
+                    background_tasks.add_task(cleanup_temp_repo, repo_path, is_temp)
+
+                with span("config"):
+                    config = load_config(repo_path / ".git1file.yaml")
+            config.output.format = format
+            config.output.compress = compress
+            config.output.mode = mode
+            config.output.order = body.order
+            config.output.minify = body.minify
+            config.include.include_markdown = include_markdown
+            config.include.truncate_on_limit = body.truncate
+            if body.excerpt:
+                config.include.excerpt_large_files = True
+            if body.history_commits:
+                config.output.history_commits = body.history_commits
+            apply_server_limits(config)
+            if archive and (query or format == OutputFormat.TREE):
+                raise ValueError("query and tree output need a cloned repository, not an archive")
+
+            if archive and body.stream and format == OutputFormat.PLAIN:
+                # Первые файлы уходят клиенту, пока архив ещё скачивается
+                from .archive import ArchiveStream
+                from .formatters.plain_formatter import iter_plain_stream
+                files = ArchiveStream(source, config, body.strip_components)
+                content = iter_piece_bytes(iter_plain_stream(files.name, source, files, files.summary))
+                return make_response(content, "text/plain", stats, started, ("ingest", format.value, mode.value))
+
+            if format == OutputFormat.TREE:
+                # Карта репозитория из метаданных: содержимое файлов не читается
+                from .tree import build_tree, format_tree
+                content = format_tree(build_tree(repo_path, CompiledConfig(config)))
+                return make_response(content, "text/plain", stats, started, ("ingest", format.value, mode.value))
+
+            search_query = None
+            if query:
+                from .search import SearchQuery
+                search_query = SearchQuery(query, top_k=top_k, max_chars=max_chars, source=remote_url)
+
+            if archive:
+                from .archive import analyze_archive
+                analysis = analyze_archive(source, config, body.strip_components)
+            else:
+                analysis = analyze_repository(repo_path, config, query=search_query)
+
+            # plain и XML отдаются потоком: большие файлы идут с диска без декодирования
+            if format == OutputFormat.XML:
+                content = iter_piece_bytes(iter_xml(analysis))
+                media_type = "application/xml"
+            elif format == OutputFormat.JSON:
+                content = format_json(analysis)
+                media_type = "application/json"
+            else:
+                content = iter_piece_bytes(iter_plain(analysis))
+                media_type = "text/plain"
+
+        return make_response(content, media_type, stats, started, ("ingest", format.value, mode.value))
 
     except HTTPException:
         raise
+    except ScanLimitExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.exception("Ingest failed")
         raise HTTPException(status_code=400, detail=str(e))
@@ -103,35 +191,49 @@ async def ingest_markdown_only(
     body: IngestRequest,
 ):
     """Новый endpoint для скачивания только markdown файлов"""
+    stats = PipelineStats()
+    started = time.perf_counter()
     try:
-        source = body.source
-        format = body.format
-
-        logger.info(f"Processing markdown from: {source}")
-        repo_path, is_temp, remote_url = process_source(source)
-
-        if is_temp:
-            background_tasks.add_task(cleanup_temp_repo, repo_path, is_temp)
-
-        config = load_config(repo_path / ".git1file.yaml")
-        config.output.format = format
-        config.output.mode = body.mode
-        config.include.include_markdown = False  # Всегда разделяем
-
-        analysis = analyze_repository(repo_path, config)
-
-        if format == OutputFormat.XML:
-            content = format_xml_markdown(analysis)
-            media_type = "application/xml"
-        elif format == OutputFormat.JSON:
-            content = format_json_markdown(analysis)
-            media_type = "application/json"
-        else:
-            content = format_plain_markdown(analysis)
-            media_type = "text/plain"
-
-        return Response(content=content, media_type=media_type)
-
+        with collect_stats(stats):
+            source = body.source
+            format = body.format
+
+            logger.info(f"Processing markdown from: {source}")
+            repo_path, is_temp, remote_url = process_source(source)
+
+            if is_temp:
+                background_tasks.add_task(cleanup_temp_repo, repo_path, is_temp)
+
+            with span("config"):
+                config = load_config(repo_path / ".git1file.yaml")
+            config.output.format = format
+            config.output.mode = body.mode
+            config.output.order = body.order
+            config.include.include_markdown = False  # Всегда разделяем
+            config.include.truncate_on_limit = body.truncate
+            if body.excerpt:
+                config.include.excerpt_large_files = True
+            if body.history_commits:
+                config.output.history_commits = body.history_commits
+            apply_server_limits(config)
+
+            # Лимиты — по markdown: код в этот ответ не попадает
+            analysis = analyze_repository(repo_path, config, charge="markdown")
+
+            if format == OutputFormat.XML:
+                content = format_xml_markdown(analysis)
+                media_type = "application/xml"
+            elif format == OutputFormat.JSON:
+                content = format_json_markdown(analysis)
+                media_type = "application/json"
+            else:
+                content = format_plain_markdown(analysis)
+                media_type = "text/plain"
+
+        return make_response(content, media_type, stats, started, ("markdown", format.value, body.mode.value))
+
+    except ScanLimitExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         logger.exception("Markdown ingest failed")
         raise HTTPException(status_code=400, detail=str(e))
@@ -139,24 +241,79 @@ async def ingest_markdown_only(
 
 @app.get("/api/v1/stats")
 async def get_stats(
+    response: Response,
     background_tasks: BackgroundTasks,
     source: str = Query(..., description="Local path or git URL"),
     mode: ScanMode = Query(ScanMode.SMART, description="Scan mode: full or smart"),
 ):
+    stats = PipelineStats()
+    started = time.perf_counter()
     try:
-        repo_path, is_temp, _ = process_source(source)
-        if is_temp:
-            background_tasks.add_task(cleanup_temp_repo, repo_path, is_temp)
-
-        config = load_config(repo_path / ".git1file.yaml")
-        config.output.mode = mode
-        analysis = analyze_repository(repo_path, config)
+        with collect_stats(stats):
+            repo_path, is_temp, _ = process_source(source)
+            if is_temp:
+                background_tasks.add_task(cleanup_temp_repo, repo_path, is_temp)
+
+            with span("config"):
+                config = load_config(repo_path / ".git1file.yaml")
+            config.output.mode = mode
+            apply_server_limits(config)
+            analysis = analyze_repository(repo_path, config)
+
+        response.headers[TIMINGS_HEADER] = stats.header_value()
+        REGISTRY.record("stats", "none", mode.value, time.perf_counter() - started, stats)
         return get_quick_stats(analysis)
 
+    except ScanLimitExceeded as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.get("/api/v1/tree")
+async def get_tree(
+    background_tasks: BackgroundTasks,
+    source: str = Query(..., description="Local path or git URL"),
+    mode: ScanMode = Query(ScanMode.SMART, description="Scan mode: full or smart"),
+    depth: int = Query(0, ge=0, description="Expand only this many levels (0: all)"),
+    format: Literal["plain", "json"] = Query("plain", description="Indented text or nested JSON"),
+    use_index: bool = Query(True, description="Read paths and sizes from the git index when available"),
+):
+    """Directory tree with per-directory sizes and languages; file contents are never read."""
+    from .tree import build_tree, format_tree, tree_to_dict
+
+    stats = PipelineStats()
+    started = time.perf_counter()
+    try:
+        with collect_stats(stats):
+            repo_path, is_temp, _ = process_source(source, 1)
+            if is_temp:
+                background_tasks.add_task(cleanup_temp_repo, repo_path, is_temp)
+
+            with span("config"):
+                config = load_config(repo_path / ".git1file.yaml")
+            config.output.mode = mode
+            root = build_tree(repo_path, CompiledConfig(config), use_index=use_index)
+
+            if format == "json":
+                content = json.dumps(tree_to_dict(root, depth), ensure_ascii=False)
+                media_type = "application/json"
+            else:
+                content = format_tree(root, depth)
+                media_type = "text/plain"
+
+        return make_response(content, media_type, stats, started, ("tree", format, mode.value))
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text exposition format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/v1/config/template")
 def get_config_template():
     """Get configuration template with plain as default format."""
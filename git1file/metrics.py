@@ -0,0 +1,168 @@
+﻿# git1file/metrics.py
+"""
+Pipeline instrumentation: per-phase timings, counters and a Prometheus registry.
+
+Stats for the current ingest live in a ContextVar, so pipeline functions call
+span()/incr() without threading an extra argument through every signature.
+Outside collect_stats() both are no-ops.
+"""
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class PipelineStats:
+    """Timings (seconds, summed per phase) and counters of one ingest."""
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def incr(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def header_value(self) -> str:
+        """Значение для X-Git1file-Timings: phase=ms через запятую."""
+        return ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in self.timings.items())
+
+    def summary(self) -> str:
+        lines = ["PROFILE", "-" * 40]
+        for name, seconds in sorted(self.timings.items(), key=lambda item: -item[1]):
+            lines.append(f"  {name:<20} {seconds * 1000:>10.1f} ms")
+        if self.counters:
+            lines.append("-" * 40)
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"  {name:<20} {value:>10}")
+        return "\n".join(lines)
+
+
+_current_stats: ContextVar[Optional[PipelineStats]] = ContextVar("git1file_stats", default=None)
+
+
+@contextmanager
+def collect_stats(stats: Optional[PipelineStats] = None) -> Iterator[PipelineStats]:
+    stats = stats or PipelineStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def span(name: str):
+    stats = _current_stats.get()
+    return stats.span(name) if stats is not None else nullcontext()
+
+
+def incr(name: str, value: int = 1) -> None:
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.incr(name, value)
+
+
+def timed(name: str) -> Callable:
+    """Decorator: time the whole call as phase `name`."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> (счётчики по бакетам, сумма, количество)
+        self.series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float) -> None:
+        series = self.series.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (bucket_counts, total, count) in sorted(self.series.items()):
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {bucket_count}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {count}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, labels)} {total}"
+            yield f"{self.name}_count{_format_labels(self.label_names, labels)} {count}"
+
+
+class MetricsRegistry:
+    """Process-wide aggregates exposed on /metrics in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_duration = Histogram(
+            "git1file_request_duration_seconds",
+            "End-to-end ingest latency",
+            ("endpoint", "format", "mode"),
+        )
+        self.phase_seconds: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+
+    def record(self, endpoint: str, format: str, mode: str, seconds: float, stats: PipelineStats) -> None:
+        with self._lock:
+            self.request_duration.observe((endpoint, format, mode), seconds)
+            for name, value in stats.timings.items():
+                self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + value
+            for name, value in stats.counters.items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def render(self) -> str:
+        with self._lock:
+            lines = list(self.request_duration.render())
+            lines.append("# HELP git1file_phase_seconds_total Time spent per pipeline phase")
+            lines.append("# TYPE git1file_phase_seconds_total counter")
+            for name, value in sorted(self.phase_seconds.items()):
+                lines.append(f'git1file_phase_seconds_total{{phase="{name}"}} {value}')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE git1file_{name}_total counter")
+                lines.append(f"git1file_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def observe_stream(chunks: Iterable[bytes], stats: PipelineStats, on_done: Callable[[], None]) -> Iterator[bytes]:
+    """Wraps a streaming body: times it as phase 'stream' and calls on_done at the end."""
+    try:
+        with stats.span("stream"):
+            yield from chunks
+    finally:
+        on_done()
@@ -0,0 +1,445 @@
+﻿# git1file/minifier.py
+"""
+Content minification to cut output tokens.
+
+Modes:
+- whitespace: drop blank lines and trailing spaces, collapse indentation
+- strip:      additionally remove comments and docstrings
+- skeleton:   keep imports, signatures and class/function headers, drop bodies
+
+Python goes through tokenize/ast; other languages through a small
+string/comment-aware tokenizer. Results are cached per content hash.
+"""
+import ast
+import hashlib
+import io
+import re
+import tokenize
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+from .models.schemas import FileInfo, MinifyMode
+from .passthrough import get_content
+from .metrics import incr
+
+CACHE_SIZE = 4096
+
+C_LIKE_LANGUAGES = {
+    "javascript", "typescript", "jsx", "tsx", "java", "cpp", "c", "csharp",
+    "go", "rust", "swift", "kotlin", "scala", "php", "dart", "groovy", "objective-c",
+}
+HASH_COMMENT_LANGUAGES = {
+    "ruby", "bash", "zsh", "fish", "powershell", "yaml", "toml", "dockerfile", "ini", "config",
+    "makefile", "cmake", "perl", "r",
+}
+# Языки, где отступы не значимы и их можно срезать целиком
+FREE_INDENT_LANGUAGES = C_LIKE_LANGUAGES | {"css", "scss", "html", "xml", "sql", "json"}
+
+CONTAINER_RE = re.compile(
+    r'\b(class|struct|interface|trait|impl|namespace|enum|module|object|extern|'
+    r'protocol|extension|record|union)\b'
+)
+
+# (вид сегмента, текст): "code", "string" или "comment"
+Segment = Tuple[str, str]
+
+_cache: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+
+
+def _comment_syntax(language: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """Line-comment prefixes and block-comment delimiters for a language."""
+    if language in C_LIKE_LANGUAGES or language == "scss":
+        return ["//"], [("/*", "*/")]
+    if language == "css":
+        return [], [("/*", "*/")]
+    if language == "sql":
+        return ["--"], [("/*", "*/")]
+    if language in ("html", "xml"):
+        return [], [("<!--", "-->")]
+    if language == "powershell":
+        return ["#"], [("<#", "#>")]
+    if language == "ini":
+        return ["#", ";"], []
+    if language in HASH_COMMENT_LANGUAGES:
+        return ["#"], []
+    return [], []
+
+
+def _string_delimiters(language: str) -> List[str]:
+    if language in ("html", "xml", "ini", "config", "dockerfile"):
+        return []
+    if language == "rust":
+        return ['"']  # одинарная кавычка в Rust — это lifetime
+    if language in ("javascript", "typescript", "jsx", "tsx", "go"):
+        return ['"', "'", "`"]
+    return ['"', "'"]
+
+
+def tokenize_generic(content: str, language: str) -> List[Segment]:
+    """Splits source into code, string and comment segments."""
+    line_comments, block_comments = _comment_syntax(language)
+    quotes = _string_delimiters(language)
+    hash_style = "#" in line_comments
+    # Символы, с которых может начинаться строка или комментарий
+    triggers = set(quotes) | {p[0] for p in line_comments} | {o[0] for o, _ in block_comments}
+
+    segments: List[Segment] = []
+    code_start = 0
+    i = 0
+    n = len(content)
+
+    def flush_code(end: int):
+        if end > code_start:
+            segments.append(("code", content[code_start:end]))
+
+    while i < n:
+        ch = content[i]
+        if ch not in triggers:
+            i += 1
+            continue
+
+        matched_block = None
+        for opener, closer in block_comments:
+            if content.startswith(opener, i):
+                matched_block = (opener, closer)
+                break
+        if matched_block:
+            end = content.find(matched_block[1], i + len(matched_block[0]))
+            end = n if end == -1 else end + len(matched_block[1])
+            flush_code(i)
+            segments.append(("comment", content[i:end]))
+            i = code_start = end
+            continue
+
+        matched_line = None
+        for prefix in line_comments:
+            if content.startswith(prefix, i):
+                # В shell-подобных языках '#' — комментарий только в начале слова
+                if prefix == "#" and hash_style and i > 0 and not content[i - 1].isspace():
+                    continue
+                matched_line = prefix
+                break
+        if matched_line:
+            end = content.find("\n", i)
+            end = n if end == -1 else end
+            flush_code(i)
+            segments.append(("comment", content[i:end]))
+            i = code_start = end
+            continue
+
+        if ch in quotes:
+            j = i + 1
+            while j < n:
+                if content[j] == "\\":
+                    j += 2
+                    continue
+                if content[j] == ch:
+                    break
+                if content[j] == "\n" and ch != "`":
+                    break  # незакрытая строка — не тянем её через весь файл
+                j += 1
+            end = min(j + 1, n)
+            flush_code(i)
+            segments.append(("string", content[i:end]))
+            i = code_start = end
+            continue
+
+        i += 1
+
+    flush_code(n)
+    return segments
+
+
+def _drop_comments(segments: Iterable[Segment]) -> List[Segment]:
+    result = []
+    for kind, text in segments:
+        if kind != "comment":
+            result.append((kind, text))
+        elif "\n" in text:
+            # Сохраняем переводы строк: в JS/Go они значимы (ASI)
+            result.append(("code", "\n" * text.count("\n")))
+        elif not text.startswith(("//", "#", "--")):
+            result.append(("code", " "))
+    return result
+
+
+def _is_container_header(head: str) -> bool:
+    # Смотрим на последние две строки заголовка: хватает для Allman-стиля и переносов
+    lines = [line for line in head.strip().splitlines() if line.strip()]
+    return bool(CONTAINER_RE.search(" ".join(lines[-2:])))
+
+
+def _skeleton_segments(segments: Iterable[Segment]) -> List[Segment]:
+    """Elides brace-delimited bodies that are not class-like containers."""
+    result: List[Segment] = []
+    header: List[str] = []  # код с последней границы ';', '{' или '}'
+    suppress_depth = 0
+
+    for kind, text in segments:
+        if kind != "code":
+            if not suppress_depth:
+                result.append((kind, text))
+            continue
+
+        kept = []
+        for ch in text:
+            if suppress_depth:
+                if ch == "{":
+                    suppress_depth += 1
+                elif ch == "}":
+                    suppress_depth -= 1
+                    if not suppress_depth:
+                        kept.append(" ... }")
+                continue
+
+            kept.append(ch)
+            if ch in ";}":
+                header = []
+            elif ch == "{":
+                if not _is_container_header("".join(header)):
+                    suppress_depth = 1
+                header = []
+            else:
+                header.append(ch)
+        result.append(("code", "".join(kept)))
+
+    return result
+
+
+def _collapse_lines(segments: Iterable[Segment], strip_indent: bool) -> str:
+    """Drops blank lines and trailing spaces without touching multi-line strings."""
+    text_parts = []
+    protected = set()  # позиции '\n' внутри строковых литералов
+    offset = 0
+    for kind, text in segments:
+        if kind == "string":
+            pos = text.find("\n")
+            while pos != -1:
+                protected.add(offset + pos)
+                pos = text.find("\n", pos + 1)
+        text_parts.append(text)
+        offset += len(text)
+    text = "".join(text_parts)
+
+    lines = []
+    line_start = 0
+    starts_in_string = False
+    while line_start <= len(text):
+        end = text.find("\n", line_start)
+        if end == -1:
+            end = len(text)
+        line = text[line_start:end]
+        ends_in_string = end in protected
+
+        if not ends_in_string:
+            line = line.rstrip()
+        if strip_indent and not starts_in_string:
+            line = line.lstrip()
+        if line or starts_in_string or ends_in_string:
+            lines.append(line)
+
+        starts_in_string = ends_in_string
+        line_start = end + 1
+    return "\n".join(lines)
+
+
+def _minify_generic(content: str, language: str, mode: MinifyMode) -> str:
+    segments = tokenize_generic(content, language)
+    if mode in (MinifyMode.STRIP, MinifyMode.SKELETON):
+        segments = _drop_comments(segments)
+    if mode == MinifyMode.SKELETON and language in C_LIKE_LANGUAGES:
+        segments = _skeleton_segments(segments)
+    strip_indent = mode != MinifyMode.SKELETON and language in FREE_INDENT_LANGUAGES
+    return _collapse_lines(segments, strip_indent)
+
+
+def _docstring_nodes(tree: ast.AST) -> List[ast.Expr]:
+    nodes = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            body = node.body
+            if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+                    and isinstance(body[0].value.value, str):
+                nodes.append((node, body[0]))
+    return nodes
+
+
+def _python_strip(content: str) -> str:
+    tree = ast.parse(content)
+    lines = content.splitlines(keepends=True)
+
+    # Докстринги: вырезаем строки целиком, если тело пустеет — ставим '...'
+    replace = {}
+    for parent, doc in _docstring_nodes(tree):
+        first = lines[doc.lineno - 1]
+        if first[:doc.col_offset].strip():
+            continue  # докстринг на одной строке с заголовком
+        filler = " " * doc.col_offset + "...\n" if len(parent.body) == 1 else ""
+        replace[doc.lineno - 1] = filler
+        for row in range(doc.lineno, doc.end_lineno):
+            replace[row] = ""
+
+    # Комментарии: обрезаем строку с позиции токена
+    cut = {}
+    for tok in tokenize.generate_tokens(io.StringIO(content).readline):
+        if tok.type == tokenize.COMMENT:
+            row, col = tok.start
+            cut[row - 1] = col
+
+    result = []
+    for row, line in enumerate(lines):
+        if row in replace:
+            result.append(replace[row])
+            continue
+        if row in cut:
+            head = line[:cut[row]].rstrip()
+            line = head + "\n" if head else "\n"
+        result.append(line)
+    return "".join(result)
+
+
+def _python_collapse(content: str) -> str:
+    """Blank lines out, one space per indentation level; strings untouched."""
+    lines = content.splitlines()
+    protected = set()  # строки внутри многострочных строковых литералов
+    string_heads = set()  # строки, где многострочный литерал начинается
+    fstring_start = getattr(tokenize, "FSTRING_START", None)
+    fstring_end = getattr(tokenize, "FSTRING_END", None)
+    open_fstrings = []
+    depth_at = {}
+    depth = 0
+    for tok in tokenize.generate_tokens(io.StringIO(content).readline):
+        if tok.type == tokenize.INDENT:
+            depth += 1
+        elif tok.type == tokenize.DEDENT:
+            depth -= 1
+        elif tok.type == fstring_start:
+            open_fstrings.append(tok.start[0])
+        elif tok.type in (tokenize.STRING, fstring_end):
+            first_row = open_fstrings.pop() if tok.type == fstring_end else tok.start[0]
+            if tok.end[0] > first_row:
+                string_heads.add(first_row)
+                protected.update(range(first_row + 1, tok.end[0] + 1))
+        if tok.type not in (tokenize.INDENT, tokenize.DEDENT, tokenize.NL, tokenize.NEWLINE):
+            depth_at.setdefault(tok.start[0], depth)
+
+    result = []
+    for row, line in enumerate(lines, start=1):
+        if row in protected:
+            result.append(line)
+            continue
+        stripped = line.lstrip() if row in string_heads else line.strip()
+        if not stripped:
+            continue
+        result.append(" " * depth_at.get(row, depth) + stripped)
+    return "\n".join(result)
+
+
+class _SkeletonTransformer(ast.NodeTransformer):
+    MAX_VALUE_CHARS = 80
+
+    def _elide_body(self, node):
+        body = []
+        if ast.get_docstring(node, clean=False) is not None:
+            doc = node.body[0].value.value.strip().splitlines()
+            body.append(ast.Expr(ast.Constant(doc[0] if doc else "")))
+        body.append(ast.Expr(ast.Constant(Ellipsis)))
+        node.body = body
+        return node
+
+    def visit_FunctionDef(self, node):
+        return self._elide_body(node)
+
+    def visit_AsyncFunctionDef(self, node):
+        return self._elide_body(node)
+
+    def visit_ClassDef(self, node):
+        doc = ast.get_docstring(node, clean=False)
+        body = [self.visit(n) for n in node.body if self._keep(n)]
+        if doc is not None:
+            lines = doc.strip().splitlines()
+            body.insert(0, ast.Expr(ast.Constant(lines[0] if lines else "")))
+        node.body = body or [ast.Expr(ast.Constant(Ellipsis))]
+        return node
+
+    def visit_Module(self, node):
+        node.body = [self.visit(n) for n in node.body if self._keep(n)]
+        return node
+
+    def _keep(self, node) -> bool:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef,
+                             ast.Import, ast.ImportFrom)):
+            return True
+        if isinstance(node, (ast.Assign, ast.AnnAssign)):
+            value = getattr(node, "value", None)
+            if value is not None and len(ast.unparse(value)) > self.MAX_VALUE_CHARS:
+                node.value = ast.Constant(Ellipsis)
+            return True
+        return False
+
+
+def _python_skeleton(content: str) -> str:
+    tree = _SkeletonTransformer().visit(ast.parse(content))
+    return ast.unparse(ast.fix_missing_locations(tree))
+
+
+def _minify_python(content: str, mode: MinifyMode) -> str:
+    content = content.lstrip("\ufeff")  # ast не принимает BOM в str
+    if mode == MinifyMode.SKELETON:
+        return _python_skeleton(content)
+    if mode == MinifyMode.STRIP:
+        content = _python_strip(content)
+    return _python_collapse(content)
+
+
+def clear_cache() -> None:
+    _cache.clear()
+
+
+def is_minifiable(language: Optional[str]) -> bool:
+    return language == "python" or language in C_LIKE_LANGUAGES \
+        or language in HASH_COMMENT_LANGUAGES or language in FREE_INDENT_LANGUAGES
+
+
+def minify_content(content: str, language: Optional[str], mode: MinifyMode) -> str:
+    """Minify a single file; falls back to the original text on any parse error."""
+    if mode == MinifyMode.NONE or not content or not is_minifiable(language):
+        return content
+
+    key = (hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest(), language, mode.value)
+    cached = _cache.get(key)
+    if cached is not None:
+        _cache.move_to_end(key)
+        incr("minify_cache_hits")
+        return cached
+    incr("minify_cache_misses")
+
+    try:
+        if language == "python":
+            result = _minify_python(content, mode)
+        else:
+            result = _minify_generic(content, language, mode)
+    except (SyntaxError, ValueError, tokenize.TokenError, IndentationError):
+        result = content
+
+    _cache[key] = result
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return result
+
+
+def minify_files(file_infos: List[FileInfo], mode: MinifyMode) -> List[FileInfo]:
+    """Returns files with minified content; passthrough files are decoded first."""
+    if mode == MinifyMode.NONE:
+        return file_infos
+
+    result = []
+    for file_info in file_infos:
+        # Выдержку не минифицируем: обрезанный код ломает разбор строк и комментариев
+        if file_info.is_binary or file_info.omitted_bytes or not is_minifiable(file_info.language) \
+                or not (file_info.content or file_info.source_path):
+            result.append(file_info)
+            continue
+        content = minify_content(get_content(file_info), file_info.language, mode)
+        result.append(file_info.model_copy(update={"content": content, "source_path": None}))
+    return result
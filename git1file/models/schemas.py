@@ -7,6 +7,7 @@ class OutputFormat(str, Enum):
     XML = "xml"
     PLAIN = "plain"
     JSON = "json"
+    TREE = "tree"  # только дерево каталогов с размерами, без содержимого
 
 
 class ScanMode(str, Enum):
@@ -14,6 +15,20 @@ class ScanMode(str, Enum):
     SMART = "smart"
 
 
+class FileOrder(str, Enum):
+    RANK = "rank"
+    PATH = "path"
+    CHURN = "churn"  # чаще всего менявшиеся файлы первыми (нужна история git)
+    RECENT = "recent"  # недавно изменённые файлы первыми
+
+
+class MinifyMode(str, Enum):
+    NONE = "none"
+    WHITESPACE = "whitespace"
+    STRIP = "strip"
+    SKELETON = "skeleton"
+
+
 class LanguageStats(BaseModel):
     name: str
     files: int = 0
@@ -27,6 +42,10 @@ class FileInfo(BaseModel):
     language: Optional[str] = None
     is_binary: bool = False
     is_ignored: bool = False
+    source_path: Optional[str] = None  # контент не загружен, пишется прямо с диска
+    omitted_bytes: int = 0  # > 0: content — выдержка из начала и конца большого файла
+    churn: Optional[int] = None  # коммитов из последних N, менявших файл (history_commits > 0)
+    last_changed: Optional[int] = None  # unix time последнего такого коммита
 
 
 class RepositoryMetadata(BaseModel):
@@ -40,6 +59,10 @@ class RepositoryMetadata(BaseModel):
     is_git_repo: bool = False
     markdown_files: int = 0
     markdown_characters: int = 0
+    truncated: bool = False
+    omitted_files: int = 0
+    omitted_characters: int = 0
+    history_commits: int = 0  # пройдено коммитов для churn/last_changed, 0 — без истории
 
 
 class RepositoryAnalysis(BaseModel):
@@ -60,12 +83,22 @@ class IncludeConfig(BaseModel):
     max_total_chars: int = 500_000_000
     binary_detection: bool = True
     include_markdown: bool = False
+    truncate_on_limit: bool = False  # вместо ошибки обрезать вывод по лимитам
+    stream_large_files: bool = True
+    stream_threshold: str = "256KB"
+    excerpt_large_files: bool = False  # файлы больше max_file_size: начало и конец вместо пропуска
+    excerpt_head: str = "16KB"
+    excerpt_tail: str = "4KB"
+    excerpt_lines: int = 0  # > 0: начало выдержки — первые N строк (не больше excerpt_head)
 
 
 class OutputConfig(BaseModel):
     format: OutputFormat = OutputFormat.PLAIN
     compress: bool = True
     mode: ScanMode = ScanMode.SMART
+    order: FileOrder = FileOrder.RANK
+    minify: MinifyMode = MinifyMode.NONE
+    history_commits: int = 0  # > 0: churn и время изменения по последним N коммитам
 
 
 class ConfigSchema(BaseModel):
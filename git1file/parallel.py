@@ -0,0 +1,122 @@
+﻿# git1file/parallel.py
+"""
+Process-pool scan for CPU-heavy per-file work (decoding, validation, minification).
+
+The main process walks the tree and applies ignore rules; batches of relative
+paths go to a ProcessPoolExecutor. Workers return slim tuples instead of
+pydantic models, and the main process only merges them back in walk order.
+"""
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .models.schemas import FileInfo, MinifyMode
+from .config import CompiledConfig
+from .file_processor import (
+    ScanBudget,
+    iter_admitted_paths,
+    process_file,
+    split_markdown,
+)
+from .classifier import classify_batch
+from .minifier import is_minifiable, minify_content
+from .metrics import incr
+
+BATCH_SIZE = 256
+
+# (path, content, size, language, is_binary, source_path, omitted_bytes)
+SlimRecord = Tuple[str, Optional[str], int, Optional[str], bool, Optional[str], int]
+
+
+def _process_batch(
+        repo_root: str,
+        relative_paths: List[str],
+        compiled: CompiledConfig,
+        minify: MinifyMode
+) -> List[SlimRecord]:
+    repo_path = Path(repo_root)
+
+    paths = [Path(relative) for relative in relative_paths]
+    records = []
+    for relative_path, file_class in zip(paths, classify_batch(paths)):
+        try:
+            file_info = process_file(repo_path / relative_path, relative_path, compiled, file_class=file_class)
+            content = file_info.content
+            source_path = file_info.source_path
+            minifiable = minify != MinifyMode.NONE and not file_info.is_binary \
+                and not file_info.omitted_bytes and is_minifiable(file_info.language)
+            if minifiable and source_path:
+                with open(source_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                source_path = None
+        except OSError:
+            continue  # файл исчез между обходом и чтением (в том числе перед минификацией)
+
+        if minifiable:
+            content = minify_content(content, file_info.language, minify)
+
+        records.append((file_info.path, content, file_info.size, file_info.language,
+                        file_info.is_binary, source_path, file_info.omitted_bytes))
+    return records
+
+
+def _to_file_info(record: SlimRecord) -> FileInfo:
+    path, content, size, language, is_binary, source_path, omitted_bytes = record
+    # Воркеры не видят статистику запроса — считаем по результатам
+    if is_binary:
+        incr("files_binary")
+    elif source_path:
+        incr("files_streamed")
+    elif omitted_bytes:
+        incr("files_excerpted")
+        incr("bytes_read", size - omitted_bytes)
+    elif content is not None:
+        incr("bytes_read", size)
+    return FileInfo(
+        path=path,
+        content=content,
+        size=size,
+        language=language,
+        is_binary=is_binary,
+        is_ignored=False,
+        source_path=source_path,
+        omitted_bytes=omitted_bytes
+    )
+
+
+def scan_repository_parallel(
+        repo_path: Path,
+        compiled: CompiledConfig,
+        processes: int,
+        minify: MinifyMode = MinifyMode.NONE,
+        budget: Optional[ScanBudget] = None
+) -> Tuple[List[FileInfo], List[FileInfo]]:
+    """
+    Same result as scan_repository, with per-file work spread over `processes`
+    worker processes. Content comes back already minified with `minify`.
+    Budgets are enforced in the main process while walking.
+    """
+    repo_root = str(repo_path)
+    budget = budget or ScanBudget(compiled)
+    futures: List[Future] = []
+
+    executor = ProcessPoolExecutor(max_workers=processes)
+    try:
+        # Обход дерева идёт параллельно с обработкой уже отправленных пачек
+        batch: List[str] = []
+        for _, relative_path, _ in iter_admitted_paths(repo_path, compiled, budget):
+            batch.append(relative_path.as_posix())
+            if len(batch) >= BATCH_SIZE:
+                futures.append(executor.submit(_process_batch, repo_root, batch, compiled, minify))
+                batch = []
+        if batch:
+            futures.append(executor.submit(_process_batch, repo_root, batch, compiled, minify))
+
+        file_infos = [_to_file_info(record) for future in futures for record in future.result()]
+    except BaseException:
+        # Превышен бюджет или ошибка — не дожидаемся уже поставленных пачек
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+
+    return split_markdown(file_infos)
@@ -0,0 +1,165 @@
+﻿# git1file/passthrough.py
+"""
+Zero-copy passthrough for large text files.
+
+Large files are validated once through an mmap and then copied straight from
+disk to the output stream (os.sendfile / socket.sendfile when possible), so
+they are never decoded into Python strings.
+"""
+import codecs
+import io
+import mmap
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator, Optional, Union
+
+from .models.schemas import FileInfo
+
+if TYPE_CHECKING:
+    import socket
+
+CHUNK_SIZE = 1024 * 1024
+
+# Кусок вывода: либо готовая строка, либо файл, который читается с диска
+Piece = Union[str, FileInfo]
+
+
+def is_passthrough_safe(file_path: Path) -> bool:
+    """
+    Validation scan: the file can be emitted byte-for-byte only if it is valid
+    UTF-8, has no CR (text mode would translate newlines) and no CDATA terminator.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if mm.find(b'\r') != -1 or mm.find(b']]>') != -1:
+                    return False
+                decoder = codecs.getincrementaldecoder('utf-8')()
+                for offset in range(0, len(mm), CHUNK_SIZE):
+                    decoder.decode(mm[offset:offset + CHUNK_SIZE])
+                decoder.decode(b'', final=True)
+                return True
+    except (OSError, ValueError, UnicodeDecodeError):
+        return False
+
+
+def get_content(file_info: FileInfo) -> Optional[str]:
+    """Content of the file, decoding passthrough files on demand."""
+    if file_info.content is not None or not file_info.source_path:
+        return file_info.content
+    try:
+        with open(file_info.source_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def has_content(file_info: FileInfo) -> bool:
+    return bool(file_info.content) or bool(file_info.source_path)
+
+
+def iter_file_chunks(source_path: str) -> Iterator[bytes]:
+    with open(source_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for offset in range(0, len(mm), CHUNK_SIZE):
+                yield mm[offset:offset + CHUNK_SIZE]
+
+
+def copy_file_to_stream(source_path: str, out: Union[BinaryIO, "socket.socket"]) -> None:
+    """Copy a file to a binary stream or socket without going through str."""
+    with open(source_path, 'rb') as f:
+        # socket.socket: проверяем по интерфейсу, чтобы не импортировать socket на старте
+        if hasattr(out, 'sendfile') and hasattr(out, 'recv'):
+            out.sendfile(f)
+            return
+
+        size = os.fstat(f.fileno()).st_size
+        out.flush()
+        try:
+            out_fd = out.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            out_fd = None
+
+        if out_fd is not None and hasattr(os, 'sendfile'):
+            offset = 0
+            try:
+                while offset < size:
+                    sent = os.sendfile(out_fd, f.fileno(), offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                # sendfile пишет мимо буфера объекта — сдвигаем его позицию
+                if out.seekable():
+                    out.seek(0, os.SEEK_END)
+                return
+            except OSError:
+                if offset:
+                    raise
+
+    for chunk in iter_file_chunks(source_path):
+        out.write(chunk)
+
+
+def join_pieces(pieces: Iterable[Piece]) -> str:
+    return "".join(
+        piece if isinstance(piece, str) else (get_content(piece) or "")
+        for piece in pieces
+    )
+
+
+def _coalesce(pieces: Iterable[Piece]) -> Iterator[Union[bytes, FileInfo]]:
+    """Склеивает соседние строки в блоки ~CHUNK_SIZE: один write вместо тысяч мелких."""
+    buffer = []
+    buffered = 0
+    for piece in pieces:
+        if isinstance(piece, str):
+            buffer.append(piece)
+            buffered += len(piece)
+            if buffered < CHUNK_SIZE:
+                continue
+        if buffer:
+            yield "".join(buffer).encode('utf-8')
+            buffer = []
+            buffered = 0
+        if not isinstance(piece, str):
+            yield piece
+    if buffer:
+        yield "".join(buffer).encode('utf-8')
+
+
+def iter_piece_bytes(pieces: Iterable[Piece]) -> Iterator[bytes]:
+    """Byte chunks for streaming responses; passthrough files are never decoded."""
+    for chunk in _coalesce(pieces):
+        if isinstance(chunk, bytes):
+            yield chunk
+        else:
+            yield from iter_file_chunks(chunk.source_path)
+
+
+def write_pieces(pieces: Iterable[Piece], out: BinaryIO) -> None:
+    for chunk in _coalesce(pieces):
+        if isinstance(chunk, bytes):
+            out.write(chunk)
+        else:
+            copy_file_to_stream(chunk.source_path, out)
+    out.flush()
+
+
+def join_lines(lines: Iterable) -> Iterator[Piece]:
+    """
+    Streaming equivalent of "\\n".join(lines). A line is a str, a passthrough
+    FileInfo, or a list of those emitted back to back.
+    """
+    first = True
+    for line in lines:
+        if not first:
+            yield "\n"
+        first = False
+        if isinstance(line, list):
+            yield from line
+        else:
+            yield line
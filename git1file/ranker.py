@@ -0,0 +1,335 @@
+﻿# git1file/ranker.py
+"""
+Priority ordering of files before formatting.
+
+Builds a lightweight import graph with regex extraction and emits entry
+points first, then modules by in-degree (how many files import them), and
+tests last. Everything is a dict lookup per import, so 50k files rank in
+well under a few seconds.
+"""
+import posixpath
+import re
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from .models.schemas import FileInfo
+
+# Для passthrough-файлов импорты ищем только в начале файла
+HEAD_BYTES = 64 * 1024
+
+ENTRY_POINT_NAMES = {
+    "__main__.py", "main.py", "cli.py", "app.py", "manage.py", "wsgi.py", "asgi.py", "setup.py",
+    "index.js", "index.ts", "index.jsx", "index.tsx", "main.js", "main.ts", "server.js", "server.ts",
+    "app.js", "app.ts", "main.go", "main.rs", "lib.rs", "main.c", "main.cpp", "Main.java",
+    "program.cs", "Program.cs", "readme.md", "README.md", "README.rst", "README.txt",
+    "pyproject.toml", "package.json", "go.mod", "Cargo.toml", "Makefile", "Dockerfile",
+}
+
+TEST_DIR_NAMES = {"test", "tests", "__tests__", "spec", "specs", "testing", "e2e"}
+TEST_FILE_RE = re.compile(
+    r'(^test_.*\.py$|.*_test\.py$|^conftest\.py$|.*_test\.go$|.*\.(test|spec)\.[jt]sx?$|.*Tests?\.(java|kt|cs)$)'
+)
+
+PY_IMPORT_RE = re.compile(
+    r'^[ \t]*(?:from[ \t]+(\.*[\w.]*)[ \t]+import[ \t]+(\([^)]*\)|[\w*, \t]+)|import[ \t]+([\w., \t]+))', re.M
+)
+JS_IMPORT_RE = re.compile(
+    r'''(?:\bfrom\s*|\bimport\s*\(?\s*|\brequire\s*\(\s*)['"]([^'"\n]+)['"]'''
+)
+GO_IMPORT_BLOCK_RE = re.compile(r'^import\s*\(([^)]*)\)', re.M)
+GO_IMPORT_RE = re.compile(r'^import\s+(?:\w+\s+)?"([^"]+)"', re.M)
+GO_PATH_RE = re.compile(r'"([^"]+)"')
+C_INCLUDE_RE = re.compile(r'^\s*#\s*include\s+"([^"]+)"', re.M)
+RUST_MOD_RE = re.compile(r'^\s*(?:pub(?:\([^)]*\))?\s+)?mod\s+(\w+)\s*;', re.M)
+RUST_USE_RE = re.compile(r'^\s*(?:pub\s+)?use\s+crate::([\w:]+)', re.M)
+JVM_IMPORT_RE = re.compile(r'^\s*import\s+(?:static\s+)?([\w.]+)', re.M)
+
+JS_LANGUAGES = {"javascript", "typescript", "jsx", "tsx"}
+JS_RESOLVE_SUFFIXES = [
+    "", ".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs",
+    "/index.ts", "/index.tsx", "/index.js", "/index.jsx",
+]
+
+
+def is_test_path(path: str) -> bool:
+    parts = path.split("/")
+    if any(part.lower() in TEST_DIR_NAMES for part in parts[:-1]):
+        return True
+    return bool(TEST_FILE_RE.match(parts[-1]))
+
+
+def is_entry_point(path: str) -> bool:
+    name = path.rsplit("/", 1)[-1]
+    if name not in ENTRY_POINT_NAMES:
+        return False
+    # Точки входа интересны только в корне или на один уровень ниже
+    return path.count("/") <= 1 or name == "__main__.py"
+
+
+def _read_head(file_info: FileInfo) -> str:
+    if file_info.content is not None:
+        return file_info.content
+    if not file_info.source_path:
+        return ""
+    try:
+        with open(file_info.source_path, "rb") as f:
+            return f.read(HEAD_BYTES).decode("utf-8", errors="ignore")
+    except OSError:
+        return ""
+
+
+class _PathIndex:
+    """Lookup tables from import specifiers to repository paths, built once."""
+
+    def __init__(self, paths: Iterable[str]):
+        self.paths: Set[str] = set(paths)
+        self.python_modules: Dict[str, str] = {}
+        self.jvm_classes: Dict[str, str] = {}
+        self.dir_files: Dict[str, List[str]] = defaultdict(list)
+        self.basenames: Dict[str, List[str]] = defaultdict(list)
+
+        for path in sorted(self.paths):
+            directory, name = posixpath.split(path)
+            self.dir_files[directory].append(path)
+            self.basenames[name].append(path)
+
+            if path.endswith(".py"):
+                module = path[:-3].replace("/", ".")
+                if module.endswith(".__init__"):
+                    module = module[:-len(".__init__")]
+                # Индексируем все суффиксы, чтобы работали src/-раскладки
+                parts = module.split(".")
+                for i in range(len(parts)):
+                    self.python_modules.setdefault(".".join(parts[i:]), path)
+            elif path.endswith((".java", ".kt", ".scala")):
+                stem = path.rsplit(".", 1)[0]
+                parts = stem.split("/")
+                for i in range(len(parts)):
+                    self.jvm_classes.setdefault(".".join(parts[i:]), path)
+
+    def resolve_python(self, source: str, module: str, names: List[str]) -> List[str]:
+        if module.startswith("."):
+            level = len(module) - len(module.lstrip("."))
+            package = posixpath.dirname(source)
+            for _ in range(level - 1):
+                package = posixpath.dirname(package)
+            base = package.replace("/", ".")
+            rest = module[level:]
+            module = ".".join(p for p in (base, rest) if p)
+
+        targets = []
+        for name in names:
+            candidate = f"{module}.{name}" if module else name
+            if candidate in self.python_modules:
+                targets.append(self.python_modules[candidate])
+        if not targets:
+            parts = module.split(".")
+            while parts:
+                hit = self.python_modules.get(".".join(parts))
+                if hit:
+                    targets.append(hit)
+                    break
+                parts.pop()
+        return targets
+
+    def resolve_relative(self, source: str, spec: str, suffixes: List[str]) -> Optional[str]:
+        base = posixpath.normpath(posixpath.join(posixpath.dirname(source), spec))
+        for suffix in suffixes:
+            if base + suffix in self.paths:
+                return base + suffix
+        return None
+
+    def resolve_go(self, import_path: str) -> List[str]:
+        parts = import_path.split("/")
+        for i in range(len(parts)):
+            directory = "/".join(parts[i:])
+            files = self.dir_files.get(directory)
+            if files:
+                return [f for f in files if f.endswith(".go") and not f.endswith("_test.go")]
+        return []
+
+    def resolve_jvm(self, name: str) -> List[str]:
+        parts = name.split(".")
+        while parts:
+            hit = self.jvm_classes.get(".".join(parts))
+            if hit:
+                return [hit]
+            parts.pop()
+        return []
+
+
+def extract_dependencies(file_info: FileInfo, index: _PathIndex) -> Set[str]:
+    language = file_info.language
+    path = file_info.path
+    targets: Set[str] = set()
+
+    if language not in ("python", "go", "rust", "c", "cpp", "java", "kotlin", "scala") \
+            and language not in JS_LANGUAGES:
+        return targets
+
+    text = _read_head(file_info)
+    if not text:
+        return targets
+
+    if language == "python":
+        for match in PY_IMPORT_RE.finditer(text):
+            if match.group(3):
+                for module in match.group(3).split(","):
+                    words = module.split()
+                    if words:
+                        targets.update(index.resolve_python(path, words[0], []))
+            else:
+                names = [
+                    n.split()[0]
+                    for n in match.group(2).strip("()").split(",")
+                    if n.split()
+                ]
+                targets.update(index.resolve_python(path, match.group(1), names))
+    elif language in JS_LANGUAGES:
+        for spec in JS_IMPORT_RE.findall(text):
+            if spec.startswith("."):
+                hit = index.resolve_relative(path, spec, JS_RESOLVE_SUFFIXES)
+                if hit:
+                    targets.add(hit)
+    elif language == "go":
+        specs = GO_IMPORT_RE.findall(text)
+        for block in GO_IMPORT_BLOCK_RE.findall(text):
+            specs.extend(GO_PATH_RE.findall(block))
+        for spec in specs:
+            targets.update(index.resolve_go(spec))
+    elif language == "rust":
+        for name in RUST_MOD_RE.findall(text):
+            hit = index.resolve_relative(path, name, [".rs", "/mod.rs"])
+            if hit:
+                targets.add(hit)
+        for name in RUST_USE_RE.findall(text):
+            first = name.split("::")[0]
+            for candidate in (f"src/{first}.rs", f"src/{first}/mod.rs"):
+                if candidate in index.paths:
+                    targets.add(candidate)
+    elif language in ("c", "cpp"):
+        for spec in C_INCLUDE_RE.findall(text):
+            hit = index.resolve_relative(path, spec, [""])
+            if hit:
+                targets.add(hit)
+            else:
+                candidates = index.basenames.get(posixpath.basename(spec), [])
+                if len(candidates) == 1:
+                    targets.add(candidates[0])
+    else:
+        for name in JVM_IMPORT_RE.findall(text):
+            targets.update(index.resolve_jvm(name))
+
+    targets.discard(path)
+    return targets
+
+
+def compute_in_degree(file_infos: List[FileInfo]) -> Dict[str, int]:
+    index = _PathIndex(f.path for f in file_infos)
+    in_degree: Dict[str, int] = defaultdict(int)
+    for file_info in file_infos:
+        if file_info.is_binary:
+            continue
+        for target in extract_dependencies(file_info, index):
+            in_degree[target] += 1
+    return in_degree
+
+
+def rank_files(file_infos: List[FileInfo]) -> List[FileInfo]:
+    """
+    Returns files ordered for LLM consumption:
+    entry points → most imported modules → the rest → tests → binaries.
+    """
+    return order_by_in_degree(file_infos, compute_in_degree(file_infos))
+
+
+def file_group(file_info: FileInfo) -> int:
+    """0 — точки входа, 1 — обычные файлы, 2 — тесты, 3 — бинарные."""
+    if file_info.is_binary:
+        return 3
+    if is_test_path(file_info.path):
+        return 2
+    if is_entry_point(file_info.path):
+        return 0
+    return 1
+
+
+def order_by_in_degree(
+        file_infos: List[FileInfo],
+        in_degree: Dict[str, int],
+        groups: Optional[Dict[str, int]] = None
+) -> List[FileInfo]:
+    """`groups` caches file_group() by path between calls."""
+    if groups is None:
+        groups = {}
+
+    def sort_key(file_info: FileInfo):
+        path = file_info.path
+        group = groups.get(path)
+        if group is None:
+            group = groups[path] = file_group(file_info)
+        return group, -in_degree.get(path, 0), path.count("/"), path
+
+    return sorted(file_infos, key=sort_key)
+
+
+class IncrementalRanker:
+    """
+    rank_files for repeated calls over mostly unchanged files (watch mode).
+
+    Dependencies are cached per path until invalidate(); only a change in the
+    set of paths rebuilds the path index and re-extracts everything.
+    """
+
+    def __init__(self):
+        # frozenset путей -> (индекс путей, зависимости по пути); main и markdown — два набора
+        self._graphs: Dict[FrozenSet[str], Tuple[_PathIndex, Dict[str, Set[str]]]] = {}
+        self._groups: Dict[str, int] = {}
+
+    def invalidate(self, paths: Iterable[str]) -> None:
+        paths = list(paths)
+        for path in paths:
+            self._groups.pop(path, None)
+        for _, dependencies in self._graphs.values():
+            for path in paths:
+                dependencies.pop(path, None)
+
+    def __call__(self, file_infos: List[FileInfo]) -> List[FileInfo]:
+        key = frozenset(f.path for f in file_infos)
+        graph = self._graphs.pop(key, None)
+        if graph is None:
+            graph = (_PathIndex(key), {})
+            if len(self._graphs) >= 2:
+                # Вытесняем давно не использованный набор (dict хранит порядок вставки)
+                del self._graphs[next(iter(self._graphs))]
+        self._graphs[key] = graph
+        index, dependencies = graph
+
+        in_degree: Dict[str, int] = defaultdict(int)
+        for file_info in file_infos:
+            if file_info.is_binary:
+                continue
+            targets = dependencies.get(file_info.path)
+            if targets is None:
+                targets = dependencies[file_info.path] = extract_dependencies(file_info, index)
+            for target in targets:
+                in_degree[target] += 1
+        return order_by_in_degree(file_infos, in_degree, self._groups)
+
+
+def sort_by_path(file_infos: List[FileInfo]) -> List[FileInfo]:
+    return sorted(file_infos, key=lambda f: f.path)
+
+
+def sort_by_churn(file_infos: List[FileInfo]) -> List[FileInfo]:
+    """Чаще менявшиеся файлы первыми; файлы без истории — в конце по пути."""
+    return sorted(file_infos, key=lambda f: (
+        f.churn is None, -(f.churn or 0), -(f.last_changed or 0), f.path
+    ))
+
+
+def sort_by_recency(file_infos: List[FileInfo]) -> List[FileInfo]:
+    """Недавно изменённые файлы первыми; файлы без истории — в конце по пути."""
+    return sorted(file_infos, key=lambda f: (
+        f.last_changed is None, -(f.last_changed or 0), -(f.churn or 0), f.path
+    ))
@@ -0,0 +1,374 @@
+﻿# git1file/search.py
+"""
+Query-targeted extraction: a persistent BM25 index over identifiers and path tokens.
+
+Each repository gets one SQLite file in the cache directory: a docs table
+(path, content digest), a terms table whose rows are zlib-compressed
+postings lists (delta-encoded doc ids, then term counts) and one array of
+token counts indexed by doc id. After a scan only files whose digest changed
+are tokenized again; the old doc ids of changed or deleted files get a zero
+token count and stay in postings as tombstones until enough of them pile up.
+A query reads that array and the postings of its few terms, then resolves
+paths only for the best matches, so it never walks the docs table.
+"""
+import hashlib
+import math
+import os
+import re
+import heapq
+import sqlite3
+import zlib
+from array import array
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import accumulate
+from operator import itemgetter, sub
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .models.schemas import FileInfo
+from .config import cache_dir
+from .metrics import incr, span
+
+INDEX_VERSION = "1"
+DEFAULT_TOP_K = 20
+DEFAULT_MAX_CHARS = 400_000
+
+PATH_BOOST = 3  # вхождение токена пути весит как три вхождения в тексте
+MIN_TOKEN = 2
+MAX_TOKEN = 64
+BM25_K1 = 1.2
+BM25_B = 0.75
+COMPACT_RATIO = 0.25  # доля мёртвых документов, после которой postings переписываются
+SEARCH_CANDIDATES = 1000  # сколько лучших совпадений получают путь из docs
+
+_IDENTIFIER_RE = re.compile(r'[A-Za-z_]\w*')  # ASCII-начало вдвое быстрее, чем [^\W\d]
+_WORD_PART_RE = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value NOT NULL);
+CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, digest BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, postings BLOB NOT NULL) WITHOUT ROWID;
+"""
+
+
+class SearchQuery(NamedTuple):
+    text: str
+    top_k: int = DEFAULT_TOP_K
+    max_chars: Optional[int] = DEFAULT_MAX_CHARS
+    source: Optional[str] = None  # ключ индекса; по умолчанию — абсолютный путь репозитория
+
+
+def index_path(source: str) -> Path:
+    """
+    One index file per source: readable repo name plus a hash of the full
+    source. Not per commit: a checkout of another commit updates the same
+    index incrementally, and the last indexed commit is kept in meta.
+    """
+    name = re.sub(r'[^\w.-]+', '_', re.split(r'[:/\\]', source.rstrip('/\\'))[-1]) or "repo"
+    digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+    return cache_dir() / "index" / f"{name}-{digest}.sqlite"
+
+
+@lru_cache(maxsize=1 << 16)
+def identifier_tokens(identifier: str) -> Tuple[str, ...]:
+    """`refreshToken` → (refreshtoken, refresh, token); snake_case is split the same way."""
+    whole = identifier.lower()
+    if len(whole) > MAX_TOKEN:
+        return ()
+    tokens = [whole] if len(whole) >= MIN_TOKEN else []
+    parts = _WORD_PART_RE.findall(identifier)
+    if len(parts) > 1:
+        for part in parts:
+            part = part.lower()
+            if len(part) >= MIN_TOKEN and part != whole:
+                tokens.append(part)
+    return tuple(tokens)
+
+
+def term_frequencies(text: Optional[str], path: str) -> Dict[str, int]:
+    tf: Dict[str, int] = {}
+    get = tf.get
+    if text:
+        # Идентификаторы повторяются — разбиваем каждый уникальный один раз
+        for identifier, count in Counter(_IDENTIFIER_RE.findall(text)).items():
+            for token in identifier_tokens(identifier):
+                tf[token] = get(token, 0) + count
+    for identifier in _IDENTIFIER_RE.findall(path):
+        for token in identifier_tokens(identifier):
+            tf[token] = get(token, 0) + PATH_BOOST
+    return tf
+
+
+def query_terms(text: str) -> List[str]:
+    terms = []
+    for identifier in _IDENTIFIER_RE.findall(text):
+        terms.extend(identifier_tokens(identifier))
+    return list(dict.fromkeys(terms))
+
+
+def _encode(doc_ids: List[int], tfs: List[int]) -> bytes:
+    values = array('I', doc_ids[:1])
+    values.extend(map(sub, doc_ids[1:], doc_ids))
+    values.extend(tfs)
+    return zlib.compress(values.tobytes(), 1)
+
+
+def _decode(blob: bytes) -> Tuple[List[int], array]:
+    values = array('I')
+    values.frombytes(zlib.decompress(blob))
+    half = len(values) // 2
+    return list(accumulate(values[:half])), values[half:]
+
+
+def _file_digest(file_info: FileInfo) -> bytes:
+    if file_info.content is not None:
+        data = file_info.content.encode("utf-8", "surrogatepass")
+    elif file_info.source_path:
+        # Большой файл читается только если изменились размер или mtime
+        stat = os.stat(file_info.source_path)
+        data = f"stat:{stat.st_size}:{stat.st_mtime_ns}".encode()
+    else:
+        data = b""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _document_text(file_info: FileInfo) -> Optional[str]:
+    if file_info.content is not None:
+        return file_info.content
+    if file_info.source_path:
+        try:
+            with open(file_info.source_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+    return None
+
+
+class SearchIndex:
+    """BM25 index of one repository, kept in a SQLite file between runs."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        # isolation_level=None: транзакции открываются явно в update()
+        self._db = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        if self._meta("version") != INDEX_VERSION:
+            self._db.executescript("DELETE FROM docs; DELETE FROM terms; DELETE FROM meta;")
+            self._set_meta("version", INDEX_VERSION)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "SearchIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value) -> None:
+        if not isinstance(value, bytes):
+            value = str(value)
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _lengths(self) -> array:
+        """Число токенов документа по его id; 0 — документ удалён."""
+        lengths = array('I')
+        blob = self._meta("lengths")
+        if blob:
+            lengths.frombytes(blob)
+        return lengths
+
+    @property
+    def commit(self) -> Optional[str]:
+        return self._meta("commit")
+
+    def update(self, file_infos: Iterable[FileInfo], commit: Optional[str] = None) -> Tuple[int, int]:
+        """
+        Brings the index in line with a scan: tokenizes new and changed files,
+        forgets files that are gone. Returns (indexed, removed).
+        """
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            known = {path: (doc_id, digest) for doc_id, path, digest in db.execute("SELECT id, path, digest FROM docs")}
+            # id не переиспользуются: в postings могут остаться ссылки на удалённые документы
+            next_id = int(self._meta("next_id", "1"))
+            lengths = self._lengths()
+            seen: Set[str] = set()
+            dead: List[int] = []
+            added = []
+            postings: Dict[str, Tuple[List[int], List[int]]] = defaultdict(lambda: ([], []))
+
+            for file_info in file_infos:
+                path = file_info.path
+                if path in seen:
+                    continue
+                seen.add(path)
+                digest = _file_digest(file_info)
+                old = known.get(path)
+                if old is not None:
+                    if old[1] == digest:
+                        continue
+                    dead.append(old[0])
+
+                tf = term_frequencies(_document_text(file_info), path)
+                doc_id = next_id
+                next_id += 1
+                added.append((doc_id, path, digest))
+                lengths.extend([0] * (doc_id + 1 - len(lengths)))
+                lengths[doc_id] = sum(tf.values())
+                for term, count in tf.items():
+                    doc_ids, counts = postings[term]
+                    doc_ids.append(doc_id)
+                    counts.append(count)
+
+            removed = [doc_id for path, (doc_id, _) in known.items() if path not in seen]
+            dead.extend(removed)
+            for doc_id in dead:
+                lengths[doc_id] = 0
+            db.executemany("DELETE FROM docs WHERE id = ?", ((doc_id,) for doc_id in dead))
+            db.executemany("INSERT INTO docs (id, path, digest) VALUES (?, ?, ?)", added)
+            self._merge_postings(postings, fresh=not known)
+
+            self._set_meta("next_id", next_id)
+            self._set_meta("lengths", lengths.tobytes())
+            dead_docs = int(self._meta("dead_docs", "0")) + len(dead)
+            live_docs = len(known) - len(dead) + len(added)
+            if dead_docs > max(live_docs, 1) * COMPACT_RATIO:
+                self._compact(lengths)
+                dead_docs = 0
+            self._set_meta("dead_docs", dead_docs)
+            if commit:
+                self._set_meta("commit", commit)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+        incr("files_indexed", len(added))
+        return len(added), len(removed)
+
+    def _merge_postings(self, postings: Dict[str, Tuple[List[int], List[int]]], fresh: bool) -> None:
+        db = self._db
+        if fresh:
+            # Живых документов нет — прежние postings целиком состоят из мёртвых id
+            db.executemany(
+                "INSERT OR REPLACE INTO terms (term, postings) VALUES (?, ?)",
+                ((term, _encode(doc_ids, tfs)) for term, (doc_ids, tfs) in postings.items())
+            )
+            return
+        rows = []
+        for term, (doc_ids, tfs) in postings.items():
+            row = db.execute("SELECT postings FROM terms WHERE term = ?", (term,)).fetchone()
+            if row is not None:
+                # Новые id больше всех существующих — просто дописываем в конец
+                old_ids, old_tfs = _decode(row[0])
+                doc_ids = old_ids + doc_ids
+                tfs = old_tfs.tolist() + tfs
+            rows.append((term, _encode(doc_ids, tfs)))
+        db.executemany("INSERT OR REPLACE INTO terms (term, postings) VALUES (?, ?)", rows)
+
+    def _compact(self, lengths: array) -> None:
+        """Переписывает postings без мёртвых документов."""
+        db = self._db
+        rows, empty = [], []
+        for term, blob in db.execute("SELECT term, postings FROM terms").fetchall():
+            doc_ids, tfs = _decode(blob)
+            kept = [(doc_id, tf) for doc_id, tf in zip(doc_ids, tfs) if lengths[doc_id]]
+            if not kept:
+                empty.append((term,))
+            elif len(kept) < len(doc_ids):
+                rows.append((term, _encode([doc_id for doc_id, _ in kept], [tf for _, tf in kept])))
+        db.executemany("DELETE FROM terms WHERE term = ?", empty)
+        db.executemany("UPDATE terms SET postings = ? WHERE term = ?", ((blob, term) for term, blob in rows))
+        incr("index_compactions")
+
+    def search(self, query: str, limit: Optional[int] = SEARCH_CANDIDATES) -> Dict[str, float]:
+        """BM25 scores of the `limit` best-matching files (all matches if None), best first."""
+        terms = query_terms(query)
+        lengths = self._lengths()
+        total = len(lengths) - lengths.count(0)
+        if not terms or not total:
+            return {}
+        avg_length = sum(lengths) / total
+
+        db = self._db
+        scores: Dict[int, float] = defaultdict(float)
+        for term in terms:
+            row = db.execute("SELECT postings FROM terms WHERE term = ?", (term,)).fetchone()
+            if row is None:
+                continue
+            doc_ids, tfs = _decode(row[0])
+            matches = [(doc_id, tf) for doc_id, tf in zip(doc_ids, tfs) if lengths[doc_id]]
+            df = len(matches)
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            # BM25: k1 * (1 - b + b * |d| / avgdl) в знаменателе
+            base = BM25_K1 * (1 - BM25_B)
+            scale = BM25_K1 * BM25_B / avg_length
+            gain = idf * (BM25_K1 + 1)
+            for doc_id, tf in matches:
+                scores[doc_id] += gain * tf / (tf + base + scale * lengths[doc_id])
+
+        if limit is None:
+            best = sorted(scores.items(), key=itemgetter(1), reverse=True)
+        else:
+            best = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+        paths = {}
+        for start in range(0, len(best), 500):
+            chunk = [doc_id for doc_id, _ in best[start:start + 500]]
+            placeholders = ",".join("?" * len(chunk))
+            paths.update(db.execute(f"SELECT id, path FROM docs WHERE id IN ({placeholders})", chunk))
+        return {paths[doc_id]: score for doc_id, score in best}
+
+
+def select_files(
+        files: List[FileInfo],
+        scores: Dict[str, float],
+        top_k: int,
+        max_chars: Optional[int]
+) -> List[FileInfo]:
+    """Best-scoring files first, at most top_k of them and at most max_chars in total."""
+    ranked = sorted((f for f in files if f.path in scores), key=lambda f: (-scores[f.path], f.path))
+    selected = []
+    total = 0
+    for file_info in ranked:
+        if len(selected) >= top_k:
+            break
+        if max_chars is not None and total + file_info.size > max_chars:
+            continue  # не помещается — пробуем следующие, они могут быть меньше
+        selected.append(file_info)
+        total += file_info.size
+    return selected
+
+
+def relevance_order(
+        repo_path: Path,
+        file_infos: List[FileInfo],
+        query: SearchQuery,
+        commit: Optional[str] = None
+) -> Callable[[List[FileInfo]], List[FileInfo]]:
+    """
+    Updates the repository's index from scanned files, runs the query and
+    returns an order_files function for build_analysis that keeps only the
+    selected files, most relevant first.
+    """
+    source = query.source or str(repo_path.resolve())
+    with SearchIndex(index_path(source)) as index:
+        with span("index"):
+            index.update(file_infos, commit)
+        with span("search"):
+            scores = index.search(query.text)
+    incr("files_matched", len(scores))
+
+    def order_files(files: List[FileInfo]) -> List[FileInfo]:
+        return select_files(files, scores, query.top_k, query.max_chars)
+
+    return order_files
@@ -0,0 +1,290 @@
+﻿# git1file/tree.py
+"""
+Repository map: the directory tree with per-directory file counts, sizes and
+languages, built from metadata only — file contents are never opened.
+
+For a git work tree the paths and sizes come from the index (one read of
+.git/index, no stat per file); otherwise, or when the index cannot be read,
+from a directory walk that prunes ignored directories.
+"""
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .config import CompiledConfig
+from .classifier import classify_name
+from .file_processor import load_gitignore_patterns
+from .git_service import find_git_dir
+from .ignore import IgnoreMatcher
+from .metrics import incr, span
+
+TREE_LANGUAGES = 3  # языков в строке каталога
+
+_INDEX_HEADER = struct.Struct(">4sLL")
+_EXTENSION_HEADER = struct.Struct(">4sL")
+_INDEX_STAT_SIZE = 40  # ctime, mtime (секунды и наносекунды), dev, ino, mode, uid, gid, size
+_EXTENDED = 0x4000
+_SKIP_WORKTREE = 0x4000
+_REGULAR_OR_SYMLINK = (0o100644, 0o100755, 0o120000)
+
+
+class DirectoryNode:
+    """Один каталог дерева; files/size/languages — суммы по всему поддереву."""
+
+    __slots__ = ("name", "dirs", "entries", "files", "size", "languages")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.dirs: Dict[str, "DirectoryNode"] = {}
+        self.entries: List[Tuple[str, int]] = []  # собственные файлы: (имя, размер)
+        self.files = 0
+        self.size = 0
+        self.languages: Dict[str, int] = {}  # язык -> файлов
+
+
+def format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    for unit in ("KB", "MB", "GB"):
+        size /= 1024
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}"
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    """Смещение имени в index v4: base-128 с прибавлением 1 на каждый продолженный байт."""
+    byte = data[pos]
+    pos += 1
+    value = byte & 0x7F
+    while byte & 0x80:
+        byte = data[pos]
+        pos += 1
+        value = ((value + 1) << 7) | (byte & 0x7F)
+    return value, pos
+
+
+def parse_index(data: bytes, hash_size: int = 20) -> Iterator[Tuple[str, int]]:
+    """
+    Paths and sizes of stage-0 regular files in a git index (versions 2-4).
+    Sizes are the stat data git recorded at the last refresh. A split index
+    (core.splitIndex) holds only changes against a shared index: ValueError
+    is raised after its entries, so callers must consume the whole iterator.
+    """
+    signature, version, count = _INDEX_HEADER.unpack_from(data, 0)
+    if signature != b"DIRC" or version not in (2, 3, 4):
+        raise ValueError(f"Unsupported git index (version {version})")
+    # Из записи нужны только mode, size и flags
+    unpack_entry = struct.Struct(f">24xL8xL{hash_size}xH").unpack_from
+    fixed_size = _INDEX_STAT_SIZE + hash_size + 2
+    find = data.index
+    pos = _INDEX_HEADER.size
+    previous = b""
+    for _ in range(count):
+        start = pos
+        mode, size, flags = unpack_entry(data, pos)
+        pos += fixed_size
+        extended_flags = 0
+        if flags & _EXTENDED:
+            extended_flags = int.from_bytes(data[pos:pos + 2], "big")
+            pos += 2
+        if version == 4:
+            strip, pos = _read_varint(data, pos)
+            end = find(b"\0", pos)
+            name = previous[:len(previous) - strip] + data[pos:end]
+            pos = end + 1
+            previous = name
+        else:
+            end = find(b"\0", pos)
+            name = data[pos:end]
+            pos = start + ((end - start) // 8 + 1) * 8  # запись дополнена NUL до кратного 8
+
+        if flags & 0x3000 or extended_flags & _SKIP_WORKTREE or mode not in _REGULAR_OR_SYMLINK:
+            continue  # конфликт слияния, sparse checkout, submodule или каталог sparse index
+        yield name.decode("utf-8", "surrogateescape"), size
+
+    # Расширения: подпись и длина, в конце файла — хеш всего индекса
+    end = len(data) - hash_size
+    while pos + _EXTENSION_HEADER.size <= end:
+        signature, length = _EXTENSION_HEADER.unpack_from(data, pos)
+        if signature == b"link":
+            raise ValueError("Split git index: entries are in the shared index")
+        pos += _EXTENSION_HEADER.size + length
+
+
+def _work_tree_root(repo_path: Path) -> Optional[Path]:
+    for parent in [repo_path] + list(repo_path.parents):
+        if (parent / ".git").exists():
+            return parent
+    return None
+
+
+def iter_index_entries(repo_path: Path) -> Optional[List[Tuple[str, int]]]:
+    """Tracked files under repo_path from the git index; None if there is no readable index."""
+    root = _work_tree_root(repo_path)
+    git_dir = find_git_dir(repo_path) if root is not None else None
+    if git_dir is None:
+        return None
+    try:
+        data = (git_dir / "index").read_bytes()
+    except OSError:
+        return None
+    hash_size = 32 if "objectformat = sha256" in _read_text(git_dir / "config") else 20
+    try:
+        entries = list(parse_index(data, hash_size))
+    except (ValueError, IndexError, struct.error):
+        return None  # split index, неизвестная версия или битый файл — обход файловой системы
+
+    prefix = repo_path.relative_to(root).as_posix()
+    if prefix == ".":
+        return entries
+    prefix += "/"
+    return [(path[len(prefix):], size) for path, size in entries if path.startswith(prefix)]
+
+
+def _read_text(path: Path) -> str:
+    try:
+        return path.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return ""
+
+
+def iter_stat_entries(repo_path: Path, matcher: IgnoreMatcher) -> Iterator[Tuple[str, int]]:
+    """Directory walk with os.scandir; ignored directories are not entered at all."""
+    stack = [(str(repo_path), "")]
+    while stack:
+        directory, prefix = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name == ".git":
+                continue  # каталог или файл-ссылка worktree: в карте репозитория не нужен
+            relative = prefix + entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not matcher.matches_dir(relative):
+                        stack.append((entry.path, relative + "/"))
+                elif entry.is_file():
+                    yield relative, entry.stat().st_size
+            except OSError:
+                continue
+
+
+def build_tree(repo_path: Path, compiled: CompiledConfig, use_index: bool = True) -> DirectoryNode:
+    """Tree of non-ignored files under repo_path, aggregated per directory."""
+    gitignore_patterns = load_gitignore_patterns(repo_path) if compiled.use_gitignore else None
+    matcher = compiled.ignore_matcher(gitignore_patterns)
+
+    with span("scan"):
+        entries = iter_index_entries(repo_path) if use_index else None
+        if entries is None:
+            entries = iter_stat_entries(repo_path, matcher)
+        else:
+            incr("tree_from_index")
+
+        root = DirectoryNode(repo_path.name)
+        nodes: Dict[str, Optional[DirectoryNode]] = {"": root}  # None — каталог игнорируется целиком
+        matches_name = matcher.matches_name
+        visited = ignored = 0
+        for path, size in entries:
+            visited += 1
+            directory, _, name = path.rpartition("/")
+            # Шаблоны каталогов проверяются один раз на каталог, а не на каждый файл
+            try:
+                node = nodes[directory]
+            except KeyError:
+                node = nodes[directory] = (None if matcher.matches_dir(directory)
+                                           else _make_node(nodes, directory))
+            if node is None or matches_name(name, path):
+                ignored += 1
+                continue
+            node.entries.append((name, size))
+            node.files += 1
+            node.size += size
+            language = classify_name(name).language
+            if language:
+                languages = node.languages
+                languages[language] = languages.get(language, 0) + 1
+        incr("files_visited", visited)
+        incr("files_ignored", ignored)
+
+    # Суммы по поддеревьям: от самых глубоких каталогов к корню, по разу на каталог
+    for directory in sorted(nodes, key=lambda d: d.count("/"), reverse=True):
+        node = nodes[directory]
+        if not directory or node is None:
+            continue
+        parent = nodes[directory.rpartition("/")[0]]
+        parent.files += node.files
+        parent.size += node.size
+        for language, files in node.languages.items():
+            parent.languages[language] = parent.languages.get(language, 0) + files
+    _prune_empty(root)
+    return root
+
+
+def _make_node(nodes: Dict[str, Optional[DirectoryNode]], directory: str) -> DirectoryNode:
+    parent_path, _, name = directory.rpartition("/")
+    parent = nodes.get(parent_path)
+    if parent is None:
+        parent = _make_node(nodes, parent_path)
+    node = parent.dirs[name] = nodes[directory] = DirectoryNode(name)
+    return node
+
+
+def _prune_empty(node: DirectoryNode) -> None:
+    """Каталоги, все файлы которых отфильтрованы по имени, в дерево не попадают."""
+    for name in [name for name, child in node.dirs.items() if not child.files]:
+        del node.dirs[name]
+    for child in node.dirs.values():
+        _prune_empty(child)
+
+
+def most_common_languages(node: DirectoryNode) -> List[Tuple[str, int]]:
+    """(язык, файлов) по убыванию; при равенстве — по имени, чтобы вывод не зависел от обхода."""
+    return sorted(node.languages.items(), key=lambda item: (-item[1], item[0]))
+
+
+def _directory_line(node: DirectoryNode) -> str:
+    summary = f"{node.files} files, {format_size(node.size)}"
+    languages = most_common_languages(node)[:TREE_LANGUAGES]
+    if languages:
+        summary += "; " + ", ".join(f"{language} {files}" for language, files in languages)
+    return f"{node.name}/ ({summary})"
+
+
+def format_tree(root: DirectoryNode, max_depth: int = 0) -> str:
+    """
+    Indented tree, directories first. max_depth > 0 shows only that many
+    levels below the root; deeper directories keep just their summary line.
+    """
+    lines = [_directory_line(root)]
+
+    def walk(node: DirectoryNode, depth: int) -> None:
+        indent = "  " * depth
+        for name in sorted(node.dirs):
+            child = node.dirs[name]
+            lines.append(indent + _directory_line(child))
+            if not max_depth or depth < max_depth:
+                walk(child, depth + 1)
+        for name, size in sorted(node.entries):
+            lines.append(f"{indent}{name} ({format_size(size)})")
+
+    with span("format"):
+        walk(root, 1)
+    return "\n".join(lines) + "\n"
+
+
+def tree_to_dict(node: DirectoryNode, max_depth: int = 0, depth: int = 0) -> dict:
+    """Вложенный dict для JSON-ответа API: те же данные, что и в format_tree."""
+    data = {
+        "name": node.name,
+        "files": node.files,
+        "size": node.size,
+        "languages": dict(most_common_languages(node)),
+    }
+    if not max_depth or depth < max_depth:
+        data["dirs"] = [tree_to_dict(node.dirs[name], max_depth, depth + 1) for name in sorted(node.dirs)]
+        data["entries"] = [{"name": name, "size": size} for name, size in sorted(node.entries)]
+    return data
@@ -0,0 +1,397 @@
+﻿# git1file/watcher.py
+"""
+Watch mode: keep a single-file dump up to date while the repository changes.
+
+One full scan fills an in-memory map of per-file results; afterwards only the
+changed paths are re-read, re-minified and re-ranked. Changes come from
+inotify (Linux, through ctypes) or, where that is unavailable, from polling
+mtimes. A burst of saves is debounced into a single rebuild.
+"""
+import ctypes
+import ctypes.util
+import errno
+import glob
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path, PurePosixPath
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .models.schemas import ConfigSchema, FileInfo, FileOrder, MinifyMode, RepositoryAnalysis
+from .config import CompiledConfig
+from .ignore import IgnoreMatcher
+from .file_processor import (
+    ScanBudget,
+    ScanLimitExceeded,
+    iter_admitted_paths,
+    iter_repository_paths,
+    load_gitignore_patterns,
+    process_file,
+    split_markdown,
+)
+from .analyzer import build_analysis
+from .ranker import IncrementalRanker
+from .metrics import incr, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE = 0.2
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Изменение этих файлов в корне меняет правила сканирования — нужен полный пересчёт
+RESCAN_FILES = {".git1file.yaml", ".gitignore"}
+
+# Имя-заглушка для проверки, игнорируется ли каталог целиком
+_DIR_PROBE = ".git1file-dir-probe"
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class RepositorySnapshot:
+    """Per-file scan results of one repository, updated path by path."""
+
+    def __init__(self, repo_path: Path, config: ConfigSchema, exclude: Iterable[Path] = ()):
+        self.repo_path = repo_path
+        self.config = config
+        # Вывод watch обычно лежит в самом репозитории — его изменения не должны запускать пересборку
+        for path in exclude:
+            try:
+                relative = Path(path).resolve().relative_to(repo_path.resolve())
+            except ValueError:
+                continue
+            config.ignore.patterns.append(glob.escape(relative.as_posix()))
+
+        self.compiled = CompiledConfig(config)
+        self.files: Dict[str, FileInfo] = {}
+        self.budget = ScanBudget(self.compiled, track_omitted=True)
+        self._ranker = IncrementalRanker() if config.output.order == FileOrder.RANK else None
+        self._ignore: IgnoreMatcher = self.compiled.ignore
+
+    def is_ignored(self, relative_path: Path) -> bool:
+        return self._ignore.matches(relative_path)
+
+    def is_ignored_dir(self, directory: Path) -> bool:
+        if directory.name == ".git":
+            return True
+        try:
+            relative = directory.relative_to(self.repo_path)
+        except ValueError:
+            return False
+        return relative != Path(".") and self.is_ignored(relative / _DIR_PROBE)
+
+    def scan(self) -> None:
+        """Full scan; limits behave exactly as in analyze_repository."""
+        self.files = {}
+        self.budget = ScanBudget(self.compiled, track_omitted=True)
+        if self._ranker is not None:
+            self._ranker = IncrementalRanker()
+        if self.compiled.use_gitignore:
+            self._ignore = self.compiled.ignore_matcher(load_gitignore_patterns(self.repo_path))
+        with span("scan"):
+            for path, relative_path, size in iter_admitted_paths(self.repo_path, self.compiled, self.budget):
+                self.files[relative_path.as_posix()] = self._read(path, relative_path, size)
+
+    def _read(self, path: Path, relative_path: Path, size: int) -> FileInfo:
+        file_info = process_file(path, relative_path, self.compiled, size)
+        if self.config.output.minify != MinifyMode.NONE:
+            from .minifier import minify_files
+            file_info = minify_files([file_info], self.config.output.minify)[0]
+        return file_info
+
+    def _forget(self, key: str) -> bool:
+        old = self.files.pop(key, None)
+        if old is None:
+            return False
+        self.budget.release(PurePosixPath(key), old.size)
+        return True
+
+    def update(self, changed: Iterable[Path]) -> List[str]:
+        """
+        Re-reads changed absolute paths (files or directories) and returns the
+        relative paths whose entry was added, replaced or removed.
+        """
+        touched: List[str] = []
+        try:
+            self._apply(list(changed), touched)
+        finally:
+            # Даже если бюджет прервал обновление, кэш зависимостей не должен устареть
+            if touched and self._ranker is not None:
+                self._ranker.invalidate(touched)
+        incr("files_updated", len(touched))
+        return touched
+
+    def _apply(self, pending: List[Path], touched: List[str]) -> None:
+        while pending:
+            path = pending.pop()
+            try:
+                relative_path = path.relative_to(self.repo_path)
+            except ValueError:
+                continue
+            key = relative_path.as_posix()
+
+            if path.is_dir():
+                if not self.is_ignored_dir(path):
+                    try:
+                        pending.extend(path.iterdir())
+                    except OSError:
+                        pass
+                continue
+            if self.is_ignored(relative_path):
+                continue
+
+            if not path.is_file():
+                # Удалён файл или перемещён каталог — убираем всё, что было под ним
+                prefix = key + "/"
+                for nested in [k for k in self.files if k.startswith(prefix)]:
+                    self._forget(nested)
+                    touched.append(nested)
+                for nested in [k for k in self.budget.omitted_paths if k.startswith(prefix)]:
+                    self.budget.release_omitted(nested)
+                self.budget.release_omitted(key)
+                if self._forget(key):
+                    touched.append(key)
+                continue
+
+            # Старый размер освобождается только на время проверки нового
+            old = self.files.get(key)
+            self._forget(key)
+            self.budget.release_omitted(key)
+            try:
+                size = path.stat().st_size
+                admitted = self.budget.admit(relative_path, size)
+            except OSError:
+                touched.append(key)  # файл исчез между событием и чтением
+                continue
+            except ScanLimitExceeded:
+                if old is not None:
+                    self.budget.admit(relative_path, old.size)
+                    self.files[key] = old
+                raise
+            if admitted:
+                try:
+                    self.files[key] = self._read(path, relative_path, size)
+                except OSError:
+                    self.budget.release(relative_path, size)
+            touched.append(key)
+
+    def analysis(self) -> RepositoryAnalysis:
+        file_infos, markdown_files = split_markdown(self.files.values())
+        return build_analysis(
+            self.repo_path, self.config, file_infos, markdown_files, self.budget,
+            minified=True, order_files=self._ranker
+        )
+
+
+class InotifyWatcher:
+    """Recursive inotify watch over the repository's non-ignored directories."""
+
+    def __init__(self, root: Path, skip_dir: Callable[[Path], bool]):
+        library = ctypes.util.find_library("c")
+        self._libc = ctypes.CDLL(library or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1: {os.strerror(error)}")
+        self._skip_dir = skip_dir
+        self._dirs: Dict[int, Path] = {}
+        try:
+            self.add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def add_tree(self, directory: Path) -> None:
+        for current, dirnames, _ in os.walk(directory):
+            current_path = Path(current)
+            dirnames[:] = [name for name in dirnames if not self._skip_dir(current_path / name)]
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(current_path), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOENT:  # каталог успел исчезнуть
+                    continue
+                # ENOSPC — исчерпан fs.inotify.max_user_watches
+                raise OSError(error, f"inotify_add_watch({current_path}): {os.strerror(error)}")
+            self._dirs[wd] = current_path
+
+    def _read(self, timeout: Optional[float]) -> Tuple[Set[Path], bool]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set(), False
+        data = os.read(self._fd, 64 * 1024)
+        changed: Set[Path] = set()
+        overflow = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            path = directory / os.fsdecode(name) if name else directory
+            if mask & IN_ISDIR:
+                if self._skip_dir(path):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(path)
+            changed.add(path)
+        return changed, overflow
+
+    def wait(self, debounce: float) -> Optional[Set[Path]]:
+        """
+        Blocks until something changes, then until `debounce` seconds pass
+        without new events. None means events were lost: rescan everything.
+        """
+        changed: Set[Path] = set()
+        overflow = False
+        timeout = None
+        while True:
+            batch, lost = self._read(timeout)
+            overflow = overflow or lost
+            if not batch and not lost and timeout is not None:
+                break
+            changed |= batch
+            if changed or overflow:
+                timeout = debounce
+        return None if overflow else changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Fallback for platforms without inotify: compares mtime and size every interval."""
+
+    def __init__(self, list_files: Callable[[], Iterable[Path]], interval: float = DEFAULT_POLL_INTERVAL):
+        self._list_files = list_files
+        self._interval = interval
+        self._state = self._stat_all()
+
+    def _stat_all(self) -> Dict[Path, Tuple[int, int]]:
+        state = {}
+        for path in self._list_files():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            state[path] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def _diff(self) -> Set[Path]:
+        current = self._stat_all()
+        changed = {path for path in current.keys() | self._state.keys()
+                   if current.get(path) != self._state.get(path)}
+        self._state = current
+        return changed
+
+    def wait(self, debounce: float) -> Optional[Set[Path]]:
+        while True:
+            time.sleep(self._interval)
+            changed = self._diff()
+            if changed:
+                break
+        while True:
+            time.sleep(debounce)
+            more = self._diff()
+            if not more:
+                return changed
+            changed |= more
+
+    def close(self) -> None:
+        pass
+
+
+def open_watcher(snapshot: RepositorySnapshot, use_inotify: bool = True,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL):
+    """inotify where available, polling otherwise (other OS, watch limit reached)."""
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(snapshot.repo_path, snapshot.is_ignored_dir)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable ({e}), falling back to polling")
+
+    repo_path = snapshot.repo_path
+
+    def list_files() -> Iterable[Path]:
+        for name in RESCAN_FILES:
+            yield repo_path / name
+        for path, _ in iter_repository_paths(repo_path, snapshot.compiled):
+            yield path
+
+    return PollingWatcher(list_files, poll_interval)
+
+
+def watch_repository(
+        repo_path: Path,
+        config_factory: Callable[[], ConfigSchema],
+        on_update: Callable[[RepositoryAnalysis, Optional[List[str]], float], None],
+        exclude: Iterable[Path] = (),
+        debounce: float = DEFAULT_DEBOUNCE,
+        use_inotify: bool = True,
+        poll_interval: float = DEFAULT_POLL_INTERVAL
+) -> None:
+    """
+    Scans once, then calls on_update(analysis, changed_paths, started) after
+    every debounced batch of changes until interrupted. changed_paths is None
+    after a full rescan; started is the perf_counter() value when the batch was
+    picked up. Config comes from config_factory so .git1file.yaml edits apply.
+    """
+    repo_path = repo_path.resolve()
+    exclude = list(exclude)
+    snapshot = RepositorySnapshot(repo_path, config_factory(), exclude)
+    started = time.perf_counter()
+    snapshot.scan()
+    on_update(snapshot.analysis(), None, started)
+
+    watcher = open_watcher(snapshot, use_inotify, poll_interval)
+    try:
+        while True:
+            changed = watcher.wait(debounce)
+            started = time.perf_counter()
+            rescan = changed is None or any(
+                path.parent == repo_path and path.name in RESCAN_FILES for path in changed
+            )
+            try:
+                if rescan:
+                    # Новый снимок подменяет старый только после успешного скана
+                    fresh = RepositorySnapshot(repo_path, config_factory(), exclude)
+                    fresh.scan()
+                    snapshot = fresh
+                    # Правила игнорирования могли измениться — наблюдатель обходит каталоги заново
+                    fresh_watcher = open_watcher(snapshot, use_inotify, poll_interval)
+                    watcher.close()
+                    watcher = fresh_watcher
+                    touched = None
+                else:
+                    touched = snapshot.update(changed)
+                    if not touched:
+                        continue
+                on_update(snapshot.analysis(), touched, started)
+            except Exception as e:
+                # Ошибка одной пересборки (лимиты, битый конфиг) не должна останавливать watch
+                logger.error(f"Update failed, keeping previous output: {e}")
+    finally:
+        watcher.close()
@@ -0,0 +1,80 @@
+﻿# tests/test_archive.py
+import http.server
+import io
+import subprocess
+import threading
+from pathlib import Path
+
+import pytest
+
+from git1file.archive import ArchiveReader, analyze_archive, default_strip_components
+from git1file.config import CompiledConfig
+from git1file.file_processor import ScanBudget
+from git1file.models.schemas import ConfigSchema
+
+
+def git(repo: Path, *args: str) -> bytes:
+    return subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True).stdout
+
+
+@pytest.fixture
+def repo(tmp_path: Path) -> Path:
+    repo = tmp_path / "repo"
+    (repo / "pkg").mkdir(parents=True)
+    (repo / "cli.py").write_text("import pkg\n")
+    (repo / "README.md").write_text("# repo\n")
+    (repo / ".gitignore").write_text("*.log\n")
+    (repo / "pkg" / "__init__.py").write_text("VALUE = 1\n")
+    git(repo, "init", "-q")
+    git(repo, "add", ".")
+    git(repo, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", "init")
+    return repo
+
+
+def read_paths(data: bytes, strip_components: int) -> list:
+    compiled = CompiledConfig(ConfigSchema())
+    reader = ArchiveReader(io.BytesIO(data), compiled, ScanBudget(compiled), strip_components)
+    return sorted(file_info.path for file_info in reader)
+
+
+def test_default_strip_components():
+    assert default_strip_components("https://github.com/o/r/archive/refs/heads/main.tar.gz") == 1
+    assert default_strip_components("https://codeload.github.com/o/r/tar.gz/main") == 1
+    assert default_strip_components("https://gitlab.com/o/r/-/archive/main/r-main.tar.gz") == 1
+    assert default_strip_components("http://localhost:8000/repo.tar") == 0
+
+
+def test_plain_git_archive_keeps_root_files(repo: Path):
+    data = git(repo, "archive", "--format=tar", "HEAD")
+    assert read_paths(data, 0) == [".gitignore", "README.md", "cli.py", "pkg/__init__.py"]
+
+
+def test_prefixed_git_archive_is_stripped(repo: Path):
+    data = git(repo, "archive", "--format=tar", "--prefix=repo-main/", "HEAD")
+    assert read_paths(data, 1) == [".gitignore", "README.md", "cli.py", "pkg/__init__.py"]
+
+
+def test_analyze_archive_over_http(repo: Path, tmp_path: Path):
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "repo.tar.gz").write_bytes(git(repo, "archive", "--format=tar.gz", "HEAD"))
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=str(served), **kwargs)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/repo.tar.gz"
+        analysis = analyze_archive(url, ConfigSchema())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    paths = sorted(f.path for f in analysis.files + analysis.markdown_files)
+    assert paths == [".gitignore", "README.md", "cli.py", "pkg/__init__.py"]
+    assert analysis.metadata.is_git_repo
+    assert analysis.metadata.git_commit == git(repo, "rev-parse", "HEAD").decode()[:8]
@@ -0,0 +1,46 @@
+﻿# tests/test_excerpt.py
+from pathlib import Path
+
+from git1file.file_processor import excerpt_marker, read_excerpt
+
+
+def excerpt(tmp_path: Path, data: bytes, head: int, tail: int, max_lines: int = 0):
+    path = tmp_path / "big.txt"
+    path.write_bytes(data)
+    return read_excerpt(path, len(data), head, tail, max_lines)
+
+
+def test_tail_starting_on_line_boundary_keeps_first_line(tmp_path: Path):
+    content, omitted = excerpt(tmp_path, b"a\n" * 100, 10, 6)
+    assert content == "a\n" * 5 + excerpt_marker(184) + "\n" + "a\n" * 3
+    assert omitted == 184
+
+
+def test_tail_inside_line_drops_partial_line(tmp_path: Path):
+    content, omitted = excerpt(tmp_path, b"ab\n" * 100, 10, 7)
+    assert content == "ab\n" * 3 + excerpt_marker(285) + "\n" + "ab\n" * 2
+    assert omitted == 285
+
+
+def test_head_and_tail_meet(tmp_path: Path):
+    data = b"line one\nline two\nline three\n"
+    content, omitted = excerpt(tmp_path, data, 12, 40)
+    assert (content, omitted) == (data.decode(), 0)
+
+
+def test_single_long_line_is_cut_at_utf8_boundary(tmp_path: Path):
+    data = "é".encode() * 100  # двухбайтовые символы, без переводов строк
+    content, omitted = excerpt(tmp_path, data, 11, 11)
+    head, marker, tail = content.split("\n")
+    assert head == "é" * 5
+    assert tail == "é" * 5
+    assert omitted == len(data) - 20
+    assert marker == excerpt_marker(omitted)
+
+
+def test_max_lines_limits_head(tmp_path: Path):
+    data = b"".join(b"line %d\n" % i for i in range(100))
+    content, omitted = excerpt(tmp_path, data, 1000, 8, max_lines=3)
+    assert content.startswith("line 0\nline 1\nline 2\n... [")
+    assert content.endswith("\nline 99\n")
+    assert omitted == len(data) - len(b"line 0\nline 1\nline 2\n") - len(b"line 99\n")
@@ -0,0 +1,82 @@
+﻿# tests/test_minifier.py
+import ast
+
+import pytest
+
+from git1file.minifier import minify_content
+from git1file.models.schemas import MinifyMode
+
+SOURCE = '''\
+"""Module docstring."""
+import os  # comment after code
+
+URL = "http://example.com/#anchor"  # '#' inside a string
+TEMPLATE = """keep me
+# not a comment
+\\"\\"\\" escaped quotes
+"""
+RAW = r'C:\\path\\# not a comment'
+
+
+class Config:
+    """Class docstring."""
+
+    # comment line
+    def __init__(self, path="a#b"):
+        """Method docstring."""
+        self.path = path  # trailing
+
+    def describe(self):
+        return f"{self.path} # {URL}"
+
+
+def main(argv=None):
+    # nested comment
+    if argv:
+        return len(argv)
+    return 0
+'''
+
+
+@pytest.mark.parametrize("mode", [MinifyMode.WHITESPACE, MinifyMode.STRIP, MinifyMode.SKELETON])
+def test_python_output_parses(mode: MinifyMode):
+    ast.parse(minify_content(SOURCE, "python", mode))
+
+
+def test_strip_removes_comments_and_docstrings_only():
+    result = minify_content(SOURCE, "python", MinifyMode.STRIP)
+    assert "comment after code" not in result
+    assert "comment line" not in result
+    assert "nested comment" not in result
+    assert "docstring" not in result.lower()
+
+    tree = ast.parse(result)
+    strings = {node.value for node in ast.walk(tree) if isinstance(node, ast.Constant) and isinstance(node.value, str)}
+    assert "http://example.com/#anchor" in strings
+    assert 'keep me\n# not a comment\n""" escaped quotes\n' in strings
+    assert "C:\\path\\# not a comment" in strings
+    assert "a#b" in strings
+    assert " # " in strings  # часть f-строки
+
+
+def test_strip_keeps_behaviour():
+    namespace = {}
+    exec(compile(minify_content(SOURCE, "python", MinifyMode.STRIP), "<strip>", "exec"), namespace)
+    assert namespace["main"](["x", "y"]) == 2
+    assert namespace["Config"]().describe() == "a#b # http://example.com/#anchor"
+
+
+def test_skeleton_keeps_signatures():
+    result = minify_content(SOURCE, "python", MinifyMode.SKELETON)
+    tree = ast.parse(result)
+    names = {node.name for node in ast.walk(tree) if isinstance(node, (ast.FunctionDef, ast.ClassDef))}
+    assert names == {"Config", "__init__", "describe", "main"}
+    assert "len(argv)" not in result
+
+
+def test_generic_strip_keeps_comment_markers_in_strings():
+    source = 'const url = "http://x/#a"; // remove me\n/* block */\nlet s = \'/* keep */\';\n'
+    result = minify_content(source, "javascript", MinifyMode.STRIP)
+    assert "remove me" not in result and "block" not in result
+    assert '"http://x/#a"' in result
+    assert "'/* keep */'" in result
@@ -0,0 +1,121 @@
+﻿# tests/test_search.py
+from pathlib import Path
+
+import pytest
+
+from git1file.models.schemas import FileInfo
+from git1file.search import (
+    SearchIndex,
+    _decode,
+    _encode,
+    identifier_tokens,
+    query_terms,
+    select_files,
+)
+
+FILES = {
+    "auth/tokens.py": "def refresh_token(session):\n    return session.refreshToken\n",
+    "auth/login.py": "def login(user, password):\n    token = refresh_token(user)\n    return token\n",
+    "db/models.py": "class User:\n    name = ''\n    password = ''\n",
+    "db/session.py": "class Session:\n    def commit(self):\n        pass\n",
+    "util/strings.py": "def slugify(text):\n    return text.lower()\n",
+}
+
+
+def file_info(path: str, content: str) -> FileInfo:
+    return FileInfo(path=path, content=content, size=len(content), language="python")
+
+
+def infos(files: dict) -> list:
+    return [file_info(path, content) for path, content in files.items()]
+
+
+@pytest.fixture
+def index(tmp_path: Path):
+    with SearchIndex(tmp_path / "index.sqlite") as index:
+        yield index
+
+
+def fresh_scores(tmp_path: Path, files: dict, query: str) -> dict:
+    with SearchIndex(tmp_path / "fresh.sqlite") as index:
+        index.update(infos(files))
+        return index.search(query)
+
+
+def test_postings_round_trip():
+    doc_ids, tfs = [1, 2, 7, 300, 70000], [3, 1, 1, 9, 2]
+    decoded_ids, decoded_tfs = _decode(_encode(doc_ids, tfs))
+    assert decoded_ids == doc_ids
+    assert list(decoded_tfs) == tfs
+
+
+def test_identifier_tokens():
+    assert identifier_tokens("refreshToken") == ("refreshtoken", "refresh", "token")
+    assert identifier_tokens("refresh_token") == ("refresh_token", "refresh", "token")
+    assert query_terms("refresh token") == ["refresh", "token"]
+
+
+def test_search_ranks_matching_files(index: SearchIndex):
+    assert index.update(infos(FILES), commit="abc12345") == (len(FILES), 0)
+    assert index.commit == "abc12345"
+    scores = index.search("refresh token")
+    assert list(scores)[:2] == ["auth/tokens.py", "auth/login.py"]
+    assert "util/strings.py" not in scores
+
+
+def test_unchanged_files_are_not_reindexed(index: SearchIndex):
+    index.update(infos(FILES))
+    before = index.search("session user")
+    assert index.update(infos(FILES)) == (0, 0)
+    assert index.search("session user") == before
+
+
+def test_changed_and_deleted_files(index: SearchIndex, tmp_path: Path):
+    # Достаточно живых документов, чтобы два мёртвых не вызвали компактизацию
+    files = dict(FILES, **{f"gen/mod{i}.py": f"def helper_{i}():\n    return {i}\n" for i in range(20)})
+    index.update(infos(files))
+    files["util/strings.py"] = "def refresh_token_cache():\n    pass\n"
+    del files["auth/login.py"]
+
+    assert index.update(infos(files)) == (1, 1)
+    assert index._meta("dead_docs") == "2"
+    scores = index.search("refresh token")
+    assert "auth/login.py" not in scores
+    assert "util/strings.py" in scores
+    # Мёртвые документы остаются в postings, но не влияют на оценки
+    assert scores == pytest.approx(fresh_scores(tmp_path, files, "refresh token"))
+
+
+def test_compaction_keeps_ranking(index: SearchIndex, tmp_path: Path):
+    index.update(infos(FILES))
+    files = dict(FILES)
+    for path in ("db/models.py", "db/session.py", "util/strings.py"):
+        del files[path]
+    index.update(infos(files))  # больше COMPACT_RATIO мёртвых — postings переписаны
+    assert index._meta("dead_docs") == "0"
+
+    lengths = index._lengths()
+    for (blob,) in index._db.execute("SELECT postings FROM terms"):
+        doc_ids, _ = _decode(blob)
+        assert all(lengths[doc_id] for doc_id in doc_ids)
+    assert index._db.execute("SELECT 1 FROM terms WHERE term = 'slugify'").fetchone() is None
+
+    for query in ("refresh token", "login password", "session"):
+        assert index.search(query) == pytest.approx(fresh_scores(tmp_path, files, query))
+
+
+def test_index_persists_between_opens(tmp_path: Path):
+    path = tmp_path / "index.sqlite"
+    with SearchIndex(path) as index:
+        index.update(infos(FILES))
+        scores = index.search("user password")
+    with SearchIndex(path) as index:
+        assert index.update(infos(FILES)) == (0, 0)
+        assert index.search("user password") == scores
+
+
+def test_select_files_respects_top_k_and_max_chars():
+    files = [file_info(path, "x" * size) for path, size in (("a.py", 50), ("b.py", 500), ("c.py", 40))]
+    scores = {"a.py": 1.0, "b.py": 3.0, "c.py": 2.0}
+    assert [f.path for f in select_files(files, scores, 2, None)] == ["b.py", "c.py"]
+    assert [f.path for f in select_files(files, scores, 5, 100)] == ["c.py", "a.py"]
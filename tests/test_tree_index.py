@@ -0,0 +1,84 @@
+﻿# tests/test_tree_index.py
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from git1file.config import CompiledConfig
+from git1file.models.schemas import ConfigSchema
+from git1file.tree import build_tree, iter_index_entries, parse_index
+
+FILES = {
+    "README.md": "# repo\n",
+    "src/app/main.py": "print('main')\n",
+    "src/app/models.py": "class Model:\n    pass\n",
+    "src/app/models_test.py": "import models\n",
+    "src/lib/util.py": "x = 1\n",
+    "docs/guide.md": "guide\n",
+}
+
+
+def git(repo: Path, *args: str) -> None:
+    subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path: Path) -> Path:
+    repo = tmp_path / "repo"
+    for name, content in FILES.items():
+        path = repo / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    git(repo, "init", "-q")
+    git(repo, "add", ".")
+    return repo
+
+
+def expected(names) -> list:
+    return sorted((name, len(FILES[name])) for name in names)
+
+
+@pytest.mark.parametrize("version", [2, 4])
+def test_parse_index_versions(repo: Path, version: int):
+    git(repo, "update-index", "--index-version", str(version))
+    data = (repo / ".git" / "index").read_bytes()
+    assert data[4:8] == version.to_bytes(4, "big")
+    assert sorted(parse_index(data)) == expected(FILES)
+
+
+@pytest.mark.parametrize("version", [3, 4])
+def test_parse_index_extended_flags(repo: Path, version: int):
+    # skip-worktree и intent-to-add хранятся в расширенных флагах записи
+    git(repo, "update-index", "--index-version", str(version))
+    git(repo, "update-index", "--skip-worktree", "src/lib/util.py")
+    (repo / "NEW.txt").write_text("new\n")
+    git(repo, "add", "-N", "NEW.txt")
+    data = (repo / ".git" / "index").read_bytes()
+    assert data[4:8] == version.to_bytes(4, "big")
+    entries = dict(parse_index(data))
+    assert "src/lib/util.py" not in entries
+    assert entries["NEW.txt"] == 0
+    assert sorted(item for item in entries.items() if item[0] != "NEW.txt") == \
+        expected(name for name in FILES if name != "src/lib/util.py")
+
+
+def test_iter_index_entries_subdirectory(repo: Path):
+    git(repo, "update-index", "--index-version", "4")
+    assert sorted(iter_index_entries(repo / "src" / "app")) == [
+        ("main.py", len(FILES["src/app/main.py"])),
+        ("models.py", len(FILES["src/app/models.py"])),
+        ("models_test.py", len(FILES["src/app/models_test.py"])),
+    ]
+
+
+def test_split_index_falls_back_to_file_system(repo: Path):
+    git(repo, "update-index", "--split-index")
+    (repo / "src" / "lib" / "extra.py").write_text("y = 2\n")
+    git(repo, "add", "src/lib/extra.py")
+    data = (repo / ".git" / "index").read_bytes()
+    with pytest.raises(ValueError):
+        list(parse_index(data))
+    assert iter_index_entries(repo) is None
+
+    root = build_tree(repo, CompiledConfig(ConfigSchema()))
+    assert root.files == len(FILES) + 1
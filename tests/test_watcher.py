@@ -0,0 +1,81 @@
+﻿# tests/test_watcher.py
+from pathlib import Path
+
+import pytest
+
+from git1file.file_processor import ScanLimitExceeded
+from git1file.models.schemas import ConfigSchema
+from git1file.watcher import RepositorySnapshot
+
+
+def snapshot(repo: Path, max_chars: int, truncate: bool = False) -> RepositorySnapshot:
+    config = ConfigSchema()
+    config.include.max_total_chars = max_chars
+    config.include.truncate_on_limit = truncate
+    snapshot = RepositorySnapshot(repo.resolve(), config)
+    snapshot.scan()
+    return snapshot
+
+
+@pytest.fixture
+def repo(tmp_path: Path) -> Path:
+    repo = tmp_path / "repo"
+    (repo / "pkg").mkdir(parents=True)
+    (repo / "a.py").write_text("a = 1\n")  # 6 байт
+    (repo / "pkg" / "b.py").write_text("b = 2\n")
+    (repo / "pkg" / "c.py").write_text("c = 3\n")
+    return repo.resolve()
+
+
+def test_edits_and_deletes(repo: Path):
+    snap = snapshot(repo, 100)
+    assert sorted(snap.files) == ["a.py", "pkg/b.py", "pkg/c.py"]
+
+    (repo / "a.py").write_text("a = 10\n")
+    (repo / "d.py").write_text("d = 4\n")
+    assert sorted(snap.update([repo / "a.py", repo / "d.py"])) == ["a.py", "d.py"]
+    assert snap.files["a.py"].content == "a = 10\n"
+    assert (snap.budget.files, snap.budget.characters) == (4, 25)
+
+    (repo / "d.py").unlink()
+    assert snap.update([repo / "d.py"]) == ["d.py"]
+    assert (snap.budget.files, snap.budget.characters) == (3, 19)
+
+    # Удалённый каталог убирает всё, что было под ним
+    for path in (repo / "pkg").iterdir():
+        path.unlink()
+    (repo / "pkg").rmdir()
+    assert sorted(snap.update([repo / "pkg"])) == ["pkg/b.py", "pkg/c.py"]
+    assert sorted(snap.files) == ["a.py"]
+    assert (snap.budget.files, snap.budget.characters) == (1, 7)
+
+
+def test_over_budget_edit_keeps_previous_entry(repo: Path):
+    snap = snapshot(repo, 20)
+    (repo / "a.py").write_text("a = 1\n" * 10)
+    with pytest.raises(ScanLimitExceeded):
+        snap.update([repo / "a.py"])
+    assert snap.files["a.py"].content == "a = 1\n"
+    assert (snap.budget.files, snap.budget.characters) == (3, 18)
+    assert not snap.budget.truncated
+
+
+def test_omitted_file_is_counted_once(repo: Path):
+    snap = snapshot(repo, 20, truncate=True)
+    (repo / "a.py").write_text("a = 1\n" * 10)
+    for _ in range(3):
+        snap.update([repo / "a.py"])
+    assert "a.py" not in snap.files
+    assert (snap.budget.omitted_files, snap.budget.omitted_characters) == (1, 60)
+
+    (repo / "a.py").write_text("a = 1\n")
+    snap.update([repo / "a.py"])
+    assert "a.py" in snap.files
+    assert (snap.budget.omitted_files, snap.budget.omitted_characters) == (0, 0)
+
+    (repo / "a.py").write_text("a = 1\n" * 10)
+    snap.update([repo / "a.py"])
+    (repo / "a.py").unlink()
+    snap.update([repo / "a.py"])
+    assert (snap.budget.omitted_files, snap.budget.omitted_characters) == (0, 0)
+    assert (snap.budget.files, snap.budget.characters) == (2, 12)